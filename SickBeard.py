@@ -43,13 +43,12 @@ import os
 import threading
 import time
 import signal
-import traceback
 import getopt
 
 import sickbeard
 
 from sickbeard import db
-from sickbeard.tv import TVShow
+from sickbeard import tv
 from sickbeard import logger
 from sickbeard.version import SICKBEARD_VERSION
 from sickbeard.databases.mainDB import MAX_DB_VERSION
@@ -62,23 +61,34 @@ signal.signal(signal.SIGINT, sickbeard.sig_handler)
 signal.signal(signal.SIGTERM, sickbeard.sig_handler)
 
 
-def loadShowsFromDB():
+class StartupTimer(object):
     """
-    Populates the showList with shows from the database
+    Keeps track of how long each phase of the startup took so they can be logged together at the end.
     """
 
-    myDB = db.DBConnection()
-    sqlResults = myDB.select("SELECT * FROM tv_shows")
+    def __init__(self):
+        self.startTime = self.lastTime = time.time()
+        self.phases = []
 
-    for sqlShow in sqlResults:
-        try:
-            curShow = TVShow(int(sqlShow["tvdb_id"]))
-            sickbeard.showList.append(curShow)
-        except Exception, e:
-            logger.log(u"There was an error creating the show in " + sqlShow["location"] + ": " + str(e).decode('utf-8'), logger.ERROR)
-            logger.log(traceback.format_exc(), logger.DEBUG)
+    def phase(self, name):
+        """
+        Marks the end of a phase, it's counted from the end of the previous one.
+        """
+        now = time.time()
+        self.phases.append((name, now - self.lastTime))
+        self.lastTime = now
 
-        # TODO: update the existing shows if the showlist has something in it
+    def report(self):
+        return u"Startup took %.2fs: " % (self.lastTime - self.startTime) + u", ".join([u"%s %.2fs" % (name, duration) for (name, duration) in self.phases])
+
+
+def loadShowsFromDB():
+    """
+    Populates the showList with shows from the database
+    """
+
+    # TODO: update the existing shows if the showlist has something in it
+    sickbeard.showList.extend(tv.loadShowsFromDB())
 
 
 def daemonize():
@@ -256,11 +266,14 @@ def main():
     if consoleLogging:
         print "Starting up Sick Beard " + SICKBEARD_VERSION + " from " + sickbeard.CONFIG_FILE
 
+    startupTimer = StartupTimer()
+
     # Load the config and publish it to the sickbeard package
     if not os.path.isfile(sickbeard.CONFIG_FILE):
         logger.log(u"Unable to find '" + sickbeard.CONFIG_FILE + "' , all settings will be default!", logger.ERROR)
 
     sickbeard.CFG = ConfigObj(sickbeard.CONFIG_FILE)
+    startupTimer.phase(u"reading config")
 
     if db.DBConnection().checkDBVersion() > MAX_DB_VERSION:
         print 'Your database version has been incremented'
@@ -270,8 +283,11 @@ def main():
         print 'modified your database it may now be unusable.'
         sys.exit(1)
 
+    startupTimer.phase(u"checking database version")
+
     # Initialize the config and our threads
     sickbeard.initialize(consoleLogging=consoleLogging)
+    startupTimer.phase(u"initializing")
 
     sickbeard.showList = []
 
@@ -321,13 +337,18 @@ def main():
             logger.log(u"Launching browser and exiting", logger.ERROR)
             sickbeard.launchBrowser(startPort)
         sys.exit()
+    startupTimer.phase(u"starting web server")
 
     # Build from the DB to start with
     logger.log(u"Loading initial show list")
     loadShowsFromDB()
+    startupTimer.phase(u"loading " + str(len(sickbeard.showList)) + u" shows")
 
     # Fire up all our threads
     sickbeard.start()
+    startupTimer.phase(u"starting threads")
+
+    logger.log(startupTimer.report())
 
     # Launch browser if we're supposed to
     if sickbeard.LAUNCH_BROWSER and not noLaunch and not sickbeard.DAEMON:
@@ -34,7 +34,7 @@ from providers import ezrss, tvtorrents, torrentleech, btn, nzbsrus, newznab, wo
 from sickbeard.config import CheckSection, check_setting_int, check_setting_str, ConfigMigrator
 
 from sickbeard import searchCurrent, searchBacklog, showUpdater, versionChecker, properFinder, autoPostProcesser
-from sickbeard import helpers, db, exceptions, show_queue, search_queue, scheduler
+from sickbeard import helpers, db, exceptions, show_queue, search_queue, scheduler, http_client, history
 from sickbeard import logger
 from sickbeard import naming
 
@@ -76,6 +76,7 @@ showQueueScheduler = None
 searchQueueScheduler = None
 properFinderScheduler = None
 autoPostProcesserScheduler = None
+historyArchiveScheduler = None
 
 showList = None
 loadingShowList = None
@@ -311,6 +312,32 @@ GIT_PATH = None
 
 IGNORE_WORDS = "german,french,core2hd,dutch,swedish"
 
+DB_PRAGMAS = "journal_mode=WAL,synchronous=NORMAL"
+
+NAME_PARSER_CACHE_SIZE = 1000
+
+EPISODE_CACHE_SIZE = 10000
+
+# how many shows' TVDB info is kept in memory, 0 to always read it from the store
+TVDB_SHOW_CACHE_SIZE = 50
+
+PROVIDER_SEARCH_THREADS = 4
+PROVIDER_SEARCH_TIMEOUT = 120
+
+SHOW_QUEUE_THREADS = 3
+
+# how many shows can be post-processed at once
+POST_PROCESS_THREADS = 2
+
+# how many requests a backlog search may make to each provider, 0 for no limit
+BACKLOG_PROVIDER_BUDGET = 0
+
+# history entries older than this many days are moved to the archive, 0 to keep them all
+HISTORY_ARCHIVE_DAYS = 365
+
+HTTP_POOL_SIZE = 4
+HTTP_KEEPALIVE_TIMEOUT = 30
+
 __INITIALIZED__ = False
 
 
@@ -355,7 +382,9 @@ def initialize(consoleLogging=True):
                 USE_BANNER, USE_LISTVIEW, METADATA_XBMC, METADATA_MEDIABROWSER, METADATA_PS3, METADATA_SYNOLOGY, metadata_provider_dict, \
                 NEWZBIN, NEWZBIN_USERNAME, NEWZBIN_PASSWORD, GIT_PATH, MOVE_ASSOCIATED_FILES, \
                 COMING_EPS_LAYOUT, COMING_EPS_SORT, COMING_EPS_DISPLAY_PAUSED, METADATA_WDTV, METADATA_TIVO, IGNORE_WORDS, CREATE_MISSING_SHOW_DIRS, \
-                ADD_SHOWS_WO_DIR
+                ADD_SHOWS_WO_DIR, DB_PRAGMAS, NAME_PARSER_CACHE_SIZE, EPISODE_CACHE_SIZE, PROVIDER_SEARCH_THREADS, PROVIDER_SEARCH_TIMEOUT, \
+                HTTP_POOL_SIZE, HTTP_KEEPALIVE_TIMEOUT, SHOW_QUEUE_THREADS, BACKLOG_PROVIDER_BUDGET, \
+                POST_PROCESS_THREADS, HISTORY_ARCHIVE_DAYS, historyArchiveScheduler, TVDB_SHOW_CACHE_SIZE
 
         if __INITIALIZED__:
             return False
@@ -467,6 +496,18 @@ def initialize(consoleLogging=True):
 
         GIT_PATH = check_setting_str(CFG, 'General', 'git_path', '')
         IGNORE_WORDS = check_setting_str(CFG, 'General', 'ignore_words', IGNORE_WORDS)
+        DB_PRAGMAS = check_setting_str(CFG, 'General', 'db_pragmas', DB_PRAGMAS)
+        NAME_PARSER_CACHE_SIZE = check_setting_int(CFG, 'General', 'name_parser_cache_size', NAME_PARSER_CACHE_SIZE)
+        EPISODE_CACHE_SIZE = check_setting_int(CFG, 'General', 'episode_cache_size', EPISODE_CACHE_SIZE)
+        TVDB_SHOW_CACHE_SIZE = check_setting_int(CFG, 'General', 'tvdb_show_cache_size', TVDB_SHOW_CACHE_SIZE)
+        PROVIDER_SEARCH_THREADS = check_setting_int(CFG, 'General', 'provider_search_threads', PROVIDER_SEARCH_THREADS)
+        PROVIDER_SEARCH_TIMEOUT = check_setting_int(CFG, 'General', 'provider_search_timeout', PROVIDER_SEARCH_TIMEOUT)
+        SHOW_QUEUE_THREADS = check_setting_int(CFG, 'General', 'show_queue_threads', SHOW_QUEUE_THREADS)
+        BACKLOG_PROVIDER_BUDGET = check_setting_int(CFG, 'General', 'backlog_provider_budget', BACKLOG_PROVIDER_BUDGET)
+        POST_PROCESS_THREADS = check_setting_int(CFG, 'General', 'post_process_threads', POST_PROCESS_THREADS)
+        HISTORY_ARCHIVE_DAYS = check_setting_int(CFG, 'General', 'history_archive_days', HISTORY_ARCHIVE_DAYS)
+        HTTP_POOL_SIZE = check_setting_int(CFG, 'General', 'http_pool_size', HTTP_POOL_SIZE)
+        HTTP_KEEPALIVE_TIMEOUT = check_setting_int(CFG, 'General', 'http_keepalive_timeout', HTTP_KEEPALIVE_TIMEOUT)
         EXTRA_SCRIPTS = [x for x in check_setting_str(CFG, 'General', 'extra_scripts', '').split('|') if x]
 
         USE_BANNER = bool(check_setting_int(CFG, 'General', 'use_banner', 0))
@@ -736,15 +777,19 @@ def initialize(consoleLogging=True):
                                                      threadName="CHECKVERSION",
                                                      runImmediately=True)
 
+        # the queues wake their schedulers up when something is added or finished, the cycle only catches
+        # anything that slipped through
         showQueueScheduler = scheduler.Scheduler(show_queue.ShowQueue(),
-                                               cycleTime=datetime.timedelta(seconds=3),
+                                               cycleTime=datetime.timedelta(minutes=1),
                                                threadName="SHOWQUEUE",
-                                               silent=True)
+                                               silent=True,
+                                               threaded=False)
 
         searchQueueScheduler = scheduler.Scheduler(search_queue.SearchQueue(),
-                                               cycleTime=datetime.timedelta(seconds=3),
+                                               cycleTime=datetime.timedelta(minutes=1),
                                                threadName="SEARCHQUEUE",
-                                               silent=True)
+                                               silent=True,
+                                               threaded=False)
 
         properFinderInstance = properFinder.ProperFinder()
         properFinderScheduler = scheduler.Scheduler(properFinderInstance,
@@ -757,6 +802,12 @@ def initialize(consoleLogging=True):
                                                      threadName="POSTPROCESSER",
                                                      runImmediately=True)
 
+        historyArchiverInstance = history.HistoryArchiver()
+        historyArchiveScheduler = scheduler.Scheduler(historyArchiverInstance,
+                                                     cycleTime=historyArchiverInstance.updateInterval,
+                                                     threadName="HISTORYARCHIVE",
+                                                     runImmediately=True)
+
         backlogSearchScheduler = searchBacklog.BacklogSearchScheduler(searchBacklog.BacklogSearcher(),
                                                                       cycleTime=datetime.timedelta(minutes=get_backlog_cycle_time()),
                                                                       threadName="BACKLOG",
@@ -770,6 +821,12 @@ def initialize(consoleLogging=True):
         return True
 
 
+def _allSchedulers():
+    return [currentSearchScheduler, backlogSearchScheduler, showUpdateScheduler, versionCheckScheduler,
+            showQueueScheduler, searchQueueScheduler, properFinderScheduler, autoPostProcesserScheduler,
+            historyArchiveScheduler]
+
+
 def start():
 
     global __INITIALIZED__, currentSearchScheduler, backlogSearchScheduler, \
@@ -781,29 +838,11 @@ def start():
 
         if __INITIALIZED__:
 
-            # start the search scheduler
-            currentSearchScheduler.thread.start()
-
-            # start the backlog scheduler
-            backlogSearchScheduler.thread.start()
-
-            # start the show updater
-            showUpdateScheduler.thread.start()
-
-            # start the version checker
-            versionCheckScheduler.thread.start()
+            # one thread starts all the scheduled jobs when they're due
+            for curScheduler in _allSchedulers():
+                scheduler.schedulerLoop.add(curScheduler)
 
-            # start the queue checker
-            showQueueScheduler.thread.start()
-
-            # start the search queue checker
-            searchQueueScheduler.thread.start()
-
-            # start the queue checker
-            properFinderScheduler.thread.start()
-
-            # start the proper finder
-            autoPostProcesserScheduler.thread.start()
+            scheduler.schedulerLoop.start()
 
             started = True
 
@@ -820,63 +859,18 @@ def halt():
 
             logger.log(u"Aborting all threads")
 
-            # abort all the threads
-
-            currentSearchScheduler.abort = True
-            logger.log(u"Waiting for the SEARCH thread to exit")
-            try:
-                currentSearchScheduler.thread.join(10)
-            except:
-                pass
-
-            backlogSearchScheduler.abort = True
-            logger.log(u"Waiting for the BACKLOG thread to exit")
-            try:
-                backlogSearchScheduler.thread.join(10)
-            except:
-                pass
-
-            showUpdateScheduler.abort = True
-            logger.log(u"Waiting for the SHOWUPDATER thread to exit")
-            try:
-                showUpdateScheduler.thread.join(10)
-            except:
-                pass
-
-            versionCheckScheduler.abort = True
-            logger.log(u"Waiting for the VERSIONCHECKER thread to exit")
-            try:
-                versionCheckScheduler.thread.join(10)
-            except:
-                pass
-
-            showQueueScheduler.abort = True
-            logger.log(u"Waiting for the SHOWQUEUE thread to exit")
-            try:
-                showQueueScheduler.thread.join(10)
-            except:
-                pass
-
-            searchQueueScheduler.abort = True
-            logger.log(u"Waiting for the SEARCHQUEUE thread to exit")
-            try:
-                searchQueueScheduler.thread.join(10)
-            except:
-                pass
-
-            autoPostProcesserScheduler.abort = True
-            logger.log(u"Waiting for the POSTPROCESSER thread to exit")
-            try:
-                autoPostProcesserScheduler.thread.join(10)
-            except:
-                pass
-
-            properFinderScheduler.abort = True
-            logger.log(u"Waiting for the PROPERFINDER thread to exit")
-            try:
-                properFinderScheduler.thread.join(10)
-            except:
-                pass
+            # stop starting new jobs
+            logger.log(u"Waiting for the SCHEDULER thread to exit")
+            scheduler.schedulerLoop.stop(10)
+
+            # and wait for the ones that are running
+            for curScheduler in _allSchedulers():
+                if curScheduler.running:
+                    logger.log(u"Waiting for the " + curScheduler.threadName + " thread to exit")
+                    try:
+                        curScheduler.join(10)
+                    except:
+                        pass
 
             __INITIALIZED__ = False
 
@@ -910,6 +904,10 @@ def saveAndShutdown(restart=False):
     logger.log(u"Killing cherrypy")
     cherrypy.engine.exit()
 
+    # flush and close every pooled database connection
+    db.connectionPool.closeAll()
+    http_client.httpClient.closeAll()
+
     if CREATEPID:
         logger.log(u"Removing pidfile " + str(PIDFILE))
         os.remove(PIDFILE)
@@ -1027,6 +1025,18 @@ def save_config():
     new_config['General']['extra_scripts'] = '|'.join(EXTRA_SCRIPTS)
     new_config['General']['git_path'] = GIT_PATH
     new_config['General']['ignore_words'] = IGNORE_WORDS
+    new_config['General']['db_pragmas'] = DB_PRAGMAS
+    new_config['General']['name_parser_cache_size'] = NAME_PARSER_CACHE_SIZE
+    new_config['General']['episode_cache_size'] = EPISODE_CACHE_SIZE
+    new_config['General']['tvdb_show_cache_size'] = TVDB_SHOW_CACHE_SIZE
+    new_config['General']['provider_search_threads'] = PROVIDER_SEARCH_THREADS
+    new_config['General']['provider_search_timeout'] = PROVIDER_SEARCH_TIMEOUT
+    new_config['General']['show_queue_threads'] = SHOW_QUEUE_THREADS
+    new_config['General']['backlog_provider_budget'] = BACKLOG_PROVIDER_BUDGET
+    new_config['General']['post_process_threads'] = POST_PROCESS_THREADS
+    new_config['General']['history_archive_days'] = HISTORY_ARCHIVE_DAYS
+    new_config['General']['http_pool_size'] = HTTP_POOL_SIZE
+    new_config['General']['http_keepalive_timeout'] = HTTP_KEEPALIVE_TIMEOUT
 
     new_config['Blackhole'] = {}
     new_config['Blackhole']['nzb_dir'] = NZB_DIR
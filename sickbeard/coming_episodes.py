@@ -0,0 +1,153 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import with_statement
+
+import datetime
+import threading
+
+from sickbeard import db, show_index
+from sickbeard.common import Quality, ARCHIVED, IGNORED, WANTED
+
+# the list is kept until the day changes, an episode is changed (which has to call invalidate()) or
+# the show index is invalidated (which every change to a show does)
+_lock = threading.Lock()
+_generation = 0
+_coming = None
+
+# the columns of the episodes in the list
+COMING_FIELDS = ('showid', 'season', 'episode', 'name', 'description', 'airdate', 'status',
+                 'show_name', 'network', 'airs', 'quality', 'paused', 'show_status')
+
+_sortKeys = {
+    'date': lambda x: x["airdate"],
+    'show': lambda x: x["show_name"],
+    'network': lambda x: x["network"],
+}
+
+class ComingEpisodes(object):
+    """
+    The coming episodes of one day:
+
+        missed: wanted episodes which aired in the last three days
+        today and soon: the episodes which air in the next week, unless they're downloaded, snatched,
+                        archived or ignored
+        later: for the shows with nothing in the next week, their next episode after that
+
+    Specials aren't listed. The episodes are dicts of COMING_FIELDS, they're shared by everybody
+    so they mustn't be changed.
+    """
+
+    def __init__(self, today, episodes):
+        self.today = today
+        self.next_week = today + 7
+        self.recently = today - 3
+
+        self.episodes = episodes
+        self._sorted = {}
+
+    def sortedEpisodes(self, sort='date'):
+        """
+        Returns the episodes sorted by date, show or network.
+        """
+
+        if sort not in self._sorted:
+            self._sorted[sort] = sorted(self.episodes, key=_sortKeys[sort])
+        return self._sorted[sort]
+
+    def airType(self, ep):
+        """
+        Returns missed, today, soon or later.
+        """
+
+        if ep["airdate"] < self.today:
+            return "missed"
+        elif ep["airdate"] >= self.next_week:
+            return "later"
+        elif ep["airdate"] == self.today:
+            return "today"
+        else:
+            return "soon"
+
+def _findComingEpisodes(today):
+    """
+    Reads every episode which aired in the last three days or airs later in one query and picks the
+    coming ones out of them.
+    """
+
+    coming = ComingEpisodes(today, [])
+
+    myDB = db.DBConnection()
+    sqlResults = myDB.select("SELECT tv_episodes.showid, season, episode, name, description, airdate, tv_episodes.status, show_name, network, airs, tv_shows.quality, paused, tv_shows.status AS show_status "
+                             "FROM tv_episodes, tv_shows WHERE tv_shows.tvdb_id = tv_episodes.showid AND airdate >= ? "
+                             "ORDER BY airdate, tv_episodes.showid, season, episode", [coming.recently])
+
+    episodes = [dict(zip(COMING_FIELDS, x)) for x in sqlResults]
+    for curEp in episodes:
+        for curField in ('showid', 'season', 'episode', 'airdate', 'status', 'quality', 'paused'):
+            curEp[curField] = int(curEp[curField] or 0)
+
+    hiddenStatuses = frozenset(Quality.DOWNLOADED + Quality.SNATCHED + [ARCHIVED, IGNORED])
+    haveStatuses = frozenset(Quality.DOWNLOADED + Quality.SNATCHED)
+
+    thisWeek = [x for x in episodes if x["season"] != 0 and coming.today <= x["airdate"] < coming.next_week and x["status"] not in hiddenStatuses]
+    missed = [x for x in episodes if x["season"] != 0 and x["airdate"] < coming.today and x["status"] == WANTED]
+
+    # the first airdate after this week of every show that has nothing this week, specials count for finding it
+    showsThisWeek = set([x["showid"] for x in thisWeek])
+    laterAirdates = {}
+    for curEp in episodes:
+        if curEp["airdate"] >= coming.next_week and curEp["showid"] not in showsThisWeek and curEp["showid"] not in laterAirdates:
+            laterAirdates[curEp["showid"]] = curEp["airdate"]
+
+    later = [x for x in episodes if x["season"] != 0 and laterAirdates.get(x["showid"]) == x["airdate"] and x["status"] not in haveStatuses]
+
+    coming.episodes = thisWeek + later + missed
+    return coming
+
+def invalidate():
+    """
+    Throws away the list, the next call to getComingEpisodes builds it again.
+    """
+    global _coming, _generation
+
+    with _lock:
+        _generation += 1
+        _coming = None
+
+def getComingEpisodes():
+    """
+    Returns today's ComingEpisodes.
+    """
+    global _coming
+
+    today = datetime.date.today().toordinal()
+
+    with _lock:
+        key = (today, _generation, show_index.generation())
+        if _coming is not None and _coming[0] == key:
+            return _coming[1]
+
+    coming = _findComingEpisodes(today)
+
+    with _lock:
+        # don't keep a list that was already invalidated while we were building it
+        if key == (today, _generation, show_index.generation()):
+            _coming = (key, coming)
+
+    return coming
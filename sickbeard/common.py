@@ -69,6 +69,15 @@ multiEpStrings[NAMING_EXTEND] = "Extend"
 multiEpStrings[NAMING_LIMITED_EXTEND] = "Extend (Limited)"
 multiEpStrings[NAMING_LIMITED_EXTEND_E_PREFIXED] = "Extend (Limited, E-prefixed)"
 
+# compiled quality patterns, nameQuality is called for every release we see so they're only compiled once
+_qualityRegexes = {}
+
+def _qualityRegex(pattern):
+    regex = _qualityRegexes.get(pattern)
+    if regex is None:
+        regex = _qualityRegexes[pattern] = re.compile(pattern, re.I)
+    return regex
+
 
 class Quality:
     NONE = 0              # 0
@@ -139,11 +148,11 @@ class Quality:
                 continue
 
             regex = '\W' + Quality.qualityStrings[x].replace(' ', '\W') + '\W'
-            regex_match = re.search(regex, name, re.I)
+            regex_match = _qualityRegex(regex).search(name)
             if regex_match:
                 return x
 
-        checkName = lambda list, func: func([re.search(x, name, re.I) for x in list])
+        checkName = lambda list, func: func(_qualityRegex(x).search(name) for x in list)
 
         if checkName(["(pdtv|hdtv|dsr|tvrip|webrip).(xvid|x264)"], all) and not checkName(["(720|1080)[pi]"], all):
             return Quality.SDTV
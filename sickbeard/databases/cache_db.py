@@ -18,6 +18,28 @@
 
 from sickbeard import db
 
+# tables in cache.db which don't hold a provider's cached results
+NON_PROVIDER_TABLES = ('lastUpdate', 'db_version', 'scene_exceptions', 'scene_names', 'cache_episodes', 'file_states',
+                       'tvdb_shows', 'tvdb_episodes', 'backlog_deferred')
+
+def providerIndexQueries(providerName):
+    """
+    Returns the queries which index a provider's cache table
+    """
+    return ["CREATE INDEX IF NOT EXISTS idx_%s_time ON %s (time);" % (providerName, providerName),
+            "CREATE INDEX IF NOT EXISTS idx_%s_url ON %s (url);" % (providerName, providerName)]
+
+def episodeNumbers(episodeText):
+    """
+    Turns the "|1|2|" episodes string stored in the provider tables into [1, 2], an episode that's
+    in it twice is only mapped once
+    """
+    result = []
+    for curEpisode in [int(x) for x in episodeText.split("|") if x.isdigit()]:
+        if curEpisode not in result:
+            result.append(curEpisode)
+    return result
+
 # Add new migrations at the bottom of the list; subclass the previous migration.
 class InitialSchema (db.SchemaUpgrade):
     def test(self):
@@ -48,4 +70,63 @@ class AddSceneNameCache(AddSceneExceptions):
         return self.hasTable("scene_names")
 
     def execute(self):
-        self.connection.action("CREATE TABLE scene_names (tvdb_id INTEGER, name TEXT)")
\ No newline at end of file
+        self.connection.action("CREATE TABLE scene_names (tvdb_id INTEGER, name TEXT)")
+
+class AddCacheEpisodes(AddSceneNameCache):
+    """
+    Maps every cached result to the episodes it contains so searches can use an index
+    instead of matching the episodes string with LIKE.
+    """
+    def test(self):
+        return self.hasTable("cache_episodes")
+
+    def execute(self):
+        self.connection.action("CREATE TABLE cache_episodes (provider TEXT, url TEXT, tvdbid NUMERIC, season NUMERIC, episode NUMERIC)")
+        self.connection.action("CREATE INDEX idx_cache_episodes_ep ON cache_episodes (tvdbid, season, episode)")
+        self.connection.action("CREATE INDEX idx_cache_episodes_url ON cache_episodes (provider, url)")
+
+        providerTables = [x["name"] for x in self.connection.select("SELECT name FROM sqlite_master WHERE type = 'table'") if x["name"] not in NON_PROVIDER_TABLES]
+
+        for curProvider in providerTables:
+            queries = [[x] for x in providerIndexQueries(curProvider)]
+
+            mappings = []
+            for curResult in self.connection.select("SELECT url, tvdbid, season, episodes FROM " + curProvider):
+                for curEpisode in episodeNumbers(curResult["episodes"]):
+                    mappings.append([curProvider, curResult["url"], curResult["tvdbid"], curResult["season"], curEpisode])
+            queries.append(["INSERT INTO cache_episodes (provider, url, tvdbid, season, episode) VALUES (?,?,?,?,?)", mappings, True])
+
+            self.connection.mass_action(queries)
+
+class AddFileStates(AddCacheEpisodes):
+    """
+    The size, modification time and inode of the media files in the show folders, refreshes use
+    them to skip the files which haven't changed.
+    """
+    def test(self):
+        return self.hasTable("file_states")
+
+    def execute(self):
+        self.connection.action("CREATE TABLE file_states (tvdb_id NUMERIC, path TEXT, size NUMERIC, mtime NUMERIC, inode NUMERIC)")
+        self.connection.action("CREATE UNIQUE INDEX idx_file_states_path ON file_states (tvdb_id, path)")
+
+class AddTvdbStore(AddFileStates):
+    """
+    The parsed TVDB info of the shows and their episodes, see tvdb_store.
+    """
+    def test(self):
+        return self.hasTable("tvdb_shows")
+
+    def execute(self):
+        self.connection.action("CREATE TABLE tvdb_episodes (tvdb_id INTEGER, lang TEXT, season INTEGER, episode INTEGER, id TEXT, episodename TEXT, overview TEXT, firstaired TEXT, fetched NUMERIC, PRIMARY KEY (tvdb_id, lang, season, episode))")
+        self.connection.action("CREATE TABLE tvdb_shows (tvdb_id INTEGER, lang TEXT, seriesname TEXT, genre TEXT, network TEXT, airs_dayofweek TEXT, airs_time TEXT, firstaired TEXT, status TEXT, fetched NUMERIC, PRIMARY KEY (tvdb_id, lang))")
+
+class AddBacklogDeferred(AddTvdbStore):
+    """
+    The segments a backlog search couldn't fit into the provider budgets, the next one searches them first.
+    """
+    def test(self):
+        return self.hasTable("backlog_deferred")
+
+    def execute(self):
+        self.connection.action("CREATE TABLE backlog_deferred (tvdb_id INTEGER, segment TEXT, PRIMARY KEY (tvdb_id, segment))")
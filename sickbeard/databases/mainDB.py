@@ -19,13 +19,13 @@
 import sickbeard
 import os.path
 
-from sickbeard import db, common, helpers, logger
+from sickbeard import db, common, helpers, logger, show_stats, history
 from sickbeard.providers.generic import GenericProvider
 
 from sickbeard import encodingKludge as ek
 from sickbeard.name_parser.parser import NameParser, InvalidNameException
 
-MAX_DB_VERSION = 12
+MAX_DB_VERSION = 15
 
 
 class MainSanityCheck(db.DBSanityCheck):
@@ -33,6 +33,7 @@ class MainSanityCheck(db.DBSanityCheck):
         self.fix_duplicate_shows()
         self.fix_duplicate_episodes()
         self.fix_orphan_episodes()
+        self.fix_show_stats()
 
     def fix_duplicate_shows(self):
         sqlResults = self.connection.select("SELECT show_id, tvdb_id, COUNT(tvdb_id) as count FROM tv_shows GROUP BY tvdb_id HAVING count > 1")
@@ -81,6 +82,15 @@ class MainSanityCheck(db.DBSanityCheck):
         else:
             logger.log(u"No orphan episode, check passed")
 
+    def fix_show_stats(self):
+        wrongShows = show_stats.checkStats(self.connection)
+
+        for cur_tvdb_id in wrongShows:
+            logger.log(u"Fixed the episode counts of show with tvdb_id: " + str(cur_tvdb_id), logger.DEBUG)
+
+        if not wrongShows:
+            logger.log(u"No wrong episode counts, check passed")
+
 
 def backupDatabase(version):
     helpers.backupVersionedFile(db.dbFilename(), version)
@@ -666,3 +676,61 @@ class Add1080pAndRawHDQualities(RenameSeasonFolders):
         # cleanup and reduce db if any previous data was removed
         logger.log(u"Performing a vacuum on the database.", logger.DEBUG)
         self.connection.action("VACUUM")
+
+
+class AddShowStats(Add1080pAndRawHDQualities):
+    """
+    The episode counts of every show, see show_stats. They're filled in by the sanity check.
+    """
+
+    def test(self):
+        return self.checkDBVersion() >= 13
+
+    def execute(self):
+        self.connection.action("CREATE TABLE IF NOT EXISTS show_stats (showid INTEGER PRIMARY KEY, downloaded NUMERIC, snatched NUMERIC, snatched_with_file NUMERIC, wanted NUMERIC, total NUMERIC, next_airdate NUMERIC, recount_on NUMERIC, as_of NUMERIC)")
+        self.connection.action("CREATE TABLE IF NOT EXISTS show_status_counts (showid NUMERIC, status NUMERIC, count NUMERIC)")
+        self.connection.action("CREATE UNIQUE INDEX IF NOT EXISTS idx_show_status_counts ON show_status_counts (showid, status)")
+
+        self.incDBVersion()
+
+
+class AddEpisodeAirdateIndex(AddShowStats):
+    """
+    The coming episodes are looked up by airdate over all the shows.
+    """
+
+    def test(self):
+        return self.checkDBVersion() >= 14
+
+    def execute(self):
+        self.connection.action("CREATE INDEX IF NOT EXISTS idx_tv_episodes_airdate ON tv_episodes (airdate)")
+
+        self.incDBVersion()
+
+
+class AddHistoryIndexes(AddEpisodeAirdateIndex):
+    """
+    Indexes the history by date, by episode and by the normalized name of the resource (see
+    history.resourceKey) and adds the table old entries are archived to.
+    """
+
+    def test(self):
+        return self.checkDBVersion() >= 15
+
+    def execute(self):
+        if not self.hasColumn("history", "resource_key"):
+            self.connection.action("ALTER TABLE history ADD resource_key TEXT")
+
+        ql = []
+        for cur_entry in self.connection.select("SELECT rowid, resource FROM history"):
+            ql.append(["UPDATE history SET resource_key = ? WHERE rowid = ?", [history.resourceKey(cur_entry["resource"] or ""), cur_entry["rowid"]]])
+        self.connection.mass_action(ql)
+
+        self.connection.action("CREATE INDEX IF NOT EXISTS idx_history_date ON history (date)")
+        self.connection.action("CREATE INDEX IF NOT EXISTS idx_history_episode ON history (showid, season, episode)")
+        self.connection.action("CREATE INDEX IF NOT EXISTS idx_history_resource_key ON history (resource_key)")
+
+        self.connection.action("CREATE TABLE IF NOT EXISTS history_archive (action NUMERIC, date NUMERIC, showid NUMERIC, season NUMERIC, episode NUMERIC, quality NUMERIC, resource TEXT, provider NUMERIC)")
+
+        self.incDBVersion()
+
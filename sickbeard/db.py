@@ -30,7 +30,11 @@ from sickbeard import encodingKludge as ek
 from sickbeard import logger
 from sickbeard.exceptions import ex
 
-db_lock = threading.Lock()
+# lock hold times are bucketed into these upper bounds (in seconds)
+HOLD_BUCKETS = (0.001, 0.01, 0.1, 1, 10)
+
+# how many distinct query shapes are tracked per database file
+MAX_TRACKED_QUERIES = 200
 
 def dbFilename(filename="sickbeard.db", suffix=None):
     """
@@ -44,15 +48,314 @@ def dbFilename(filename="sickbeard.db", suffix=None):
         filename = "%s.%s" % (filename, suffix)
     return ek.ek(os.path.join, sickbeard.DATA_DIR, filename)
 
+def parsePragmas(pragmaString):
+    """
+    Turns a config string like "journal_mode=WAL,synchronous=NORMAL" into a list
+    of (name, value) tuples. Malformed entries are skipped.
+    """
+    pragmas = []
+    for curPragma in pragmaString.split(','):
+        if '=' not in curPragma:
+            continue
+        name, value = [x.strip() for x in curPragma.split('=', 1)]
+        if not re.match(r'^\w+$', name) or not re.match(r'^[\w-]+$', value):
+            logger.log(u"Ignoring invalid DB pragma " + curPragma, logger.WARNING)
+            continue
+        pragmas.append((name, value))
+    return pragmas
+
+class ReadWriteLock(object):
+    """
+    A lock which can be held by any number of readers or by a single writer.
+    Waiting writers block new readers so a steady stream of selects can't starve
+    them.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waitingWriters = 0
+
+    def acquireRead(self):
+        with self._cond:
+            while self._writer or self._waitingWriters:
+                self._cond.wait()
+            self._readers += 1
+
+    def releaseRead(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notifyAll()
+
+    def acquireWrite(self):
+        with self._cond:
+            self._waitingWriters += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waitingWriters -= 1
+            self._writer = True
+
+    def releaseWrite(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notifyAll()
+
+def queryShape(query):
+    """
+    Reduces a query to its shape by replacing literals with ? so that queries
+    built by string concatenation are counted together.
+    """
+    shape = re.sub(r"'[^']*'|\b\d+(\.\d+)?\b", "?", query)
+    shape = re.sub(r"\?(\s*,\s*\?)+", "?", shape)
+    return ' '.join(shape.split())[:150]
+
+def _bucket(held):
+    for i, bound in enumerate(HOLD_BUCKETS):
+        if held < bound:
+            return i
+    return len(HOLD_BUCKETS)
+
+def _bucketNames():
+    names = []
+    for bound in HOLD_BUCKETS:
+        if bound < 1:
+            names.append("<%dms" % (bound * 1000))
+        else:
+            names.append("<%ds" % bound)
+    names.append(">=%ds" % HOLD_BUCKETS[-1])
+    return names
+
+class DBLock(object):
+    """
+    Guards a single database file. Writes are serialized, reads share the lock
+    and skip it entirely once the file is in WAL mode since sqlite can then run
+    them alongside a writer. Keeps wait and hold time statistics per query shape.
+    """
+
+    def __init__(self, fullPath):
+        self.fullPath = fullPath
+        self.walMode = False
+        self._rwLock = ReadWriteLock()
+        self._statsLock = threading.Lock()
+
+        self.waits = 0
+        self.waitTime = 0.0
+        self.holdHistogram = [0] * (len(HOLD_BUCKETS) + 1)
+        # query shape -> [count, total hold time, max hold time, histogram]
+        self.queries = {}
+
+    def acquire(self, write):
+        """
+        Returns the time spent waiting for the lock, or None if no lock was taken.
+        """
+        if not write and self.walMode:
+            return None
+
+        startTime = time.time()
+        if write:
+            self._rwLock.acquireWrite()
+        else:
+            self._rwLock.acquireRead()
+        waited = time.time() - startTime
+
+        with self._statsLock:
+            self.waits += 1
+            self.waitTime += waited
+
+        return waited
+
+    def release(self, write, query, held):
+        if write:
+            self._rwLock.releaseWrite()
+        else:
+            self._rwLock.releaseRead()
+
+        bucket = _bucket(held)
+        shape = queryShape(query)
+
+        with self._statsLock:
+            self.holdHistogram[bucket] += 1
+
+            if shape not in self.queries:
+                if len(self.queries) >= MAX_TRACKED_QUERIES:
+                    shape = "(other)"
+                self.queries.setdefault(shape, [0, 0.0, 0.0, [0] * (len(HOLD_BUCKETS) + 1)])
+
+            queryStats = self.queries[shape]
+            queryStats[0] += 1
+            queryStats[1] += held
+            queryStats[2] = max(queryStats[2], held)
+            queryStats[3][bucket] += 1
+
+    def stats(self, topQueries=10):
+        bucketNames = _bucketNames()
+        with self._statsLock:
+            worst = sorted(self.queries.items(), key=lambda x: x[1][1], reverse=True)[:topQueries]
+            return {"wal": int(self.walMode),
+                    "waits": self.waits,
+                    "wait_time": round(self.waitTime, 4),
+                    "hold_histogram": dict(zip(bucketNames, self.holdHistogram)),
+                    "top_queries": [{"query": shape,
+                                     "count": count,
+                                     "hold_time": round(total, 4),
+                                     "max_hold_time": round(maxHeld, 4),
+                                     "hold_histogram": dict(zip(bucketNames, histogram))}
+                                    for shape, (count, total, maxHeld, histogram) in worst]}
+
+class DBLockRegistry(object):
+    """
+    Hands out one DBLock per database file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def getLock(self, fullPath):
+        dbLock = self._locks.get(fullPath)
+        if dbLock is None:
+            with self._lock:
+                dbLock = self._locks.setdefault(fullPath, DBLock(fullPath))
+        return dbLock
+
+    def stats(self):
+        with self._lock:
+            dbLocks = self._locks.items()
+        return dict([(ek.ek(os.path.basename, fullPath), dbLock.stats()) for fullPath, dbLock in dbLocks])
+
+dbLocks = DBLockRegistry()
+
+class ConnectionPool(object):
+    """
+    Keeps one open sqlite connection per database file per thread so that every
+    DBConnection created by a thread reuses the same handle instead of opening
+    the file again.
+
+    Connections belonging to threads that have exited are closed the next time
+    a connection is opened, or all at once by closeAll().
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # thread object -> {full db path: sqlite3 connection}
+        self._threads = {}
+        # bumped by closeAll() so other threads drop their stale handles
+        self._generation = 0
+
+        self.opens = 0
+        self.reuses = 0
+        self.closes = 0
+
+    def getConnection(self, fullPath):
+        if getattr(self._local, 'generation', None) != self._generation:
+            self._local.connections = {}
+            self._local.generation = self._generation
+        threadConnections = self._local.connections
+
+        connection = threadConnections.get(fullPath)
+        if connection is not None:
+            with self._lock:
+                self.reuses += 1
+            return connection
+
+        connection = self._connect(fullPath)
+        threadConnections[fullPath] = connection
+
+        with self._lock:
+            self.opens += 1
+            self._threads.setdefault(threading.currentThread(), {})[fullPath] = connection
+            self._reap()
+
+        return connection
+
+    def _connect(self, fullPath):
+        # connections are never shared between threads, we just need to be able
+        # to close them from another thread once their owner has exited
+        connection = sqlite3.connect(fullPath, 20, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+
+        for name, value in parsePragmas(sickbeard.DB_PRAGMAS):
+            try:
+                connection.execute("PRAGMA %s = %s" % (name, value))
+            except sqlite3.DatabaseError, e:
+                logger.log(u"Unable to set DB pragma " + name + ": " + ex(e), logger.WARNING)
+
+        # readers only need to be kept away from writers when the file isn't in WAL mode
+        journalMode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        dbLocks.getLock(fullPath).walMode = journalMode.lower() == 'wal'
+
+        return connection
+
+    def _reap(self):
+        """
+        Closes the connections of threads which are no longer running. Must be
+        called with self._lock held.
+        """
+        for curThread in self._threads.keys():
+            if curThread.isAlive():
+                continue
+            for connection in self._threads.pop(curThread).values():
+                self._close(connection)
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
+        self.closes += 1
+
+    def closeThreadConnections(self):
+        """
+        Closes every connection opened by the calling thread.
+        """
+        with self._lock:
+            for connection in self._threads.pop(threading.currentThread(), {}).values():
+                self._close(connection)
+        self._local.connections = {}
+
+    def closeAll(self):
+        """
+        Closes every pooled connection, only call this when no queries are running.
+        """
+        with self._lock:
+            for curConnections in self._threads.values():
+                for connection in curConnections.values():
+                    self._close(connection)
+            self._threads = {}
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {"opens": self.opens,
+                    "reuses": self.reuses,
+                    "closes": self.closes,
+                    "open_connections": sum([len(x) for x in self._threads.values()]),
+                    "threads": len(self._threads)}
+
+connectionPool = ConnectionPool()
+
 class DBConnection:
     def __init__(self, filename="sickbeard.db", suffix=None, row_type=None):
 
         self.filename = filename
-        self.connection = sqlite3.connect(dbFilename(filename), 20)
+        self.connection = connectionPool.getConnection(dbFilename(filename))
+        self.lock = dbLocks.getLock(dbFilename(filename))
         if row_type == "dict":
-            self.connection.row_factory = self._dict_factory
+            self.row_factory = self._dict_factory
         else:
-            self.connection.row_factory = sqlite3.Row
+            self.row_factory = sqlite3.Row
+
+    def _execute(self, query, args=None):
+        # the pooled connection is shared by every DBConnection in this thread so the
+        # row type is set per cursor instead of on the connection
+        cursor = self.connection.cursor()
+        cursor.row_factory = self.row_factory
+        if args == None:
+            return cursor.execute(query)
+        return cursor.execute(query, args)
 
     def checkDBVersion(self):
         try:
@@ -67,11 +370,18 @@ class DBConnection:
             return 0
 
     def mass_action(self, querylist, logTransaction=False):
+        """
+        Runs all the queries in querylist in a single transaction. Each entry is
+        [query] or [query, args], or [query, argsList, True] to run the query once
+        per set of args with executemany.
+        """
 
-        with db_lock:
+        if querylist == None:
+            return
 
-            if querylist == None:
-                return
+        self.lock.acquire(True)
+        lockedTime = time.time()
+        try:
 
             sqlResult = []
             attempt = 0
@@ -82,11 +392,15 @@ class DBConnection:
                         if len(qu) == 1:
                             if logTransaction:
                                 logger.log(qu[0], logger.DEBUG)
-                            sqlResult.append(self.connection.execute(qu[0]))
+                            sqlResult.append(self._execute(qu[0]))
+                        elif len(qu) > 2 and qu[2]:
+                            if logTransaction:
+                                logger.log(qu[0] + " with " + str(len(qu[1])) + " sets of args", logger.DEBUG)
+                            sqlResult.append(self.connection.executemany(qu[0], qu[1]))
                         elif len(qu) > 1:
                             if logTransaction:
                                 logger.log(qu[0] + " with args " + str(qu[1]), logger.DEBUG)
-                            sqlResult.append(self.connection.execute(qu[0], qu[1]))
+                            sqlResult.append(self._execute(qu[0], qu[1]))
                     self.connection.commit()
                     logger.log(u"Transaction with " + str(len(querylist)) + u" query's executed", logger.DEBUG)
                     return sqlResult
@@ -109,25 +423,28 @@ class DBConnection:
                     raise
 
             return sqlResult
+        finally:
+            self.lock.release(True, "TRANSACTION " + (querylist[0][0] if querylist else ''), time.time() - lockedTime)
 
     def action(self, query, args=None):
 
-        with db_lock:
+        if query == None:
+            return
 
-            if query == None:
-                return
-    
+        self.lock.acquire(True)
+        lockedTime = time.time()
+        try:
             sqlResult = None
             attempt = 0
-    
+
             while attempt < 5:
                 try:
                     if args == None:
                         logger.log(self.filename+": "+query, logger.DEBUG)
-                        sqlResult = self.connection.execute(query)
+                        sqlResult = self._execute(query)
                     else:
                         logger.log(self.filename+": "+query+" with args "+str(args), logger.DEBUG)
-                        sqlResult = self.connection.execute(query, args)
+                        sqlResult = self._execute(query, args)
                     self.connection.commit()
                     # get out of the connection attempt loop since we were successful
                     break
@@ -142,13 +459,46 @@ class DBConnection:
                 except sqlite3.DatabaseError, e:
                     logger.log(u"Fatal error executing query: " + ex(e), logger.ERROR)
                     raise
-    
+
             return sqlResult
+        finally:
+            self.lock.release(True, query, time.time() - lockedTime)
 
 
     def select(self, query, args=None):
 
-        sqlResults = self.action(query, args).fetchall()
+        if query == None:
+            return []
+
+        locked = self.lock.acquire(False) != None
+        lockedTime = time.time()
+        try:
+            sqlResults = None
+            attempt = 0
+
+            while attempt < 5:
+                try:
+                    if args == None:
+                        logger.log(self.filename+": "+query, logger.DEBUG)
+                        sqlResults = self._execute(query).fetchall()
+                    else:
+                        logger.log(self.filename+": "+query+" with args "+str(args), logger.DEBUG)
+                        sqlResults = self._execute(query, args).fetchall()
+                    break
+                except sqlite3.OperationalError, e:
+                    if "unable to open database file" in e.message or "database is locked" in e.message:
+                        logger.log(u"DB error: "+ex(e), logger.WARNING)
+                        attempt += 1
+                        time.sleep(1)
+                    else:
+                        logger.log(u"DB error: "+ex(e), logger.ERROR)
+                        raise
+                except sqlite3.DatabaseError, e:
+                    logger.log(u"Fatal error executing query: " + ex(e), logger.ERROR)
+                    raise
+        finally:
+            if locked:
+                self.lock.release(False, query, time.time() - lockedTime)
 
         if sqlResults == None:
             return []
@@ -170,6 +520,55 @@ class DBConnection:
                      " VALUES (" + ", ".join(["?"] * len(valueDict.keys() + keyDict.keys())) + ")"
             self.action(query, valueDict.values() + keyDict.values())
 
+    def mass_upsert(self, tableName, rowList):
+        """
+        Does an upsert for every (valueDict, keyDict) pair in rowList, all of them in a single transaction.
+        """
+
+        if not rowList:
+            return
+
+        genParams = lambda myDict : [x + " = ?" for x in myDict.keys()]
+
+        self.lock.acquire(True)
+        lockedTime = time.time()
+        try:
+            attempt = 0
+
+            while attempt < 5:
+                try:
+                    for valueDict, keyDict in rowList:
+                        changesBefore = self.connection.total_changes
+
+                        query = "UPDATE "+tableName+" SET " + ", ".join(genParams(valueDict)) + " WHERE " + " AND ".join(genParams(keyDict))
+                        self._execute(query, valueDict.values() + keyDict.values())
+
+                        if self.connection.total_changes == changesBefore:
+                            query = "INSERT INTO "+tableName+" (" + ", ".join(valueDict.keys() + keyDict.keys()) + ")" + \
+                                     " VALUES (" + ", ".join(["?"] * len(valueDict.keys() + keyDict.keys())) + ")"
+                            self._execute(query, valueDict.values() + keyDict.values())
+
+                    self.connection.commit()
+                    logger.log(u"Transaction with " + str(len(rowList)) + u" upserts into " + tableName + u" executed", logger.DEBUG)
+                    return
+                except sqlite3.OperationalError, e:
+                    if self.connection:
+                        self.connection.rollback()
+                    if "unable to open database file" in e.message or "database is locked" in e.message:
+                        logger.log(u"DB error: " + ex(e), logger.WARNING)
+                        attempt += 1
+                        time.sleep(1)
+                    else:
+                        logger.log(u"DB error: " + ex(e), logger.ERROR)
+                        raise
+                except sqlite3.DatabaseError, e:
+                    if self.connection:
+                        self.connection.rollback()
+                    logger.log(u"Fatal error executing query: " + ex(e), logger.ERROR)
+                    raise
+        finally:
+            self.lock.release(True, "UPSERT " + tableName, time.time() - lockedTime)
+
     def tableInfo(self, tableName):
         # FIXME ? binding is not supported here, but I cannot find a way to escape a string manually
         cursor = self.connection.execute("PRAGMA table_info(%s)" % tableName)
@@ -0,0 +1,158 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from sickbeard import db, helpers
+
+from sickbeard import encodingKludge as ek
+
+# the size, modification time and inode of every media file in the show folders are kept in the
+# file_states table of cache.db so a refresh only has to look at what changed since the last one.
+# the folders are kept there too, with a path ending in os.sep, since a folder's mtime changes when
+# a file like an nfo or tbn is made or deleted in it
+
+def fileState(path):
+    """
+    Returns a (size, mtime, inode) tuple for a file or None if it can't be read.
+    """
+    try:
+        stat = ek.ek(os.stat, path)
+    except OSError:
+        return None
+
+    return (stat.st_size, int(stat.st_mtime), stat.st_ino)
+
+def folderState(path):
+    """
+    Returns a (size, mtime, inode) tuple for a folder or None if it can't be read. The mtime isn't rounded
+    since a file can be made in a folder in the same second it was scanned.
+    """
+    try:
+        stat = ek.ek(os.stat, path)
+    except OSError:
+        return None
+
+    return (stat.st_size, stat.st_mtime, stat.st_ino)
+
+def folderKey(path):
+    """
+    The path a folder is kept under in file_states.
+    """
+    return ek.ek(os.path.join, path, '')
+
+def _getStates(tvdbid):
+    myDB = db.DBConnection("cache.db")
+    sqlResults = myDB.select("SELECT path, size, mtime, inode FROM file_states WHERE tvdb_id = ?", [tvdbid])
+
+    return dict([(x["path"], (x["size"], x["mtime"], x["inode"])) for x in sqlResults])
+
+def getFileStates(tvdbid):
+    """
+    Returns {path: (size, mtime, inode)} for all the files of a show as they were at the last scan.
+    """
+    return dict([(x, y) for x, y in _getStates(tvdbid).items() if not x.endswith(os.sep)])
+
+def getFolderStates(tvdbid):
+    """
+    Returns {folderKey(path): (size, mtime, inode)} for all the folders of a show as they were at the last scan.
+    """
+    return dict([(x, y) for x, y in _getStates(tvdbid).items() if x.endswith(os.sep)])
+
+def updateFileStates(tvdbid, states, removedPaths=[]):
+    """
+    Remembers the states of some of a show's files and forgets others, in one transaction.
+
+    states: {path: (size, mtime, inode)} of the files to remember
+    removedPaths: the paths to forget
+    """
+    myDB = db.DBConnection("cache.db")
+    myDB.mass_action([["DELETE FROM file_states WHERE tvdb_id = ? AND path = ?", [[tvdbid, x] for x in removedPaths], True],
+                      ["INSERT OR REPLACE INTO file_states (tvdb_id, path, size, mtime, inode) VALUES (?,?,?,?,?)",
+                       [[tvdbid, path] + list(state) for path, state in states.items()], True]])
+
+def clearFileStates(tvdbid):
+    myDB = db.DBConnection("cache.db")
+    myDB.action("DELETE FROM file_states WHERE tvdb_id = ?", [tvdbid])
+
+class DirScan(object):
+    """
+    The media files in a show folder compared to the last scan of it.
+
+    files: {path: (size, mtime, inode)} of every media file in the folder now
+    changed: the paths which are new or have changed since the last scan, all of them on a full scan
+    removed: the paths of the last scan which aren't there anymore
+
+    folders: {folderKey(path): (size, mtime, inode)} of the folders that were looked in, including the
+             ones that are skipped like .meta since metadata can be kept in them
+    changedFolders: the folderKeys of the folders which are new or have changed since the last scan
+    removedFolders: the folderKeys of the last scan which aren't there anymore
+    """
+
+    def __init__(self, tvdbid, showDir, fullScan=False):
+        self.files = {}
+        self.folders = {}
+        if showDir and ek.ek(os.path.isdir, showDir):
+            self._scanFolder(showDir)
+
+        knownStates = getFileStates(tvdbid)
+        knownFolders = getFolderStates(tvdbid)
+
+        if fullScan:
+            self.changed = self.files.keys()
+            self.changedFolders = self.folders.keys()
+        else:
+            self.changed = [x for x in self.files if knownStates.get(x) != self.files[x]]
+            self.changedFolders = [x for x in self.folders if knownFolders.get(x) != self.folders[x]]
+
+        self.removed = [x for x in knownStates if x not in self.files]
+        self.removedFolders = [x for x in knownFolders if x not in self.folders]
+
+    def _scanFolder(self, folder):
+        # the same files as helpers.listMediaFiles
+        state = folderState(folder)
+        if state is None:
+            return
+        self.folders[folderKey(folder)] = state
+
+        for curFile in ek.ek(os.listdir, folder):
+            fullCurFile = ek.ek(os.path.join, folder, curFile)
+
+            if ek.ek(os.path.isdir, fullCurFile):
+                if not curFile.startswith('.') and not curFile == 'Extras':
+                    self._scanFolder(fullCurFile)
+                else:
+                    state = folderState(fullCurFile)
+                    if state is not None:
+                        self.folders[folderKey(fullCurFile)] = state
+
+            elif helpers.isMediaFile(curFile):
+                state = fileState(fullCurFile)
+                if state is not None:
+                    self.files[fullCurFile] = state
+
+    def metaFolders(self):
+        """
+        Returns the folderKeys of the folders in which a file's nfo or tbn may have been made or deleted since
+        the last scan, a changed folder and the one it's in (for metadata subfolders like .meta or metadata).
+        """
+        result = set()
+        for curFolder in self.changedFolders:
+            result.add(curFolder)
+            result.add(folderKey(ek.ek(os.path.dirname, curFolder.rstrip(os.sep))))
+        return result
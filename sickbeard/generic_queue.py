@@ -16,7 +16,11 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
+from __future__ import with_statement
+
 import datetime
+import heapq
+import itertools
 import threading
 
 from sickbeard import logger
@@ -28,18 +32,66 @@ class QueuePriorities:
 
 class GenericQueue(object):
 
+    # how many items can run at once, subclasses can make it a property to read it from the config
+    max_workers = 1
+
+    # action_id -> how many items with that action can run at once
+    action_limits = {}
+
     def __init__(self):
 
-        self.currentItem = None
-        self.queue = []
+        # (-priority, added, order, item, index keys) so the highest priority and then the oldest item is on top
+        self._heap = []
+
+        # index key -> how many queued items have it, see _indexKeys
+        self._index = {}
 
-        self.thread = None
+        # breaks ties between items added at the same moment so they come out in the order they went in
+        self._counter = itertools.count()
+
+        # (thread, item) for every item that's running
+        self.workers = []
+
+        self.lock = threading.Lock()
 
         self.queue_name = "QUEUE"
 
         self.min_priority = 0
-        
-        self.currentItem = None
+
+        # the scheduler which runs this queue, it sets this itself
+        self.scheduler = None
+
+        # items whose execute() returned, they're finished on the next run
+        self._doneItems = []
+
+    def _wakeup(self):
+        """
+        Gets the queue looked at right away instead of on its next cycle.
+        """
+        if self.scheduler:
+            self.scheduler.wakeup()
+
+    def _getQueue(self):
+        with self.lock:
+            return [x[3] for x in sorted(self._heap)]
+
+    # the items waiting to run, in the order they'd run in
+    queue = property(_getQueue)
+
+    def _getCurrentItems(self):
+        return [x[1] for x in self.workers]
+
+    def _getCurrentItem(self):
+        currentItems = self._getCurrentItems()
+        if currentItems:
+            return currentItems[0]
+        return None
+
+    # the items that are running right now
+    currentItems = property(_getCurrentItems)
+
+    # one of the running items, for code that only ever had one
+    currentItem = property(_getCurrentItem)
 
     def pause(self):
         logger.log(u"Pausing queue")
@@ -48,58 +100,99 @@ class GenericQueue(object):
     def unpause(self):
         logger.log(u"Unpausing queue")
         self.min_priority = 0
+        self._wakeup()
+
+    def _indexKeys(self, item):
+        """
+        Returns the keys is_queued can find the item by while it's waiting to run. Subclasses can add
+        their own (eg. the show the item is for), they should keep the item itself in the list.
+        """
+        return [item]
+
+    def is_queued(self, key):
+        """
+        Returns True if an item with the given index key (or the item itself) is waiting to run.
+        """
+        return self._index.get(key, 0) > 0
 
     def add_item(self, item):
         item.added = datetime.datetime.now()
-        self.queue.append(item)
+        with self.lock:
+            keys = self._indexKeys(item)
+            heapq.heappush(self._heap, (-item.priority, item.added, self._counter.next(), item, keys))
+            for curKey in keys:
+                self._index[curKey] = self._index.get(curKey, 0) + 1
+
+        self._wakeup()
         
         return item
 
+    def _unindex(self, keys):
+        for curKey in keys:
+            if self._index[curKey] > 1:
+                self._index[curKey] -= 1
+            else:
+                del self._index[curKey]
+
+    def _canRun(self, queueItem, runningItems):
+        """
+        Returns True if the item can start next to the ones that are running. Subclasses can add their
+        own rules, they should call this one too.
+        """
+
+        limit = self.action_limits.get(queueItem.action_id)
+        if limit is not None and len([x for x in runningItems if x.action_id == queueItem.action_id]) >= limit:
+            return False
+
+        return True
+
+    def _executeItem(self, queueItem):
+        try:
+            queueItem.execute()
+        finally:
+            with self.lock:
+                self._doneItems.append(queueItem)
+            self._wakeup()
+
     def run(self):
 
-        # only start a new task if one isn't already going
-        if self.thread == None or self.thread.isAlive() == False:
-
-            # if the thread is dead then the current item should be finished
-            if self.currentItem != None:
-                self.currentItem.finish()
-                self.currentItem = None
-
-            # if there's something in the queue then run it in a thread and take it out of the queue
-            if len(self.queue) > 0:
-
-                # sort by priority
-                def sorter(x,y):
-                    """
-                    Sorts by priority descending then time ascending
-                    """
-                    if x.priority == y.priority:
-                        if y.added == x.added:
-                            return 0
-                        elif y.added < x.added:
-                            return 1
-                        elif y.added > x.added:
-                            return -1
-                    else:
-                        return y.priority-x.priority
-
-                self.queue.sort(cmp=sorter)
-                
-                queueItem = self.queue[0]
+        with self.lock:
 
+            # if an item's thread is dead (or about to be) then the item should be finished
+            for curWorker in self.workers[:]:
+                if curWorker[1] in self._doneItems or not curWorker[0].isAlive():
+                    curWorker[1].finish()
+                    self.workers.remove(curWorker)
+            self._doneItems = []
+
+            # start items from the top of the heap while there are free workers, an item that has to wait
+            # is set aside so it doesn't hold up the ones behind it
+            waiting = []
+            while self._heap and len(self.workers) < max(self.max_workers, 1):
+
+                queueItem = self._heap[0][3]
+
+                # everything below this one has a lower priority too
                 if queueItem.priority < self.min_priority:
-                    return
+                    break
+
+                entry = heapq.heappop(self._heap)
+
+                if not self._canRun(queueItem, self.currentItems):
+                    waiting.append(entry)
+                    continue
+
+                self._unindex(entry[4])
 
                 # launch the queue item in a thread
-                # TODO: improve thread name
                 threadName = self.queue_name + '-' + queueItem.get_thread_name()
-                self.thread = threading.Thread(None, queueItem.execute, threadName)
-                self.thread.start()
+                thread = threading.Thread(None, self._executeItem, threadName, (queueItem,))
+                thread.start()
 
-                self.currentItem = queueItem
+                self.workers.append((thread, queueItem))
 
-                # take it out of the queue
-                del self.queue[0]
+            for entry in waiting:
+                heapq.heappush(self._heap, entry)
 
 class QueueItem:
     def __init__(self, name, action_id = 0):
@@ -16,7 +16,6 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
-import StringIO, zlib, gzip
 import os
 import stat
 import urllib, urllib2
@@ -33,10 +32,12 @@ import sickbeard
 
 from sickbeard.exceptions import MultipleShowObjectsException, ex
 from sickbeard import logger, classes
-from sickbeard.common import USER_AGENT, mediaExtensions, XML_NSMAP
+from sickbeard.common import mediaExtensions, XML_NSMAP
 
 from sickbeard import db
 from sickbeard import encodingKludge as ek
+from sickbeard import show_index
+from sickbeard import http_client
 from sickbeard import notifiers
 
 from lib.tvdb_api import tvdb_api, tvdb_exceptions
@@ -127,28 +128,15 @@ def getURL (url, headers=[]):
     Returns a byte-string retrieved from the url provider.
     """
 
-    opener = urllib2.build_opener()
-    opener.addheaders = [('User-Agent', USER_AGENT), ('Accept-Encoding', 'gzip,deflate')]
-    for cur_header in headers:
-        opener.addheaders.append(cur_header)
-
     try:
-        usock = opener.open(url)
-        url = usock.geturl()
-        encoding = usock.info().get("Content-Encoding")
-
-        if encoding in ('gzip', 'x-gzip', 'deflate'):
-            content = usock.read()
-            if encoding == 'deflate':
-                data = StringIO.StringIO(zlib.decompress(content))
-            else:
-                data = gzip.GzipFile('', 'rb', 9, StringIO.StringIO(content))
-            result = data.read()
+        response = http_client.httpClient.fetch(url, headers)
+        url = response.url
 
-        else:
-            result = usock.read()
+        if response.status >= 400:
+            logger.log(u"HTTP error " + str(response.status) + " while loading URL " + url, logger.WARNING)
+            return None
 
-        usock.close()
+        result = response.body
 
     except urllib2.HTTPError, e:
         logger.log(u"HTTP error " + str(e.code) + " while loading URL " + url, logger.WARNING)
@@ -162,6 +150,9 @@ def getURL (url, headers=[]):
     except socket.timeout:
         logger.log(u"Timed out while loading URL " + url, logger.WARNING)
         return None
+    except socket.error, e:
+        logger.log(u"URL error " + ex(e) + " while loading URL " + url, logger.WARNING)
+        return None
     except ValueError:
         logger.log(u"Unknown error while loading URL " + url, logger.WARNING)
         return None
@@ -172,6 +163,9 @@ def getURL (url, headers=[]):
     return result
 
 def findCertainShow (showList, tvdbid):
+    if showList is sickbeard.showList:
+        return show_index.findByTVDB(tvdbid)
+
     results = filter(lambda x: x.tvdbid == tvdbid, showList)
     if len(results) == 0:
         return None
@@ -185,6 +179,9 @@ def findCertainTVRageShow (showList, tvrid):
     if tvrid == 0:
         return None
 
+    if showList is sickbeard.showList:
+        return show_index.findByTVRage(tvrid)
+
     results = filter(lambda x: x.tvrid == tvrid, showList)
 
     if len(results) == 0:
@@ -348,6 +345,11 @@ def searchDBForShow(regShowName):
 
     showNames = [re.sub('[. -]', ' ', regShowName)]
 
+    # the loaded shows are indexed by name so try those before going to the DB
+    showObj = show_index.findByName(regShowName)
+    if showObj:
+        return (showObj.tvdbid, showObj.name)
+
     myDB = db.DBConnection()
 
     yearRegex = "([^()]+?)\s*(\()?(\d{4})(?(2)\))$"
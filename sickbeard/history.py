@@ -18,18 +18,124 @@
 
 import db
 import datetime
+import os.path
+import re
 
+import sickbeard
+
+from sickbeard import logger
 from sickbeard.common import SNATCHED, Quality
 
 dateFormat = "%Y%m%d%H%M%S"
 
+# the columns of a history entry, getHistory adds history_id and show_name
+HISTORY_FIELDS = ('action', 'date', 'showid', 'season', 'episode', 'quality', 'resource', 'provider')
+
+def resourceKey(name):
+    """
+    Returns the name a resource is looked up by, the same for "Show.Name.S01E01", "show name s01e01"
+    and "Show-Name_S01E01".
+    """
+    return re.sub("[\.\-\ _]", "_", name).lower()
+
 def _logHistoryItem(action, showid, season, episode, quality, resource, provider):
 
     logDate = datetime.datetime.today().strftime(dateFormat)
 
     myDB = db.DBConnection()
-    myDB.action("INSERT INTO history (action, date, showid, season, episode, quality, resource, provider) VALUES (?,?,?,?,?,?,?,?)",
-                [action, logDate, showid, season, episode, quality, resource, provider])
+    myDB.action("INSERT INTO history (action, date, showid, season, episode, quality, resource, provider, resource_key) VALUES (?,?,?,?,?,?,?,?,?)",
+                [action, logDate, showid, season, episode, quality, resource, provider, resourceKey(resource)])
+
+def findByResource(name):
+    """
+    Returns the history entries whose resource has the given name, see resourceKey.
+    """
+
+    myDB = db.DBConnection()
+    return myDB.select("SELECT * FROM history WHERE resource_key = ?", [resourceKey(name)])
+
+def getHistory(limit=100, before=None, actions=None):
+    """
+    Returns a page of the history, newest first, with the show names.
+
+    limit: how many entries to return, 0 for all of them
+    before: the history_id of the last entry of the previous page, the page starts after it
+    actions: only the entries with one of these actions
+
+    Returns (entries, the history_id to get the next page with or None if there aren't any more).
+    """
+
+    myDB = db.DBConnection(row_type="dict")
+
+    conditions = ["h.showid = s.tvdb_id"]
+    params = []
+
+    if actions:
+        conditions.append("h.action IN (" + ",".join(["?"] * len(actions)) + ")")
+        params += actions
+
+    # the page goes on from where the last one stopped, the index on the date finds it
+    if before != None:
+        lastResults = myDB.select("SELECT date FROM history WHERE rowid = ?", [before])
+        if not lastResults:
+            return ([], None)
+        conditions.append("(h.date < ? OR (h.date = ? AND h.rowid < ?))")
+        params += [lastResults[0]["date"], lastResults[0]["date"], before]
+
+    query = "SELECT h.rowid AS history_id, " + ", ".join(["h." + x for x in HISTORY_FIELDS]) + ", show_name FROM history h, tv_shows s" \
+            " WHERE " + " AND ".join(conditions) + " ORDER BY h.date DESC, h.rowid DESC"
+
+    if limit:
+        # one more than they asked for tells us if there's another page
+        sqlResults = myDB.select(query + " LIMIT ?", params + [limit + 1])
+    else:
+        sqlResults = myDB.select(query, params)
+
+    if limit and len(sqlResults) > limit:
+        sqlResults = sqlResults[:limit]
+        return (sqlResults, sqlResults[-1]["history_id"])
+
+    return (sqlResults, None)
+
+def archiveHistory(days):
+    """
+    Moves the history entries older than the given number of days to history_archive, which only keeps
+    the file name of the resource.
+
+    Returns how many entries were moved.
+    """
+
+    oldestDate = (datetime.datetime.today() - datetime.timedelta(days=days)).strftime(dateFormat)
+
+    myDB = db.DBConnection()
+    oldResults = myDB.select("SELECT " + ", ".join(HISTORY_FIELDS) + " FROM history WHERE date < ?", [oldestDate])
+
+    if not oldResults:
+        return 0
+
+    archived = [[x[curField] if curField != 'resource' else os.path.basename(x[curField] or '') for curField in HISTORY_FIELDS]
+                for x in oldResults]
+    myDB.mass_action([["INSERT INTO history_archive (" + ", ".join(HISTORY_FIELDS) + ") VALUES (?,?,?,?,?,?,?,?)", archived, True],
+                      ["DELETE FROM history WHERE date < ?", [oldestDate]]])
+
+    return len(oldResults)
+
+class HistoryArchiver():
+    """
+    Moves the history entries older than sickbeard.HISTORY_ARCHIVE_DAYS to the archive once a day.
+    """
+
+    def __init__(self):
+        self.updateInterval = datetime.timedelta(hours=24)
+
+    def run(self):
+
+        if not sickbeard.HISTORY_ARCHIVE_DAYS:
+            return
+
+        archived = archiveHistory(sickbeard.HISTORY_ARCHIVE_DAYS)
+        if archived:
+            logger.log(u"Moved " + str(archived) + " history entries older than " + str(sickbeard.HISTORY_ARCHIVE_DAYS) + " days to the archive")
 
 
 def logSnatch(searchResult):
@@ -0,0 +1,270 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import with_statement
+
+import gzip
+import httplib
+import socket
+import StringIO
+import threading
+import time
+import urllib
+import urllib2
+import urlparse
+import zlib
+
+import sickbeard
+
+from sickbeard import logger
+from sickbeard.common import USER_AGENT
+
+# how many times we follow a redirect before giving up, the same limit urllib2 uses
+MAX_REDIRECTS = 10
+
+REDIRECT_CODES = (301, 302, 303, 307)
+
+# errors which mean a kept alive connection was closed by the server while it sat in the pool
+STALE_CONNECTION_ERRORS = (httplib.BadStatusLine, httplib.CannotSendRequest, httplib.ResponseNotReady, socket.error)
+
+def decodeContent(content, encoding):
+    """
+    Unpacks a gzip or deflate encoded response body, anything else is returned untouched.
+    """
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        if encoding == 'deflate':
+            data = StringIO.StringIO(zlib.decompress(content))
+        else:
+            data = gzip.GzipFile('', 'rb', 9, StringIO.StringIO(content))
+        return data.read()
+
+    return content
+
+class HTTPResponse(object):
+    """
+    A fully read response: the url it finally came from (after redirects), the status, the headers
+    and the decoded body.
+    """
+
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+class HTTPConnectionPool(object):
+    """
+    The idle kept alive connections to a single host.
+    """
+
+    def __init__(self, scheme, host, port):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+
+        self._lock = threading.Lock()
+        self._idle = [] # (connection, time it was put back), most recently used last
+
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def _newConnection(self):
+        # no timeout is given so the socket default, sickbeard.SOCKET_TIMEOUT, applies like it does for urllib2
+        if self.scheme == 'https':
+            return httplib.HTTPSConnection(self.host, self.port)
+        else:
+            return httplib.HTTPConnection(self.host, self.port)
+
+    def getConnection(self):
+        """
+        Returns a (connection, reused) tuple, an idle connection is used if there's one that hasn't
+        been sitting around for longer than sickbeard.HTTP_KEEPALIVE_TIMEOUT.
+        """
+
+        with self._lock:
+            while self._idle:
+                connection, lastUsed = self._idle.pop()
+                if time.time() - lastUsed <= sickbeard.HTTP_KEEPALIVE_TIMEOUT:
+                    self.reused += 1
+                    return (connection, True)
+                connection.close()
+                self.discarded += 1
+
+            self.opened += 1
+
+        return (self._newConnection(), False)
+
+    def putConnection(self, connection):
+        """
+        Hands back a connection whose response was read completely so the next request can reuse it.
+        """
+
+        with self._lock:
+            self._idle.append((connection, time.time()))
+            while len(self._idle) > max(sickbeard.HTTP_POOL_SIZE, 0):
+                oldest = self._idle.pop(0)[0]
+                oldest.close()
+                self.discarded += 1
+
+    def discard(self, connection):
+        connection.close()
+        with self._lock:
+            self.discarded += 1
+
+    def closeAll(self):
+        with self._lock:
+            for connection, lastUsed in self._idle:
+                connection.close()
+            self._idle = []
+
+    def stats(self):
+        with self._lock:
+            return {'idle': len(self._idle), 'opened': self.opened, 'reused': self.reused, 'discarded': self.discarded}
+
+class HTTPClient(object):
+    """
+    Fetches URLs over persistent connections, one pool of idle connections per host.
+
+    When a proxy is configured in the environment the requests go through urllib2 like they always
+    did, without keep-alive.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+        self.requests = 0
+        self.retries = 0
+
+    def _getPool(self, scheme, host, port):
+        key = (scheme, host, port)
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = HTTPConnectionPool(scheme, host, port)
+            return self._pools[key]
+
+    def _request(self, url, headers):
+        parsedURL = urlparse.urlsplit(url)
+        scheme = parsedURL.scheme.lower()
+        if scheme not in ('http', 'https'):
+            raise ValueError("Unsupported URL scheme " + scheme)
+
+        port = parsedURL.port or (scheme == 'https' and 443 or 80)
+        path = parsedURL.path or '/'
+        if parsedURL.query:
+            path += '?' + parsedURL.query
+
+        pool = self._getPool(scheme, parsedURL.hostname, port)
+
+        while True:
+            connection, reused = pool.getConnection()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except STALE_CONNECTION_ERRORS, e:
+                pool.discard(connection)
+                # the server probably dropped the idle connection, try again on a new one
+                if reused and not isinstance(e, socket.timeout):
+                    logger.log(u"Kept alive connection to " + pool.host + " was closed, retrying on a new one", logger.DEBUG)
+                    with self._lock:
+                        self.retries += 1
+                    continue
+                raise
+            except:
+                pool.discard(connection)
+                raise
+
+            if response.will_close:
+                pool.discard(connection)
+            else:
+                pool.putConnection(connection)
+
+            return (response, body)
+
+    def _fetchWithUrllib(self, url, headers):
+        opener = urllib2.build_opener()
+        opener.addheaders = headers.items()
+
+        usock = opener.open(url)
+        try:
+            url = usock.geturl()
+            encoding = usock.info().get("Content-Encoding")
+            body = decodeContent(usock.read(), encoding)
+            return HTTPResponse(url, usock.code, usock.msg, usock.info(), body)
+        finally:
+            usock.close()
+
+    def fetch(self, url, headers=[]):
+        """
+        Does a GET request, following any redirects.
+
+        url: the URL to get
+        headers: a list of (name, value) tuples to send along with the default ones
+
+        Returns an HTTPResponse, errors from the connection are raised as they are.
+        """
+
+        with self._lock:
+            self.requests += 1
+
+        requestHeaders = {'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip,deflate'}
+        for name, value in headers:
+            requestHeaders[name] = value
+
+        if urllib.getproxies() and not urllib.proxy_bypass(urlparse.urlsplit(url).hostname or ''):
+            return self._fetchWithUrllib(url, requestHeaders)
+
+        for i in range(MAX_REDIRECTS + 1):
+            response, body = self._request(url, requestHeaders)
+
+            location = response.getheader('location')
+            if response.status in REDIRECT_CODES and location:
+                url = urlparse.urljoin(url, location)
+                continue
+
+            body = decodeContent(body, response.getheader('content-encoding'))
+            return HTTPResponse(url, response.status, response.reason, response.msg, body)
+
+        raise httplib.HTTPException("Too many redirects while loading URL " + url)
+
+    def closeAll(self):
+        with self._lock:
+            pools = self._pools.values()
+        for curPool in pools:
+            curPool.closeAll()
+
+    def stats(self):
+        """
+        Returns how many requests were made and how many connections each host needed for them.
+        """
+        with self._lock:
+            pools = self._pools.values()
+            stats = {'requests': self.requests, 'retries': self.retries, 'opened': 0, 'reused': 0, 'hosts': {}}
+
+        for curPool in pools:
+            poolStats = curPool.stats()
+            stats['hosts']['%s://%s:%d' % (curPool.scheme, curPool.host, curPool.port)] = poolStats
+            stats['opened'] += poolStats['opened']
+            stats['reused'] += poolStats['reused']
+
+        return stats
+
+httpClient = HTTPClient()
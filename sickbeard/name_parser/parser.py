@@ -16,9 +16,12 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
+from __future__ import with_statement
+
 import datetime
 import os.path
 import re
+import threading
 
 import regexes
 
@@ -26,12 +29,35 @@ import sickbeard
 
 from sickbeard import logger
 
+def _compile_regexes():
+    compiled_regexes = []
+    for (cur_pattern_name, cur_pattern) in regexes.ep_regexes:
+        try:
+            cur_regex = re.compile(cur_pattern, re.VERBOSE | re.IGNORECASE)
+        except re.error, errormsg:
+            logger.log(u"WARNING: Invalid episode_pattern, %s. %s" % (errormsg, cur_pattern))
+        else:
+            compiled_regexes.append((cur_pattern_name, cur_regex))
+    return compiled_regexes
+
+# compiled once for the whole process so creating a NameParser costs nothing
+compiled_regexes = _compile_regexes()
+
+# the regexes used to tidy up names once the episode regexes have matched
+_series_name_regexes = [(re.compile("(\D)\.(?!\s)(\D)"), "\\1 \\2"),
+                        (re.compile("(\d)\.(\d{4})"), "\\1 \\2"), # if it ends in a year then don't keep the dot
+                        (re.compile("(\D)\.(?!\s)"), "\\1 "),
+                        (re.compile("\.(?!\s)(\D)"), " \\1"),
+                        ]
+_trailing_hyphen_regex = re.compile("-$")
+_extension_regex = re.compile('(.*)\.\w{3,4}$')
+_special_regex = re.compile(r'([. _-]|^)(special|extra)\w*([. _-]|$)', re.I)
+
 class NameParser(object):
     def __init__(self, file_name=True):
 
         self.file_name = file_name
-        self.compiled_regexes = []
-        self._compile_regexes()
+        self.compiled_regexes = compiled_regexes
 
     def clean_series_name(self, series_name):
         """Cleans up series name by removing any . and _
@@ -48,23 +74,12 @@ class NameParser(object):
         Stolen from dbr's tvnamer
         """
         
-        series_name = re.sub("(\D)\.(?!\s)(\D)", "\\1 \\2", series_name)
-        series_name = re.sub("(\d)\.(\d{4})", "\\1 \\2", series_name) # if it ends in a year then don't keep the dot
-        series_name = re.sub("(\D)\.(?!\s)", "\\1 ", series_name)
-        series_name = re.sub("\.(?!\s)(\D)", " \\1", series_name)
+        for (cur_regex, cur_replacement) in _series_name_regexes:
+            series_name = cur_regex.sub(cur_replacement, series_name)
         series_name = series_name.replace("_", " ")
-        series_name = re.sub("-$", "", series_name)
+        series_name = _trailing_hyphen_regex.sub("", series_name)
         return series_name.strip()
 
-    def _compile_regexes(self):
-        for (cur_pattern_name, cur_pattern) in regexes.ep_regexes:
-            try:
-                cur_regex = re.compile(cur_pattern, re.VERBOSE | re.IGNORECASE)
-            except re.error, errormsg:
-                logger.log(u"WARNING: Invalid episode_pattern, %s. %s" % (errormsg, cur_pattern))
-            else:
-                self.compiled_regexes.append((cur_pattern_name, cur_regex))
-
     def _parse_string(self, name):
         
         if not name:
@@ -119,7 +134,7 @@ class NameParser(object):
                 tmp_extra_info = match.group('extra_info')
                 
                 # Show.S04.Special is almost certainly not every episode in the season
-                if tmp_extra_info and cur_regex_name == 'season_only' and re.match(r'([. _-]|^)(special|extra)\w*([. _-]|$)', tmp_extra_info, re.I):
+                if tmp_extra_info and cur_regex_name == 'season_only' and _special_regex.match(tmp_extra_info):
                     continue
                 result.extra_info = tmp_extra_info
             
@@ -199,13 +214,16 @@ class NameParser(object):
         
         name = self._unicodify(name)
         
-        cached = name_parser_cache.get(name)
+        # the same name can parse differently depending on whether it's treated as a file name
+        cache_key = (name, self.file_name)
+
+        cached = name_parser_cache.get(cache_key)
         if cached:
             return cached
 
         # break it into parts if there are any (dirname, file name, extension)
         dir_name, file_name = os.path.split(name)
-        ext_match = re.match('(.*)\.\w{3,4}$', file_name)
+        ext_match = _extension_regex.match(file_name)
         if ext_match and self.file_name:
             base_file_name = ext_match.group(1)
         else:
@@ -250,7 +268,7 @@ class NameParser(object):
         if final_result.season_number == None and not final_result.episode_numbers and final_result.air_date == None and not final_result.series_name:
             raise InvalidNameException("Unable to parse "+name.encode(sickbeard.SYS_ENCODING))
 
-        name_parser_cache.add(name, final_result)
+        name_parser_cache.add(cache_key, final_result)
         # return it
         return final_result
 
@@ -330,24 +348,93 @@ class ParseResult(object):
     air_by_date = property(_is_air_by_date)
 
 class NameParserCache(object):
-    #TODO: check if the fifo list can beskiped and only use one dict
-    _previous_parsed_list = [] # keep a fifo list of the cached items
-    _previous_parsed = {}
-    _cache_size = 100
-    
-    def add(self, name, parse_result):
-        self._previous_parsed[name] = parse_result
-        self._previous_parsed_list.append(name)
-        while len(self._previous_parsed_list) > self._cache_size:
-            del_me = self._previous_parsed_list.pop(0)
-            self._previous_parsed.pop(del_me)
-    
-    def get(self, name):
-        if name in self._previous_parsed:
-            logger.log("Using cached parse result for: " + name, logger.DEBUG)
-            return self._previous_parsed[name]
-        else:
-            return None
+    """
+    A least recently used cache of parse results which is shared by every thread.
+
+    cache_size: how many results to keep, if it's not given then sickbeard.NAME_PARSER_CACHE_SIZE is used
+    """
+
+    def __init__(self, cache_size=None):
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+        # key -> [previous link, next link, key, parse result], the links form a circular list
+        # around self._root with the least recently used result right after it
+        self._previous_parsed = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_cache_size(self):
+        if self._cache_size is not None:
+            return self._cache_size
+        return sickbeard.NAME_PARSER_CACHE_SIZE
+    cache_size = property(_get_cache_size)
+
+    def _unlink(self, link):
+        link_prev, link_next = link[0], link[1]
+        link_prev[1] = link_next
+        link_next[0] = link_prev
+
+    def _append(self, link):
+        last = self._root[0]
+        link[0] = last
+        link[1] = self._root
+        last[1] = link
+        self._root[0] = link
+
+    def add(self, key, parse_result):
+        cache_size = self.cache_size
+
+        with self._lock:
+            link = self._previous_parsed.get(key)
+            if link:
+                self._unlink(link)
+                link[3] = parse_result
+            else:
+                link = [None, None, key, parse_result]
+                self._previous_parsed[key] = link
+            self._append(link)
+
+            while len(self._previous_parsed) > max(cache_size, 0):
+                oldest = self._root[1]
+                self._unlink(oldest)
+                del self._previous_parsed[oldest[2]]
+                self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            link = self._previous_parsed.get(key)
+            if not link:
+                self.misses += 1
+                return None
+            # move it to the end so it's the last one to be evicted
+            self._unlink(link)
+            self._append(link)
+            self.hits += 1
+            return link[3]
+
+    def clear(self):
+        with self._lock:
+            self._previous_parsed.clear()
+            self._root[:] = [self._root, self._root, None, None]
+
+    def stats(self):
+        """
+        Returns a dict with the size of the cache and how often it was useful.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._previous_parsed),
+                    'max_size': self.cache_size,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'hit_ratio': round(float(self.hits) / lookups, 3) if lookups else 0.0,
+                    }
 
 name_parser_cache = NameParserCache()
 
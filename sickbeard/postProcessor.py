@@ -36,6 +36,7 @@ from sickbeard import logger
 from sickbeard import notifiers
 from sickbeard import show_name_helpers
 from sickbeard import scene_exceptions
+from sickbeard import tvdb_store
 
 from sickbeard import encodingKludge as ek
 from sickbeard.exceptions import ex
@@ -313,11 +314,9 @@ class PostProcessor(object):
         if self.folder_name:
             names.append(self.folder_name)
 
-        myDB = db.DBConnection()
-    
         # search the database for a possible match and return immediately if we find one
         for curName in names:
-            sql_results = myDB.select("SELECT * FROM history WHERE resource LIKE ?", [re.sub("[\.\-\ ]", "_", curName)])
+            sql_results = history.findByResource(curName)
     
             if len(sql_results) == 0:
                 continue
@@ -514,15 +513,7 @@ class PostProcessor(object):
                     raise #TODO: later I'll just log this, for now I want to know about it ASAP
 
                 try:
-                    # There's gotta be a better way of doing this but we don't wanna
-                    # change the language value elsewhere
-                    ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
-
-                    if tvdb_lang and not tvdb_lang == 'en':
-                        ltvdb_api_parms['language'] = tvdb_lang
-
-                    t = tvdb_api.Tvdb(**ltvdb_api_parms)
-                    epObj = t[tvdb_id].airedOn(episodes[0])[0]
+                    epObj = tvdb_store.getShow(tvdb_id, tvdb_lang).airedOn(episodes[0])[0]
                     season = int(epObj["seasonnumber"])
                     episodes = [int(epObj["episodenumber"])]
                     self._log(u"Got season " + str(season) + " episodes " + str(episodes), logger.DEBUG)
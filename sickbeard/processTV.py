@@ -19,117 +19,337 @@
 from __future__ import with_statement
 
 import os
+import Queue
 import shutil
+import threading
 
-import sickbeard 
+import sickbeard
 from sickbeard import postProcessor
-from sickbeard import db, helpers, exceptions
+from sickbeard import helpers, exceptions, show_index, show_name_helpers
 
 from sickbeard import encodingKludge as ek
 from sickbeard.exceptions import ex
 
 from sickbeard import logger
 
+# (key, set of lower cased real paths of the show dirs), rebuilt when the show list changes
+_showLocations = None
+
 def logHelper (logMessage, logLevel=logger.MESSAGE):
     logger.log(logMessage, logLevel)
     return logMessage + u"\n"
 
-def processDir (dirName, nzbName=None, recurse=False):
+def _getShowLocations():
+    global _showLocations
+
+    showList = sickbeard.showList
+    key = (showList, len(showList), show_index.generation())
+
+    cached = _showLocations
+    if cached is not None and cached[0][0] is showList and cached[0][1:] == key[1:]:
+        return cached[1]
+
+    locations = set()
+    for curShow in list(showList):
+        if curShow._location:
+            locations.add(ek.ek(os.path.realpath, curShow._location).lower())
+
+    _showLocations = (key, locations)
+    return locations
+
+def isInShowDir(dirName):
     """
-    Scans through the files in dirName and processes whatever media files it finds
-    
-    dirName: The folder name to look in
-    nzbName: The NZB name which resulted in this folder being downloaded
-    recurse: Boolean for whether we should descend into subfolders or not
+    Returns True if dirName is a show dir or inside one. Only dirName and its parents are looked up
+    in the set of show locations, the shows aren't checked one by one.
+    """
+
+    locations = _getShowLocations()
+
+    curPath = dirName.lower()
+    while True:
+        if curPath in locations:
+            return True
+        parentPath = os.path.dirname(curPath)
+        if parentPath == curPath:
+            return False
+        curPath = parentPath
+
+def _showKey(filePath, nzbName):
+    """
+    Guesses which show a file is for so files of the same show aren't processed at the same time.
+    Returns the tvdb id or None if none of the names match a show.
+    """
+
+    for curName in (nzbName, ek.ek(os.path.basename, ek.ek(os.path.dirname, filePath)), ek.ek(os.path.basename, filePath)):
+        if not curName:
+            continue
+        try:
+            shows = show_name_helpers.showNameMatcher.findShows(curName)
+        except Exception:
+            continue
+        if shows:
+            return shows[0].tvdbid
+
+    return None
+
+class ProcessFolder:
+    """
+    A folder found while processing, with its video files and the folders inside it.
     """
 
-    returnStr = ''
+    def __init__(self, dirName, videoFiles, folders, nzbName):
+        self.dirName = dirName
+        self.videoFiles = videoFiles
+        self.folders = folders
+        self.nzbName = nzbName
+
+        # video file -> whether it was processed successfully
+        self.results = {}
+
+class DirProcessor:
+    """
+    Post-processes all the video files in a folder and the folders inside it.
+
+    The folders are listed once each as they're found, the files are grouped by the show they seem to be
+    for and up to sickbeard.POST_PROCESS_THREADS groups are processed at once, one file at a time within
+    a group. Files that don't match any show are processed after everything else. Folders are only cleaned
+    up once all of the files are done.
+
+    Everything that's logged is also handed to output(text) as soon as it's known, if it's given.
+    """
 
-    returnStr += logHelper(u"Processing folder "+dirName, logger.DEBUG)
+    def __init__(self, dirName, nzbName=None, output=None):
+        self.dirName = dirName
+        self.nzbName = nzbName
+        self.output = output
 
-    # if they passed us a real dir then assume it's the one we want
-    if ek.ek(os.path.isdir, dirName):
-        dirName = ek.ek(os.path.realpath, dirName)
+        self._outputLock = threading.Lock()
+        self._log = []
 
-    # if they've got a download dir configured then use it
-    elif sickbeard.TV_DOWNLOAD_DIR and ek.ek(os.path.isdir, sickbeard.TV_DOWNLOAD_DIR) \
-            and ek.ek(os.path.normpath, dirName) != ek.ek(os.path.normpath, sickbeard.TV_DOWNLOAD_DIR):
-        dirName = ek.ek(os.path.join, sickbeard.TV_DOWNLOAD_DIR, ek.ek(os.path.abspath, dirName).split(os.path.sep)[-1])
-        returnStr += logHelper(u"Trying to use folder "+dirName, logger.DEBUG)
+        self.folders = []
 
-    # if we didn't find a real dir then quit
-    if not ek.ek(os.path.isdir, dirName):
-        returnStr += logHelper(u"Unable to figure out what folder to process. If your downloader and Sick Beard aren't on the same PC make sure you fill out your TV download dir in the config.", logger.DEBUG)
-        return returnStr
+    def _write(self, text):
+        with self._outputLock:
+            self._log.append(text)
+            if self.output:
+                self.output(text)
 
-    # TODO: check if it's failed and deal with it if it is
-    if ek.ek(os.path.basename, dirName).startswith('_FAILED_'):
-        returnStr += logHelper(u"The directory name indicates it failed to extract, cancelling", logger.DEBUG)
-        return returnStr
-    elif ek.ek(os.path.basename, dirName).startswith('_UNDERSIZED_'):
-        returnStr += logHelper(u"The directory name indicates that it was previously rejected for being undersized, cancelling", logger.DEBUG)
-        return returnStr
-    elif ek.ek(os.path.basename, dirName).startswith('_UNPACK_'):
-        returnStr += logHelper(u"The directory name indicates that this release is in the process of being unpacked, skipping", logger.DEBUG)
-        return returnStr
+    def _logHelper(self, logMessage, logLevel=logger.MESSAGE):
+        self._write(logHelper(logMessage, logLevel))
 
-    # make sure the dir isn't inside a show dir
-    myDB = db.DBConnection()
-    sqlResults = myDB.select("SELECT * FROM tv_shows")
-    for sqlShow in sqlResults:
-        if dirName.lower().startswith(ek.ek(os.path.realpath, sqlShow["location"]).lower()+os.sep) or dirName.lower() == ek.ek(os.path.realpath, sqlShow["location"]).lower():
-            returnStr += logHelper(u"You're trying to post process an episode that's already been moved to its show dir", logger.ERROR)
-            return returnStr
+    def _checkDir(self, dirName):
+        """
+        Returns True if the folder can be processed, logs why not otherwise.
+        """
 
-    fileList = ek.ek(os.listdir, dirName)
+        if ek.ek(os.path.basename, dirName).startswith('_FAILED_'):
+            self._logHelper(u"The directory name indicates it failed to extract, cancelling", logger.DEBUG)
+            return False
+        elif ek.ek(os.path.basename, dirName).startswith('_UNDERSIZED_'):
+            self._logHelper(u"The directory name indicates that it was previously rejected for being undersized, cancelling", logger.DEBUG)
+            return False
+        elif ek.ek(os.path.basename, dirName).startswith('_UNPACK_'):
+            self._logHelper(u"The directory name indicates that this release is in the process of being unpacked, skipping", logger.DEBUG)
+            return False
 
-    # split the list into video files and folders
-    folders = filter(lambda x: ek.ek(os.path.isdir, ek.ek(os.path.join, dirName, x)), fileList)
-    videoFiles = filter(helpers.isMediaFile, fileList)
+        # make sure the dir isn't inside a show dir
+        if isInShowDir(dirName):
+            self._logHelper(u"You're trying to post process an episode that's already been moved to its show dir", logger.ERROR)
+            return False
 
-    # recursively process all the folders
-    for curFolder in folders:
-        returnStr += logHelper(u"Recursively processing a folder: "+curFolder, logger.DEBUG)
-        returnStr += processDir(ek.ek(os.path.join, dirName, curFolder), recurse=True)
+        return True
 
-    remainingFolders = filter(lambda x: ek.ek(os.path.isdir, ek.ek(os.path.join, dirName, x)), fileList)
+    def _walk(self, dirName, nzbName=None):
+        """
+        Yields a ProcessFolder for dirName and every folder inside it that can be processed, parents first.
+        Each folder is only listed once.
+        """
 
-    # If nzbName is set and there's more than one videofile in the folder, files will be lost (overwritten).
-    if nzbName != None and len(videoFiles) >= 2:
-        nzbName = None
+        if not self._checkDir(dirName):
+            return
 
-    # process any files in the dir
-    for cur_video_file_path in videoFiles:
+        videoFiles = []
+        folders = []
+        for curName in ek.ek(os.listdir, dirName):
+            curPath = ek.ek(os.path.join, dirName, curName)
+            if ek.ek(os.path.isdir, curPath):
+                folders.append(curPath)
+            elif helpers.isMediaFile(curName):
+                videoFiles.append(curPath)
 
-        cur_video_file_path = ek.ek(os.path.join, dirName, cur_video_file_path)
+        # If nzbName is set and there's more than one videofile in the folder, files will be lost (overwritten).
+        if nzbName != None and len(videoFiles) >= 2:
+            nzbName = None
 
+        yield ProcessFolder(dirName, videoFiles, folders, nzbName)
+
+        for curFolder in folders:
+            self._logHelper(u"Recursively processing a folder: "+ek.ek(os.path.basename, curFolder), logger.DEBUG)
+            self._logHelper(u"Processing folder "+curFolder, logger.DEBUG)
+            for curProcessFolder in self._walk(curFolder):
+                yield curProcessFolder
+
+    def _processFile(self, processFolder, filePath):
+
+        processor = None
         try:
-            processor = postProcessor.PostProcessor(cur_video_file_path, nzbName)
+            processor = postProcessor.PostProcessor(filePath, processFolder.nzbName)
             process_result = processor.process()
             process_fail_message = ""
         except exceptions.PostProcessingFailed, e:
             process_result = False
             process_fail_message = ex(e)
 
-        returnStr += processor.log 
+        output = u""
+        if processor:
+            output += processor.log
 
-        # as long as the postprocessing was successful delete the old folder unless the config wants us not to
         if process_result:
+            output += logHelper(u"Processing succeeded for "+filePath)
+        else:
+            output += logHelper(u"Processing failed for "+filePath+": "+process_fail_message, logger.WARNING)
 
-            if len(videoFiles) == 1 and not sickbeard.KEEP_PROCESSED_DIR and \
-                ek.ek(os.path.normpath, dirName) != ek.ek(os.path.normpath, sickbeard.TV_DOWNLOAD_DIR) and \
-                len(remainingFolders) == 0:
+        processFolder.results[filePath] = process_result
+        self._write(output)
 
-                returnStr += logHelper(u"Deleting folder " + dirName, logger.DEBUG)
+    def _processGroups(self, groups):
+        """
+        Processes the groups of (folder, file) in up to sickbeard.POST_PROCESS_THREADS threads, the files of
+        a group one after the other.
+        """
 
-                try:
-                    shutil.rmtree(dirName)
-                except (OSError, IOError), e:
-                    returnStr += logHelper(u"Warning: unable to remove the folder " + dirName + ": " + ex(e), logger.WARNING)
+        pending = list(groups)
+        pendingLock = threading.Lock()
 
-            returnStr += logHelper(u"Processing succeeded for "+cur_video_file_path)
-            
-        else:
-            returnStr += logHelper(u"Processing failed for "+cur_video_file_path+": "+process_fail_message, logger.WARNING)
+        def worker():
+            while True:
+                with pendingLock:
+                    if not pending:
+                        return
+                    curGroup = pending.pop(0)
+                for curFolder, curFile in curGroup:
+                    try:
+                        self._processFile(curFolder, curFile)
+                    except Exception, e:
+                        curFolder.results[curFile] = False
+                        self._logHelper(u"Processing failed for "+curFile+": "+ex(e), logger.ERROR)
+
+        threadName = threading.currentThread().getName()
+        threads = []
+        for i in range(min(max(sickbeard.POST_PROCESS_THREADS, 1), len(pending)) - 1):
+            curThread = threading.Thread(target=worker, name=threadName + "-PP" + str(i + 1))
+            curThread.start()
+            threads.append(curThread)
+
+        # this thread does its share too
+        worker()
+
+        for curThread in threads:
+            curThread.join()
+
+    def _cleanUp(self):
+        """
+        Deletes the folders whose only video file was processed, deepest ones first so a folder that only
+        had processed folders in it can go too.
+        """
+
+        for curFolder in reversed(self.folders):
+
+            if len(curFolder.videoFiles) != 1 or not curFolder.results.get(curFolder.videoFiles[0]):
+                continue
+
+            if sickbeard.KEEP_PROCESSED_DIR or ek.ek(os.path.normpath, curFolder.dirName) == ek.ek(os.path.normpath, sickbeard.TV_DOWNLOAD_DIR):
+                continue
+
+            if [x for x in curFolder.folders if ek.ek(os.path.isdir, x)]:
+                continue
+
+            self._logHelper(u"Deleting folder " + curFolder.dirName, logger.DEBUG)
+
+            try:
+                shutil.rmtree(curFolder.dirName)
+            except (OSError, IOError), e:
+                self._logHelper(u"Warning: unable to remove the folder " + curFolder.dirName + ": " + ex(e), logger.WARNING)
+
+    def process(self):
+        """
+        Returns everything that was logged.
+        """
+
+        dirName = self.dirName
+
+        self._logHelper(u"Processing folder "+dirName, logger.DEBUG)
+
+        # if they passed us a real dir then assume it's the one we want
+        if ek.ek(os.path.isdir, dirName):
+            dirName = ek.ek(os.path.realpath, dirName)
+
+        # if they've got a download dir configured then use it
+        elif sickbeard.TV_DOWNLOAD_DIR and ek.ek(os.path.isdir, sickbeard.TV_DOWNLOAD_DIR) \
+                and ek.ek(os.path.normpath, dirName) != ek.ek(os.path.normpath, sickbeard.TV_DOWNLOAD_DIR):
+            dirName = ek.ek(os.path.join, sickbeard.TV_DOWNLOAD_DIR, ek.ek(os.path.abspath, dirName).split(os.path.sep)[-1])
+            self._logHelper(u"Trying to use folder "+dirName, logger.DEBUG)
+
+        # if we didn't find a real dir then quit
+        if not ek.ek(os.path.isdir, dirName):
+            self._logHelper(u"Unable to figure out what folder to process. If your downloader and Sick Beard aren't on the same PC make sure you fill out your TV download dir in the config.", logger.DEBUG)
+            return u"".join(self._log)
+
+        # files of the same show have to wait for each other, the ones we can't tell have to wait for everybody
+        groups = {}
+        groupOrder = []
+        unknownGroup = []
+
+        for curFolder in self._walk(dirName, self.nzbName):
+            self.folders.append(curFolder)
+            for curFile in curFolder.videoFiles:
+                showKey = _showKey(curFile, curFolder.nzbName)
+                if showKey == None:
+                    unknownGroup.append((curFolder, curFile))
+                    continue
+                if showKey not in groups:
+                    groups[showKey] = []
+                    groupOrder.append(showKey)
+                groups[showKey].append((curFolder, curFile))
+
+        self._processGroups([groups[x] for x in groupOrder])
+        self._processGroups([unknownGroup])
+
+        self._cleanUp()
+
+        return u"".join(self._log)
+
+def processDir (dirName, nzbName=None, recurse=False, output=None):
+    """
+    Scans through the files in dirName and processes whatever media files it finds
+
+    dirName: The folder name to look in
+    nzbName: The NZB name which resulted in this folder being downloaded
+    recurse: Boolean for whether we should descend into subfolders or not (subfolders are always processed)
+    output: a function which gets each bit of the log as soon as it's written
+
+    Returns the whole log.
+    """
+
+    return DirProcessor(dirName, nzbName, output).process()
+
+def streamDir (dirName, nzbName=None):
+    """
+    Processes dirName in a thread of its own and yields the log as it's written.
+    """
+
+    chunks = Queue.Queue()
+
+    def run():
+        try:
+            processDir(dirName, nzbName, output=chunks.put)
+        finally:
+            chunks.put(None)
+
+    threading.Thread(None, run, threading.currentThread().getName() + "-PP").start()
 
-    return returnStr
+    while True:
+        curChunk = chunks.get()
+        if curChunk == None:
+            return
+        yield curChunk
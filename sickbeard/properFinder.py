@@ -26,12 +26,11 @@ from sickbeard import helpers, logger, show_name_helpers
 from sickbeard import providers
 from sickbeard import search
 from sickbeard import history
+from sickbeard import tvdb_store
 
 from sickbeard.common import DOWNLOADED, SNATCHED, SNATCHED_PROPER, Quality
 
-from lib.tvdb_api import tvdb_api, tvdb_exceptions
-
-from name_parser.parser import NameParser, InvalidNameException
+from lib.tvdb_api import tvdb_exceptions
 
 
 class ProperFinder():
@@ -91,11 +90,10 @@ class ProperFinder():
 
         for curProper in sortedPropers:
 
-            # parse the file name
-            try:
-                myParser = NameParser(False)
-                parse_result = myParser.parse(curProper.name)
-            except InvalidNameException:
+            # parse the file name, work out the quality and check it against the filters all at once
+            classification = show_name_helpers.classifyRelease(curProper.name, False)
+            parse_result = classification.parse_result
+            if not parse_result:
                 logger.log(u"Unable to parse the filename "+curProper.name+" into a valid episode", logger.DEBUG)
                 continue
 
@@ -110,7 +108,7 @@ class ProperFinder():
             else:
                 curProper.season = parse_result.season_number if parse_result.season_number != None else 1
                 curProper.episode = parse_result.episode_numbers[0]
-            curProper.quality = Quality.nameQuality(curProper.name)
+            curProper.quality = classification.quality
 
             # for each show in our list
             for curShow in sickbeard.showList:
@@ -143,8 +141,8 @@ class ProperFinder():
             if curProper.tvdbid == -1:
                 continue
             
-            if not show_name_helpers.filterBadReleases(curProper.name):
-                logger.log(u"Proper "+curProper.name+" isn't a valid scene release that we want, igoring it", logger.DEBUG)
+            if not classification.accepted:
+                logger.log(u"Proper "+curProper.name+" isn't a valid scene release that we want ("+classification.reject_reason+"), igoring it", logger.DEBUG)
                 continue
 
             # if we have an air-by-date show then get the real season/episode numbers
@@ -154,17 +152,8 @@ class ProperFinder():
                     logger.log(u"This should never have happened, post a bug about this!", logger.ERROR)
                     raise Exception("BAD STUFF HAPPENED")
 
-                tvdb_lang = showObj.lang
-                # There's gotta be a better way of doing this but we don't wanna
-                # change the language value elsewhere
-                ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
-
-                if tvdb_lang and not tvdb_lang == 'en':
-                    ltvdb_api_parms['language'] = tvdb_lang
-
                 try:
-                    t = tvdb_api.Tvdb(**ltvdb_api_parms)
-                    epObj = t[curProper.tvdbid].airedOn(curProper.episode)[0]
+                    epObj = tvdb_store.getShow(curProper.tvdbid, showObj.lang).airedOn(curProper.episode)[0]
                     curProper.season = int(epObj["seasonnumber"])
                     curProper.episodes = [int(epObj["episodenumber"])]
                 except tvdb_exceptions.tvdb_episodenotfound:
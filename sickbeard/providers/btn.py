@@ -285,16 +285,18 @@ class BTNCache(tvcache.TVCache):
             self.setLastUpdate()
         else:
             return []
-        
-        logger.log(u"Clearing "+self.provider.name+" cache and updating with new information")
-        self._clearCache()
 
         if not self._checkAuth(data):
             raise AuthException("Your authentication info for "+self.provider.name+" is incorrect, check your config")
 
         # By now we know we've got data and no auth errors, all we need to do is put it in the database
+        cacheEntries = []
         for item in data:
-            self._parseItem(item)
+            cacheEntry = self._parseItem(item)
+            if cacheEntry:
+                cacheEntries.append(cacheEntry)
+
+        self._updateCacheEntries(cacheEntries)
 
     def _getRSSData(self):
         # Get the torrents uploaded since last check.
@@ -325,7 +327,7 @@ class BTNCache(tvcache.TVCache):
             return
         logger.log(u"Adding item from regular BTN search to cache: " + title, logger.DEBUG)
 
-        self._addCacheEntry(title, url)
+        return self._addCacheEntry(title, url)
 
     def _checkAuth(self, data):
         return self.provider.checkAuthFromData(data)
@@ -378,7 +378,7 @@ class NewzbinCache(tvcache.TVCache):
 
         logger.log("Adding item from RSS to cache: "+title, logger.DEBUG)
 
-        self._addCacheEntry(title, url, quality=quality)
+        return self._addCacheEntry(title, url, quality=quality)
 
 
 provider = NewzbinProvider()
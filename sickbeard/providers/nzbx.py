@@ -103,7 +103,7 @@ class NzbXCache(tvcache.TVCache):
     def _parseItem(self, item):
         title, url = self.provider._get_title_and_url(item)
         logger.log(u"Adding item from RSS to cache: " + title, logger.DEBUG)
-        self._addCacheEntry(title, url)
+        return self._addCacheEntry(title, url)
 
     def updateCache(self):
         if not self.shouldUpdate():
@@ -114,11 +114,12 @@ class NzbXCache(tvcache.TVCache):
             return
         self.setLastUpdate()
 
-        # now that we've got the latest releases lets delete the old cache
-        logger.log(u"Clearing nzbX cache and updating with new information")
-        self._clearCache()
-
+        cacheEntries = []
         for item in items:
-            self._parseItem(item)
+            cacheEntry = self._parseItem(item)
+            if cacheEntry:
+                cacheEntries.append(cacheEntry)
+
+        self._updateCacheEntries(cacheEntries)
 
 provider = NzbXProvider()
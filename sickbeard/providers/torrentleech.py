@@ -77,6 +77,6 @@ class TorrentLeechCache(tvcache.TVCache):
 
         logger.log(u"Adding item from RSS to cache: " + title, logger.DEBUG)
 
-        self._addCacheEntry(title, url)
+        return self._addCacheEntry(title, url)
 
 provider = TorrentLeechProvider()
@@ -16,21 +16,55 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
+from __future__ import with_statement
+
 import re
+import threading
 
 from sickbeard import helpers
 from sickbeard import name_cache
 from sickbeard import logger
 from sickbeard import db
 
+# all the exceptions keyed by tvdb_id, loaded from cache.db on first use
+exceptions_cache = None
+exceptions_lock = threading.Lock()
+
+# bumped every time the exceptions change so anything built from them knows to rebuild
+exceptions_generation = 0
+
 def get_scene_exceptions(tvdb_id):
     """
     Given a tvdb_id, return a list of all the scene exceptions.
     """
 
-    myDB = db.DBConnection("cache.db")
-    exceptions = myDB.select("SELECT show_name FROM scene_exceptions WHERE tvdb_id = ?", [tvdb_id])
-    return [cur_exception["show_name"] for cur_exception in exceptions]
+    global exceptions_cache
+
+    cur_cache = exceptions_cache
+    if cur_cache is None:
+        cur_cache = {}
+        myDB = db.DBConnection("cache.db")
+        for cur_exception in myDB.select("SELECT tvdb_id, show_name FROM scene_exceptions ORDER BY exception_id"):
+            cur_cache.setdefault(int(cur_exception["tvdb_id"]), []).append(cur_exception["show_name"])
+        with exceptions_lock:
+            exceptions_cache = cur_cache
+
+    try:
+        return list(cur_cache.get(int(tvdb_id), []))
+    except (TypeError, ValueError):
+        return []
+
+
+def clear_exceptions_cache():
+    """
+    Forgets the exceptions loaded from cache.db, call this after changing the scene_exceptions table.
+    """
+
+    global exceptions_cache, exceptions_generation
+
+    with exceptions_lock:
+        exceptions_cache = None
+        exceptions_generation += 1
 
 
 def get_scene_exception_by_name(show_name):
@@ -113,6 +147,7 @@ def retrieve_exceptions():
         # since this could invalidate the results of the cache we clear it out after updating
         if changed_exceptions:
             logger.log(u"Updated scene exceptions")
+            clear_exceptions_cache()
             name_cache.clearCache()
         else:
             logger.log(u"No scene exceptions update needed")
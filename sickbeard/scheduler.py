@@ -16,7 +16,13 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
+from __future__ import with_statement
+
 import datetime
+import heapq
+import itertools
+import select
+import socket
 import time
 import threading
 import traceback
@@ -24,58 +30,295 @@ import traceback
 from sickbeard import logger
 from sickbeard.exceptions import ex
 
-class Scheduler:
+# the longest the scheduler sleeps in one go, so a change of the system clock can't leave a job waiting for hours
+MAX_SLEEP = 60
+
+def _socketPair():
+    """
+    Returns a connected (reader, writer) pair of sockets, Windows doesn't have socket.socketpair.
+    """
+
+    if hasattr(socket, 'socketpair'):
+        return socket.socketpair()
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        writer = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        writer.connect(listener.getsockname())
+        reader = listener.accept()[0]
+    finally:
+        listener.close()
+
+    return (reader, writer)
 
-    def __init__(self, action, cycleTime=datetime.timedelta(minutes=10), runImmediately=True, threadName="ScheduledThread", silent=False):
+class Scheduler(object):
+    """
+    Runs an action every cycleTime. The action is started by the scheduler loop, in a thread of its own
+    unless threaded is False (for actions like the queues which only have to do a little bit of work).
+    """
+
+    def __init__(self, action, cycleTime=datetime.timedelta(minutes=10), runImmediately=True, threadName="ScheduledThread", silent=False, threaded=True):
 
         if runImmediately:
-            self.lastRun = datetime.datetime.fromordinal(1)
+            self._lastRun = datetime.datetime.fromordinal(1)
         else:
-            self.lastRun = datetime.datetime.now()
+            self._lastRun = datetime.datetime.now()
 
         self.action = action
-        self.cycleTime = cycleTime
+        self._cycleTime = cycleTime
 
         self.thread = None
         self.threadName = threadName
         self.silent = silent
+        self.threaded = threaded
 
-        self.initThread()
+        # set by the loop the scheduler is added to
+        self.loop = None
+        self.running = False
+        self._wakeupPending = False
+        self._runLock = threading.Lock()
 
-        self.abort = False
+        # how long the last run took, in seconds
+        self.lastDuration = None
+        self.runCount = 0
 
-    def initThread(self):
-        if self.thread == None or not self.thread.isAlive():
-            self.thread = threading.Thread(None, self.runAction, self.threadName)
+        # queues wake the scheduler up when something is added to them
+        if hasattr(action, 'scheduler'):
+            action.scheduler = self
+
+    def _setLastRun(self, lastRun):
+        self._lastRun = lastRun
+        self._reschedule()
+
+    def _setCycleTime(self, cycleTime):
+        self._cycleTime = cycleTime
+        self._reschedule()
+
+    # changing either of these moves the next run
+    lastRun = property(lambda self: self._lastRun, _setLastRun)
+    cycleTime = property(lambda self: self._cycleTime, _setCycleTime)
+
+    def _reschedule(self):
+        # a running job is scheduled again when it's done
+        if self.loop and not self.running:
+            self.loop.schedule(self)
+
+    def nextRunTime(self):
+        return self._lastRun + self._cycleTime
 
     def timeLeft(self):
         return self.cycleTime - (datetime.datetime.now() - self.lastRun)
 
     def forceRun(self):
-        if not self.action.amActive:
+        if not getattr(self.action, 'amActive', False):
             self.lastRun = datetime.datetime.fromordinal(1)
             return True
         return False
 
+    def wakeup(self):
+        """
+        Runs the action as soon as possible, it's not counted as a cycle.
+        """
+        with self._runLock:
+            if self.running:
+                self._wakeupPending = True
+                return
+
+        if self.loop:
+            self.loop.schedule(self, datetime.datetime.fromordinal(1))
+
+    def start(self):
+        """
+        Called by the loop when the action is due.
+        """
+
+        with self._runLock:
+            self.running = True
+            self._wakeupPending = False
+        self._lastRun = datetime.datetime.now()
+
+        if self.threaded:
+            self.thread = threading.Thread(None, self.runAction, self.threadName)
+            self.thread.start()
+        else:
+            self.runAction()
+
     def runAction(self):
 
-        while True:
+        startTime = time.time()
 
-            currentTime = datetime.datetime.now()
+        try:
+            if not self.silent:
+                logger.log(u"Starting new thread: "+self.threadName, logger.DEBUG)
+            self.action.run()
+        except Exception, e:
+            logger.log(u"Exception generated in thread "+self.threadName+": " + ex(e), logger.ERROR)
+            logger.log(repr(traceback.format_exc()), logger.DEBUG)
 
-            if currentTime - self.lastRun > self.cycleTime:
-                self.lastRun = currentTime
-                try:
-                    if not self.silent:
-                        logger.log(u"Starting new thread: "+self.threadName, logger.DEBUG)
-                    self.action.run()
-                except Exception, e:
-                    logger.log(u"Exception generated in thread "+self.threadName+": " + ex(e), logger.ERROR)
-                    logger.log(repr(traceback.format_exc()), logger.DEBUG)
+        self.lastDuration = time.time() - startTime
+        self.runCount += 1
 
-            if self.abort:
-                self.abort = False
-                self.thread = None
-                return
+        with self._runLock:
+            self.running = False
+            wakeupPending = self._wakeupPending
+
+        if wakeupPending:
+            self.wakeup()
+        else:
+            self._reschedule()
+
+    def join(self, timeout=None):
+        """
+        Waits for a run which is in its own thread to finish.
+        """
+        thread = self.thread
+        if thread and thread.isAlive():
+            thread.join(timeout)
+
+    def stats(self):
+        return {'next_run': self.nextRunTime(), 'last_run': self._lastRun, 'last_duration': self.lastDuration,
+                'runs': self.runCount, 'running': self.running}
+
+class SchedulerLoop(object):
+    """
+    One thread which sleeps until the next scheduler is due and starts it. The schedulers sit in a heap
+    ordered by the time they're due, an entry that was replaced (because the job was rescheduled)
+    is skipped when it comes up.
+    """
+
+    def __init__(self, threadName="SCHEDULER"):
+
+        self.threadName = threadName
+        self.thread = None
+        self.abort = False
+
+        self._lock = threading.Lock()
+
+        # (due time, entry id, scheduler)
+        self._heap = []
+        self._counter = itertools.count()
+
+        # scheduler -> the id of its current heap entry
+        self._entries = {}
+
+        self.schedulers = []
+
+        self._reader, self._writer = _socketPair()
+
+        # a wakeup nobody is reading yet is as good as a hundred of them, so never wait for room in the buffer
+        self._writer.setblocking(0)
+
+        # how often the loop woke up, to see that it isn't polling
+        self.wakeups = 0
+
+    def add(self, scheduler):
+        with self._lock:
+            self.schedulers.append(scheduler)
+        scheduler.loop = self
+        self.schedule(scheduler)
+
+    def schedule(self, scheduler, dueTime=None):
+        """
+        Puts the scheduler in the heap for the given time (its next run by default) and wakes the loop
+        up so it can sleep for the right amount of time.
+        """
+
+        if dueTime == None:
+            dueTime = scheduler.nextRunTime()
+
+        with self._lock:
+            entryId = self._counter.next()
+            self._entries[scheduler] = entryId
+            heapq.heappush(self._heap, (dueTime, entryId, scheduler))
+
+        # the loop looks at the heap again before it sleeps anyway
+        if threading.currentThread() is not self.thread:
+            self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._writer.send('x')
+        except socket.error:
+            pass
+
+    def _dueSchedulers(self):
+        """
+        Takes the schedulers that are due out of the heap, returns them and how long it is until the next one.
+        """
+
+        dueSchedulers = []
+        now = datetime.datetime.now()
+
+        with self._lock:
+            while self._heap:
+                dueTime, entryId, scheduler = self._heap[0]
+
+                if self._entries.get(scheduler) != entryId:
+                    heapq.heappop(self._heap)
+                    continue
+
+                if dueTime > now:
+                    timeLeft = dueTime - now
+                    return (dueSchedulers, timeLeft.days * 86400 + timeLeft.seconds + timeLeft.microseconds / 1000000.0)
+
+                heapq.heappop(self._heap)
+                del self._entries[scheduler]
+                dueSchedulers.append(scheduler)
+
+        return (dueSchedulers, MAX_SLEEP)
+
+    def runLoop(self):
+
+        while not self.abort:
+
+            dueSchedulers, timeLeft = self._dueSchedulers()
+
+            for curScheduler in dueSchedulers:
+                curScheduler.start()
+
+            if dueSchedulers:
+                continue
+
+            select.select([self._reader], [], [], min(timeLeft, MAX_SLEEP))
+            self.wakeups += 1
+
+            # throw away whatever woke us up, a few of them at once only need one look at the heap
+            while select.select([self._reader], [], [], 0)[0]:
+                self._reader.recv(1024)
+
+        self.abort = False
+
+    def start(self):
+        if self.thread == None or not self.thread.isAlive():
+            self.thread = threading.Thread(None, self.runLoop, self.threadName)
+            self.thread.start()
+
+    def stop(self, timeout=10):
+        """
+        Stops the loop and forgets the schedulers, it doesn't wait for the ones that are running.
+        """
+
+        self.abort = True
+        self._wakeup()
+
+        if self.thread:
+            self.thread.join(timeout)
+        self.thread = None
+
+        with self._lock:
+            schedulers = self.schedulers
+            self.schedulers = []
+            self._heap = []
+            self._entries = {}
+
+        for curScheduler in schedulers:
+            curScheduler.loop = None
+
+    def stats(self):
+        with self._lock:
+            schedulers = self.schedulers[:]
+        return dict([(x.threadName, x.stats()) for x in schedulers])
 
-            time.sleep(1)
+schedulerLoop = SchedulerLoop()
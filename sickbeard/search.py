@@ -19,6 +19,8 @@
 from __future__ import with_statement
 
 import os
+import threading
+import time
 import traceback
 
 import sickbeard
@@ -38,6 +40,157 @@ from sickbeard import providers
 from sickbeard.exceptions import ex
 from sickbeard.providers.generic import GenericProvider
 
+# timing of the most recent searches of each provider, keyed by provider id
+providerSearchStats = {}
+providerSearchStatsLock = threading.Lock()
+
+def _recordProviderSearch(provider, searchType, status, duration, numResults=0):
+    with providerSearchStatsLock:
+        curStats = providerSearchStats.setdefault(provider.getID(), {'name': provider.name,
+                                                                     'searches': 0,
+                                                                     'total_time': 0.0,
+                                                                     'max_time': 0.0,
+                                                                     'errors': 0,
+                                                                     'timeouts': 0})
+        curStats['searches'] += 1
+        curStats['total_time'] += duration
+        curStats['max_time'] = max(curStats['max_time'], duration)
+        if status == 'error':
+            curStats['errors'] += 1
+        elif status == 'timeout':
+            curStats['timeouts'] += 1
+
+        curStats['last_search'] = searchType
+        curStats['last_status'] = status
+        curStats['last_time'] = round(duration, 3)
+        curStats['last_results'] = numResults
+        curStats['last_run'] = int(time.time())
+
+def getProviderSearchStats():
+    """
+    Returns a copy of the timing of the provider searches, with the average time filled in.
+    """
+    with providerSearchStatsLock:
+        stats = {}
+        for curID, curStats in providerSearchStats.items():
+            stats[curID] = dict(curStats)
+            stats[curID]['avg_time'] = round(curStats['total_time'] / curStats['searches'], 3)
+            stats[curID]['total_time'] = round(curStats['total_time'], 3)
+            stats[curID]['max_time'] = round(curStats['max_time'], 3)
+        return stats
+
+class ProviderSearch(object):
+    """
+    A single search of a single provider, run by one of the _searchProviders threads.
+    """
+
+    def __init__(self, provider, searchType, searchFunc):
+        self.provider = provider
+        self.searchType = searchType
+        self.searchFunc = searchFunc
+
+        self.results = None
+        self.error = None
+        self.startTime = None
+        self.timedOut = False
+        self.done = threading.Event()
+
+    def run(self):
+        self.startTime = time.time()
+        status = 'error'
+        try:
+            try:
+                self.results = self.searchFunc(self.provider)
+                status = 'ok'
+            except Exception, e:
+                self.error = e
+                self.trace = traceback.format_exc()
+        finally:
+            # a search we gave up on already recorded its timeout
+            if not self.timedOut:
+                _recordProviderSearch(self.provider, self.searchType, status, time.time() - self.startTime, len(self.results or []))
+            self.done.set()
+
+    def wait(self, timeout):
+        """
+        Waits until the search is done, giving up once it has run for more than timeout seconds.
+
+        Returns True if the search finished.
+        """
+        while not self.done.isSet():
+            if self.startTime and time.time() - self.startTime > timeout:
+                self.timedOut = True
+                _recordProviderSearch(self.provider, self.searchType, 'timeout', time.time() - self.startTime)
+                return False
+            self.done.wait(0.5)
+        return True
+
+def _searchProviders(searchType, searchFunc, handleResults, providerList=None):
+    """
+    Calls searchFunc(provider) for every active provider (or every active one in providerList) using up to
+    sickbeard.PROVIDER_SEARCH_THREADS threads at once, so a slow provider no longer holds up the others.
+
+    The results are still handed to handleResults(provider, results) one provider at a time in provider
+    priority order, exactly as if they had been searched one after the other. If handleResults returns True
+    then the rest of the results are ignored and the providers that weren't searched yet are skipped.
+
+    Returns True if any provider was searched successfully.
+    """
+
+    if providerList == None:
+        providerList = providers.sortedProviderList()
+
+    searches = [ProviderSearch(x, searchType, searchFunc) for x in providerList if x.isActive()]
+
+    pending = list(searches)
+    pendingLock = threading.Lock()
+    threadName = threading.currentThread().getName()
+
+    def worker():
+        while True:
+            with pendingLock:
+                if not pending:
+                    return
+                curSearch = pending.pop(0)
+            curSearch.run()
+
+    def startWorker():
+        curThread = threading.Thread(target=worker, name=threadName + "-PROVIDER")
+        curThread.setDaemon(True)
+        curThread.start()
+
+    for i in range(min(max(sickbeard.PROVIDER_SEARCH_THREADS, 1), len(searches))):
+        startWorker()
+
+    didSearch = False
+
+    for curSearch in searches:
+
+        if not curSearch.wait(sickbeard.PROVIDER_SEARCH_TIMEOUT):
+            logger.log(u"Searching "+curSearch.provider.name+" took more than "+str(sickbeard.PROVIDER_SEARCH_TIMEOUT)+" seconds, skipping it", logger.WARNING)
+            # the stuck thread can't be stopped so start another one for the providers still waiting
+            if pending:
+                startWorker()
+            continue
+
+        if curSearch.error:
+            if isinstance(curSearch.error, exceptions.AuthException):
+                logger.log(u"Authentication error: "+ex(curSearch.error), logger.ERROR)
+            else:
+                logger.log(u"Error while searching "+curSearch.provider.name+", skipping: "+ex(curSearch.error), logger.ERROR)
+                logger.log(curSearch.trace, logger.DEBUG)
+            continue
+
+        didSearch = True
+
+        if handleResults(curSearch.provider, curSearch.results):
+            # don't bother starting the searches we'd ignore anyway
+            with pendingLock:
+                del pending[:]
+            break
+
+    return didSearch
+
 def _downloadResult(result):
     """
     Downloads a result to the appropriate black hole folder.
@@ -143,27 +296,8 @@ def searchForNeededEpisodes():
 
     foundResults = {}
 
-    didSearch = False
-
     # ask all providers for any episodes it finds
-    for curProvider in providers.sortedProviderList():
-
-        if not curProvider.isActive():
-            continue
-
-        curFoundResults = {}
-
-        try:
-            curFoundResults = curProvider.searchRSS()
-        except exceptions.AuthException, e:
-            logger.log(u"Authentication error: "+ex(e), logger.ERROR)
-            continue
-        except Exception, e:
-            logger.log(u"Error while searching "+curProvider.name+", skipping: "+ex(e), logger.ERROR)
-            logger.log(traceback.format_exc(), logger.DEBUG)
-            continue
-
-        didSearch = True
+    def handleResults(curProvider, curFoundResults):
 
         # pick a single result for each episode, respecting existing results
         for curEp in curFoundResults:
@@ -186,6 +320,8 @@ def searchForNeededEpisodes():
 
             foundResults[curEp] = bestResult
 
+    didSearch = _searchProviders("rss", lambda curProvider: curProvider.searchRSS(), handleResults)
+
     if not didSearch:
         logger.log(u"No NZB/Torrent providers found or enabled in the sickbeard config. Please check your settings.", logger.ERROR)
 
@@ -264,24 +400,7 @@ def findEpisode(episode, manualSearch=False):
 
     foundResults = []
 
-    didSearch = False
-
-    for curProvider in providers.sortedProviderList():
-
-        if not curProvider.isActive():
-            continue
-
-        try:
-            curFoundResults = curProvider.findEpisode(episode, manualSearch=manualSearch)
-        except exceptions.AuthException, e:
-            logger.log(u"Authentication error: "+ex(e), logger.ERROR)
-            continue
-        except Exception, e:
-            logger.log(u"Error while searching "+curProvider.name+", skipping: "+ex(e), logger.ERROR)
-            logger.log(traceback.format_exc(), logger.DEBUG)
-            continue
-
-        didSearch = True
+    def handleResults(curProvider, curFoundResults):
 
         # skip non-tv crap
         curFoundResults = filter(lambda x: show_name_helpers.filterBadReleases(x.name) and show_name_helpers.isGoodResult(x.name, episode.show), curFoundResults)
@@ -294,11 +413,12 @@ def findEpisode(episode, manualSearch=False):
             if done_searching:
                 break
         
-        foundResults += curFoundResults
+        foundResults.extend(curFoundResults)
 
         # if we did find a result that's good enough to stop then don't continue
-        if done_searching:
-            break
+        return done_searching
+
+    didSearch = _searchProviders("episode", lambda curProvider: curProvider.findEpisode(episode, manualSearch=manualSearch), handleResults)
 
     if not didSearch:
         logger.log(u"No NZB/Torrent providers found or enabled in the sickbeard config. Please check your settings.", logger.ERROR)
@@ -307,42 +427,26 @@ def findEpisode(episode, manualSearch=False):
 
     return bestResult
 
-def findSeason(show, season):
+def findSeason(show, season, providerList=None):
 
     logger.log(u"Searching for stuff we need from "+show.name+" season "+str(season))
 
     foundResults = {}
 
-    didSearch = False
-
-    for curProvider in providers.sortedProviderList():
+    def handleResults(curProvider, curResults):
 
-        if not curProvider.isActive():
-            continue
+        # make a list of all the results for this provider
+        for curEp in curResults:
 
-        try:
-            curResults = curProvider.findSeasonResults(show, season)
+            # skip non-tv crap
+            curResults[curEp] = filter(lambda x:  show_name_helpers.filterBadReleases(x.name) and show_name_helpers.isGoodResult(x.name, show), curResults[curEp])
 
-            # make a list of all the results for this provider
-            for curEp in curResults:
-
-                # skip non-tv crap
-                curResults[curEp] = filter(lambda x:  show_name_helpers.filterBadReleases(x.name) and show_name_helpers.isGoodResult(x.name, show), curResults[curEp])
-
-                if curEp in foundResults:
-                    foundResults[curEp] += curResults[curEp]
-                else:
-                    foundResults[curEp] = curResults[curEp]
-
-        except exceptions.AuthException, e:
-            logger.log(u"Authentication error: "+ex(e), logger.ERROR)
-            continue
-        except Exception, e:
-            logger.log(u"Error while searching "+curProvider.name+", skipping: "+ex(e), logger.ERROR)
-            logger.log(traceback.format_exc(), logger.DEBUG)
-            continue
+            if curEp in foundResults:
+                foundResults[curEp] += curResults[curEp]
+            else:
+                foundResults[curEp] = curResults[curEp]
 
-        didSearch = True
+    didSearch = _searchProviders("season", lambda curProvider: curProvider.findSeasonResults(show, season), handleResults, providerList)
 
     if not didSearch:
         logger.log(u"No NZB/Torrent providers found or enabled in the sickbeard config. Please check your settings.", logger.ERROR)
@@ -367,7 +471,6 @@ def findSeason(show, season):
     if bestSeasonNZB:
 
         # get the quality of the season nzb
-        seasonQual = Quality.nameQuality(bestSeasonNZB.name)
         seasonQual = bestSeasonNZB.quality
         logger.log(u"The quality of the season NZB is "+Quality.qualityStrings[seasonQual], logger.DEBUG)
 
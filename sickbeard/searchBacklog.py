@@ -23,7 +23,7 @@ import threading
 
 import sickbeard
 
-from sickbeard import db, scheduler
+from sickbeard import db, scheduler, providers, common
 from sickbeard import search_queue
 from sickbeard import logger
 from sickbeard import ui
@@ -41,6 +41,219 @@ class BacklogSearchScheduler(scheduler.Scheduler):
         else:
             return datetime.date.fromordinal(self.action._lastBacklog + self.action.cycleTime)
 
+class BacklogSegment:
+    """
+    A season (or a month of an air by date show) the backlog wants to search for.
+    """
+
+    def __init__(self, show, segment):
+        self.show = show
+        self.segment = segment
+
+        # how many episodes in it need downloading
+        self.wanted = 0
+
+        # the latest airdate of the episodes in it, ordinal
+        self.lastAirdate = 0
+
+        # whether any of it aired since the date the backlog starts from
+        self.recent = False
+
+        # the providers it will be searched on, None for all of them
+        self.providerList = None
+
+        # provider name -> the number of requests searching it will take
+        self.requests = {}
+
+    def key(self):
+        return (self.show.tvdbid, str(self.segment))
+
+    def sortKey(self):
+        # the most wanted episodes first, newer ones are more likely to be out there if it's a tie
+        return (-self.wanted, -self.lastAirdate, self.show.name, str(self.segment))
+
+class BacklogPlan:
+    """
+    What a backlog search is going to do: the segments it'll search, in order, the ones it can't fit into
+    the provider budgets and how many requests it'll make to each provider.
+    """
+
+    def __init__(self):
+        self.segments = []
+        self.deferred = []
+
+        # segments which were skipped because they're already in the search queue or nothing in them is wanted
+        self.alreadyQueued = 0
+        self.satisfied = 0
+
+        # provider name -> planned requests
+        self.requests = {}
+
+    def summary(self):
+        return {'segments': len(self.segments),
+                'deferred': len(self.deferred),
+                'already_queued': self.alreadyQueued,
+                'satisfied': self.satisfied,
+                'wanted_episodes': sum([x.wanted for x in self.segments]),
+                'requests': dict(self.requests),
+                'searches': [{'tvdbid': x.show.tvdbid, 'show_name': x.show.name, 'segment': x.segment, 'wanted': x.wanted,
+                              'requests': dict(x.requests)} for x in self.segments]}
+
+    def log(self):
+        logger.log(u"Backlog plan: " + str(len(self.segments)) + " segments to search, " + str(len(self.deferred)) +
+                   " over the provider budget, " + str(self.satisfied) + " with nothing wanted, " + str(self.alreadyQueued) + " already queued")
+        for curProvider in sorted(self.requests):
+            logger.log(u"Backlog plan: " + str(self.requests[curProvider]) + " requests to " + curProvider, logger.DEBUG)
+
+def _requestCost(provider, show, segment):
+    """
+    Estimates how many requests a season search of the provider takes, it does one per search string.
+    """
+    try:
+        return max(len(provider._get_season_search_strings(show, segment)), 1)
+    except Exception:
+        return 1
+
+def _getWantedSegments(show_list, fromDate):
+    """
+    Finds every segment of the given shows with an episode that aired after fromDate, using one query,
+    and counts the episodes in each one that need downloading.
+
+    Only the seasons with an episode after fromDate are read, for air-by-date shows it's the months from
+    the one fromDate is in, so a backlog of the last week doesn't go through every episode in the DB.
+    """
+
+    shows = dict([(x.tvdbid, x) for x in show_list if not x.paused])
+    if not shows:
+        return []
+
+    myDB = db.DBConnection()
+    sqlResults = myDB.select("SELECT ep.showid AS showid, ep.season AS season, ep.airdate AS airdate, ep.status AS status FROM tv_episodes ep"
+                             " JOIN tv_shows show ON ep.showid = show.tvdb_id"
+                             " JOIN (SELECT DISTINCT showid, season FROM tv_episodes WHERE airdate > ?) recent ON recent.showid = ep.showid AND recent.season = ep.season"
+                             " WHERE show.paused = 0 AND IFNULL(show.air_by_date, 0) = 0 AND ep.season > 0"
+                             " UNION ALL"
+                             " SELECT ep.showid AS showid, ep.season AS season, ep.airdate AS airdate, ep.status AS status FROM tv_episodes ep"
+                             " JOIN tv_shows show ON ep.showid = show.tvdb_id"
+                             " WHERE show.paused = 0 AND show.air_by_date = 1 AND ep.season > 0 AND ep.airdate >= ?",
+                             [fromDate.toordinal(), fromDate.replace(day=1).toordinal()])
+
+    bestQualities = {}
+    segments = {}
+
+    for curResult in sqlResults:
+
+        curShow = shows.get(int(curResult["showid"]))
+        if not curShow:
+            continue
+
+        airdate = int(curResult["airdate"])
+
+        if curShow.air_by_date:
+            segment = str(datetime.date.fromordinal(max(airdate, 1)))[:7]
+        else:
+            segment = int(curResult["season"])
+
+        key = (curShow.tvdbid, segment)
+        if key not in segments:
+            segments[key] = BacklogSegment(curShow, segment)
+        curSegment = segments[key]
+
+        if curShow.tvdbid not in bestQualities:
+            bestQualities[curShow.tvdbid] = common.Quality.splitQuality(curShow.quality)[1]
+
+        if search_queue.isEpisodeWanted(int(curResult["status"]), bestQualities[curShow.tvdbid]):
+            curSegment.wanted += 1
+
+        curSegment.lastAirdate = max(curSegment.lastAirdate, airdate)
+        if airdate > fromDate.toordinal():
+            curSegment.recent = True
+
+    return [x for x in segments.values() if x.recent]
+
+def getDeferred():
+    """
+    Returns the (tvdbid, segment) keys of the segments the last backlog searches deferred.
+    """
+    myDB = db.DBConnection("cache.db")
+    return set([(int(x["tvdb_id"]), x["segment"]) for x in myDB.select("SELECT tvdb_id, segment FROM backlog_deferred")])
+
+def setDeferred(deferred):
+    myDB = db.DBConnection("cache.db")
+    myDB.mass_action([["DELETE FROM backlog_deferred"],
+                      ["INSERT INTO backlog_deferred (tvdb_id, segment) VALUES (?,?)", [list(x) for x in deferred], True]])
+
+def planBacklog(show_list, fromDate, providerList=None, deferred=None, dryRun=False):
+    """
+    Works out which segments of the shows a backlog search should look for and in which order.
+
+    Segments with nothing wanted in them or that are in the search queue already are left out, the rest
+    are ordered by how many episodes they could get us. If sickbeard.BACKLOG_PROVIDER_BUDGET is set then each
+    provider is only searched until its budget is used up, a segment that no provider has room for anymore
+    is deferred to the next backlog search.
+
+    deferred: the keys of the segments the last search deferred, they go first so they get their turn
+    dryRun: work out the requests to every provider even without a budget, otherwise they're only
+            counted when there's a budget since that can take a query per segment and provider
+
+    Returns a BacklogPlan.
+    """
+
+    if providerList == None:
+        providerList = [x for x in providers.sortedProviderList() if x.isActive()]
+
+    budget = sickbeard.BACKLOG_PROVIDER_BUDGET
+    searchQueue = sickbeard.searchQueueScheduler and sickbeard.searchQueueScheduler.action
+
+    plan = BacklogPlan()
+    for curProvider in providerList:
+        plan.requests[curProvider.name] = 0
+
+    if deferred == None:
+        deferred = set()
+
+    countRequests = budget > 0 or dryRun
+
+    wantedSegments = _getWantedSegments(show_list, fromDate)
+    wantedSegments.sort(key=lambda x: (x.key() not in deferred, x.sortKey()))
+
+    for curSegment in wantedSegments:
+
+        if not curSegment.wanted:
+            plan.satisfied += 1
+            continue
+
+        if searchQueue and searchQueue.is_in_queue(curSegment.show, curSegment.segment):
+            plan.alreadyQueued += 1
+            continue
+
+        if not countRequests:
+            plan.segments.append(curSegment)
+            continue
+
+        segmentProviders = []
+        for curProvider in providerList:
+            cost = _requestCost(curProvider, curSegment.show, curSegment.segment)
+            if budget > 0 and plan.requests[curProvider.name] + cost > budget:
+                continue
+            segmentProviders.append(curProvider)
+            curSegment.requests[curProvider.name] = cost
+
+        if providerList and not segmentProviders:
+            plan.deferred.append(curSegment)
+            continue
+
+        for curProvider in segmentProviders:
+            plan.requests[curProvider.name] += curSegment.requests[curProvider.name]
+
+        # without a budget the segment is searched on every provider like before
+        if budget > 0:
+            curSegment.providerList = segmentProviders
+
+        plan.segments.append(curSegment)
+
+    return plan
+
 class BacklogSearcher:
 
     def __init__(self):
@@ -68,76 +281,79 @@ class BacklogSearcher:
         logger.log(u"amWaiting: "+str(self.amWaiting)+", amActive: "+str(self.amActive), logger.DEBUG)
         return (not self.amWaiting) and self.amActive
 
-    def searchBacklog(self, which_shows=None):
+    def _getFromDate(self, which_shows):
+
+        curDate = datetime.date.today().toordinal()
+
+        if not which_shows and not curDate - self._lastBacklog >= self.cycleTime:
+            logger.log(u"Running limited backlog on recently missed episodes only")
+            return datetime.date.today() - datetime.timedelta(days=7)
+
+        return datetime.date.fromordinal(1)
+
+    def searchBacklog(self, which_shows=None, dryRun=False):
+        """
+        Plans the backlog search and queues the segments it came up with.
+
+        which_shows: only search these shows (a full search of all of them otherwise)
+        dryRun: only make the plan, nothing is queued and the last backlog date stays the same
+
+        Returns the BacklogPlan, or None if the backlog is already running.
+        """
 
         if which_shows:
             show_list = which_shows
         else:
             show_list = sickbeard.showList
 
-        if self.amActive == True:
+        if self.amActive == True and not dryRun:
             logger.log(u"Backlog is still running, not starting it again", logger.DEBUG)
             return
 
         self._get_lastBacklog()
 
         curDate = datetime.date.today().toordinal()
-        fromDate = datetime.date.fromordinal(1)
+        fromDate = self._getFromDate(which_shows)
 
-        if not which_shows and not curDate - self._lastBacklog >= self.cycleTime:
-            logger.log(u"Running limited backlog on recently missed episodes only")
-            fromDate = datetime.date.today() - datetime.timedelta(days=7)
+        deferred = getDeferred()
+
+        if dryRun:
+            return planBacklog(show_list, fromDate, deferred=deferred, dryRun=True)
 
         self.amActive = True
         self.amPaused = False
 
-        #myDB = db.DBConnection()
-        #numSeasonResults = myDB.select("SELECT DISTINCT(season), showid FROM tv_episodes ep, tv_shows show WHERE season != 0 AND ep.showid = show.tvdb_id AND show.paused = 0 AND ep.airdate > ?", [fromDate.toordinal()])
-
-        # get separate lists of the season/date shows
-        #season_shows = [x for x in show_list if not x.air_by_date]
-        air_by_date_shows = [x for x in show_list if x.air_by_date]
-
-        # figure out how many segments of air by date shows we're going to do
-        air_by_date_segments = []
-        for cur_id in [x.tvdbid for x in air_by_date_shows]:
-            air_by_date_segments += self._get_air_by_date_segments(cur_id, fromDate) 
-
-        logger.log(u"Air-by-date segments: "+str(air_by_date_segments), logger.DEBUG)
-
-        #totalSeasons = float(len(numSeasonResults) + len(air_by_date_segments))
-        #numSeasonsDone = 0.0
-
-        # go through non air-by-date shows and see if they need any episodes
-        for curShow in show_list:
+        plan = planBacklog(show_list, fromDate, deferred=deferred)
+        plan.log()
 
-            if curShow.paused:
-                continue
-
-            if curShow.air_by_date:
-                segments = [x[1] for x in self._get_air_by_date_segments(curShow.tvdbid, fromDate)]
-            else:
-                segments = self._get_season_segments(curShow.tvdbid, fromDate)
+        for curSegment in plan.segments:
 
-            for cur_segment in segments:
+            self.currentSearchInfo = {'title': curSegment.show.name + " Season "+str(curSegment.segment)}
 
-                self.currentSearchInfo = {'title': curShow.name + " Season "+str(cur_segment)}
+            backlog_queue_item = search_queue.BacklogQueueItem(curSegment.show, curSegment.segment, curSegment.providerList, wantSeason=True)
+            sickbeard.searchQueueScheduler.action.add_item(backlog_queue_item)  #@UndefinedVariable
 
-                backlog_queue_item = search_queue.BacklogQueueItem(curShow, cur_segment)
+        fullBacklog = fromDate == datetime.date.fromordinal(1) and not which_shows
 
-                if not backlog_queue_item.wantSeason:
-                    logger.log(u"Nothing in season "+str(cur_segment)+" needs to be downloaded, skipping this season", logger.DEBUG)
-                else:
-                    sickbeard.searchQueueScheduler.action.add_item(backlog_queue_item)  #@UndefinedVariable
+        # a full search sees every segment so it knows all the ones which are still deferred
+        if fullBacklog:
+            deferred = set()
+        else:
+            deferred -= set([x.key() for x in plan.segments])
+        setDeferred(deferred | set([x.key() for x in plan.deferred]))
 
         # don't consider this an actual backlog search if we only did recent eps
-        # or if we only did certain shows
-        if fromDate == datetime.date.fromordinal(1) and not which_shows:
+        # or if we only did certain shows, or if some of it had to wait for the next one
+        if fullBacklog and not plan.deferred:
             self._set_lastBacklog(curDate)
+        elif fullBacklog:
+            logger.log(u"Not setting the last backlog date since " + str(len(plan.deferred)) + " segments were deferred, the next backlog search will be a full one too")
 
         self.amActive = False
         self._resetPI()
 
+        return plan
+
     def _get_lastBacklog(self):
 
         logger.log(u"Retrieving the last check time from the DB", logger.DEBUG)
@@ -155,30 +371,6 @@ class BacklogSearcher:
         self._lastBacklog = lastBacklog
         return self._lastBacklog
 
-    def _get_season_segments(self, tvdb_id, fromDate):
-        myDB = db.DBConnection()
-        sqlResults = myDB.select("SELECT DISTINCT(season) as season FROM tv_episodes WHERE showid = ? AND season > 0 and airdate > ?", [tvdb_id, fromDate.toordinal()])
-        return [int(x["season"]) for x in sqlResults]
-
-    def _get_air_by_date_segments(self, tvdb_id, fromDate):
-        # query the DB for all dates for this show
-        myDB = db.DBConnection()
-        num_air_by_date_results = myDB.select("SELECT airdate, showid FROM tv_episodes ep, tv_shows show WHERE season != 0 AND ep.showid = show.tvdb_id AND show.paused = 0 ANd ep.airdate > ? AND ep.showid = ?",
-                                 [fromDate.toordinal(), tvdb_id])
-
-        # break them apart into month/year strings
-        air_by_date_segments = []
-        for cur_result in num_air_by_date_results:
-            cur_date = datetime.date.fromordinal(int(cur_result["airdate"]))
-            cur_date_str = str(cur_date)[:7]
-            cur_tvdb_id = int(cur_result["showid"])
-            
-            cur_result_tuple = (cur_tvdb_id, cur_date_str)
-            if cur_result_tuple not in air_by_date_segments:
-                air_by_date_segments.append(cur_result_tuple)
-        
-        return air_by_date_segments
-
     def _set_lastBacklog(self, when):
 
         logger.log(u"Setting the last backlog in the DB to " + str(when), logger.DEBUG)
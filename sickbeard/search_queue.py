@@ -37,30 +37,35 @@ class SearchQueue(generic_queue.GenericQueue):
         generic_queue.GenericQueue.__init__(self)
         self.queue_name = "SEARCHQUEUE"
 
+    def _indexKeys(self, item):
+        keys = generic_queue.GenericQueue._indexKeys(self, item)
+        if isinstance(item, BacklogQueueItem):
+            keys += [(BACKLOG_SEARCH,), (BACKLOG_SEARCH, item.show, item.segment)]
+        elif isinstance(item, ManualSearchQueueItem):
+            keys.append((MANUAL_SEARCH, item.ep_obj))
+        return keys
+
     def is_in_queue(self, show, segment):
-        for cur_item in self.queue:
-            if isinstance(cur_item, BacklogQueueItem) and cur_item.show == show and cur_item.segment == segment:
-                return True
-        return False
+        return self.is_queued((BACKLOG_SEARCH, show, segment))
 
     def is_ep_in_queue(self, ep_obj):
-        for cur_item in self.queue:
-            if isinstance(cur_item, ManualSearchQueueItem) and cur_item.ep_obj == ep_obj:
-                return True
-        return False
+        return self.is_queued((MANUAL_SEARCH, ep_obj))
 
     def pause_backlog(self):
         self.min_priority = generic_queue.QueuePriorities.HIGH
 
     def unpause_backlog(self):
         self.min_priority = 0
+        self._wakeup()
 
     def is_backlog_paused(self):
         # backlog priorities are NORMAL, this should be done properly somewhere
         return self.min_priority >= generic_queue.QueuePriorities.NORMAL
 
     def is_backlog_in_progress(self):
-        for cur_item in self.queue + [self.currentItem]:
+        if self.is_queued((BACKLOG_SEARCH,)):
+            return True
+        for cur_item in self.currentItems:
             if isinstance(cur_item, BacklogQueueItem):
                 return True
         return False
@@ -167,8 +172,23 @@ class RSSSearchQueueItem(generic_queue.QueueItem):
                     ep.status = common.WANTED
                 ep.saveToDB()
 
+def isEpisodeWanted(compositeStatus, bestQualities):
+    """
+    Returns True if a backlog search should look for the episode: it's wanted or we only have it in
+    a lower quality than the best one the show wants.
+    """
+
+    curStatus, curQuality = common.Quality.splitCompositeStatus(compositeStatus)
+
+    if bestQualities:
+        highestBestQuality = max(bestQualities)
+    else:
+        highestBestQuality = 0
+
+    return (curStatus in (common.DOWNLOADED, common.SNATCHED, common.SNATCHED_PROPER) and curQuality < highestBestQuality) or curStatus == common.WANTED
+
 class BacklogQueueItem(generic_queue.QueueItem):
-    def __init__(self, show, segment):
+    def __init__(self, show, segment, providerList=None, wantSeason=None):
         generic_queue.QueueItem.__init__(self, 'Backlog', BACKLOG_SEARCH)
         self.priority = generic_queue.QueuePriorities.LOW
         self.thread_name = 'BACKLOG-'+str(show.tvdbid)
@@ -176,6 +196,14 @@ class BacklogQueueItem(generic_queue.QueueItem):
         self.show = show
         self.segment = segment
 
+        # the providers to search, None means all of them
+        self.providerList = providerList
+
+        # the backlog planner already knows
+        if wantSeason != None:
+            self.wantSeason = wantSeason
+            return
+
         logger.log(u"Seeing if we need any episodes from "+self.show.name+" season "+str(self.segment))
 
         myDB = db.DBConnection()
@@ -203,7 +231,7 @@ class BacklogQueueItem(generic_queue.QueueItem):
         
         generic_queue.QueueItem.execute(self)
 
-        results = search.findSeason(self.show, self.segment)
+        results = search.findSeason(self.show, self.segment, self.providerList)
 
         # download whatever we find
         for curResult in results:
@@ -214,21 +242,9 @@ class BacklogQueueItem(generic_queue.QueueItem):
 
     def _need_any_episodes(self, statusResults, bestQualities):
 
-        wantSeason = False
-        
         # check through the list of statuses to see if we want any
         for curStatusResult in statusResults:
-            curCompositeStatus = int(curStatusResult["status"])
-            curStatus, curQuality = common.Quality.splitCompositeStatus(curCompositeStatus)
-
-            if bestQualities:
-                highestBestQuality = max(bestQualities)
-            else:
-                highestBestQuality = 0
-
-            # if we need a better one then say yes
-            if (curStatus in (common.DOWNLOADED, common.SNATCHED, common.SNATCHED_PROPER) and curQuality < highestBestQuality) or curStatus == common.WANTED:
-                wantSeason = True
-                break
+            if isEpisodeWanted(int(curStatusResult["status"]), bestQualities):
+                return True
 
-        return wantSeason
+        return False
@@ -0,0 +1,118 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import with_statement
+
+import re
+import threading
+
+import sickbeard
+
+from sickbeard.exceptions import MultipleShowObjectsException
+
+# the index is rebuilt from sickbeard.showList whenever the list object or its length
+# changes, edits to a show which don't touch the list have to call invalidate()
+_lock = threading.Lock()
+_generation = 0
+_index = None
+
+def normalizeName(name):
+    """
+    Lower cases a show name and turns any run of separators into a single space so
+    that "Show.Name", "show name" and "Show_Name" all index the same.
+    """
+    return re.sub('[. _-]+', ' ', name).strip().lower()
+
+def invalidate():
+    """
+    Throws away the index, the next lookup rebuilds it from the show list.
+    """
+    global _index, _generation
+
+    with _lock:
+        _generation += 1
+        _index = None
+
+def generation():
+    """
+    Returns a number which changes every time the index is invalidated, anything else
+    built from the show list can compare it to know when to rebuild.
+    """
+    return _generation
+
+def _buildIndex(showList):
+    global _index
+
+    with _lock:
+        generation = _generation
+
+    byTVDB = {}
+    byTVRage = {}
+    byName = {}
+
+    for curShow in list(showList):
+        byTVDB.setdefault(curShow.tvdbid, []).append(curShow)
+        if curShow.tvrid:
+            byTVRage.setdefault(curShow.tvrid, []).append(curShow)
+        for curName in set([normalizeName(x) for x in (curShow.name, curShow.tvrname) if x]):
+            byName.setdefault(curName, []).append(curShow)
+
+    index = (showList, len(showList), byTVDB, byTVRage, byName)
+
+    with _lock:
+        # don't store an index that was already invalidated while we were building it
+        if generation == _generation:
+            _index = index
+
+    return index
+
+def _getIndex(showList):
+    index = _index
+    if index is None or index[0] is not showList or index[1] != len(showList):
+        index = _buildIndex(showList)
+    return index
+
+def _unique(results):
+    if not results:
+        return None
+    elif len(results) > 1:
+        raise MultipleShowObjectsException()
+    else:
+        return results[0]
+
+def findByTVDB(tvdbid):
+    return _unique(_getIndex(sickbeard.showList)[2].get(tvdbid))
+
+def inShowList(show):
+    """
+    Returns True if this show object, not just one with the same tvdbid, is in the show list.
+    """
+    return bool([x for x in _getIndex(sickbeard.showList)[2].get(show.tvdbid, []) if x is show])
+
+def findByTVRage(tvrid):
+    return _unique(_getIndex(sickbeard.showList)[3].get(tvrid))
+
+def findByName(name):
+    """
+    Returns the show whose name or TVRage name matches the given name, or None if
+    no show or more than one show matches.
+    """
+    results = _getIndex(sickbeard.showList)[4].get(normalizeName(name))
+    if not results or len(results) > 1:
+        return None
+    return results[0]
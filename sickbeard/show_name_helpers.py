@@ -16,16 +16,21 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
+from __future__ import with_statement
+
 import sickbeard
 
-from sickbeard.common import countryList
+from sickbeard.common import countryList, Quality
 from sickbeard.helpers import sanitizeSceneName
 from sickbeard.scene_exceptions import get_scene_exceptions
 from sickbeard import logger
 from sickbeard import db
+from sickbeard import scene_exceptions
+from sickbeard import show_index
 
 import re
 import datetime
+import threading
 
 from name_parser.parser import NameParser, InvalidNameException
 
@@ -33,22 +38,83 @@ resultFilters = ["sub(pack|s|bed)", "nlsub(bed|s)?", "swesub(bed)?",
                  "(dir|sample|nfo)fix", "sample", "(dvd)?extras", 
                  "dub(bed)?"]
 
-def filterBadReleases(name):
+# (ignore words the regexes were built from, regex matching any bad string, [(bad string, regex)])
+_badReleaseRegexes = None
+
+def _getBadReleaseRegexes():
+    global _badReleaseRegexes
+
+    cur_regexes = _badReleaseRegexes
+    if cur_regexes is None or cur_regexes[0] != sickbeard.IGNORE_WORDS:
+        bad_strings = resultFilters + sickbeard.IGNORE_WORDS.split(',')
+        cur_regexes = (sickbeard.IGNORE_WORDS,
+                       re.compile('(^|[\W_])(?:'+'|'.join(bad_strings)+')($|[\W_])', re.I),
+                       [(x, re.compile('(^|[\W_])'+x+'($|[\W_])', re.I)) for x in bad_strings])
+        _badReleaseRegexes = cur_regexes
+
+    return cur_regexes
+
+class ReleaseClassification(object):
     """
-    Filters out non-english and just all-around stupid releases by comparing them
-    to the resultFilters contents.
-    
-    name: the release name to check
-    
-    Returns: True if the release name is OK, False if it's bad.
+    Everything we work out from a release name on its own: how it parses, its quality
+    and whether it's a release we'd ever want.
+    """
+
+    def __init__(self, name, parse_result=None, reject_reason=None):
+        self.name = name
+        self.parse_result = parse_result
+        self.reject_reason = reject_reason
+        self._quality = None
+
+    def _is_accepted(self):
+        return self.reject_reason is None
+    accepted = property(_is_accepted)
+
+    def _get_quality(self):
+        # only worked out when somebody asks for it, most callers just want to filter
+        if self._quality is None:
+            self._quality = Quality.nameQuality(self.name)
+        return self._quality
+    quality = property(_get_quality)
+
+    def _get_series_name(self):
+        if self.parse_result:
+            return self.parse_result.series_name
+        return None
+    series_name = property(_get_series_name)
+
+    def _get_season_number(self):
+        if self.parse_result:
+            return self.parse_result.season_number
+        return None
+    season_number = property(_get_season_number)
+
+    def _get_episode_numbers(self):
+        if self.parse_result:
+            return self.parse_result.episode_numbers
+        return []
+    episode_numbers = property(_get_episode_numbers)
+
+    def _get_air_date(self):
+        if self.parse_result:
+            return self.parse_result.air_date
+        return None
+    air_date = property(_get_air_date)
+
+def classifyRelease(name, file_name=True):
+    """
+    Parses a release name and checks it against the resultFilters contents and the ignore words.
+
+    name: the release name to classify
+    file_name: passed on to NameParser, whether the name may end in a file extension
+
+    Returns: a ReleaseClassification, its reject_reason says why the release is bad
     """
 
     try:
-        fp = NameParser()
-        parse_result = fp.parse(name)
+        parse_result = NameParser(file_name).parse(name)
     except InvalidNameException:
-        logger.log(u"Unable to parse the filename "+name+" into a valid episode", logger.WARNING)
-        return False
+        return ReleaseClassification(name, reject_reason=u"unable to parse the name into a valid episode")
 
     # use the extra info and the scene group to filter against
     check_string = ''
@@ -58,17 +124,41 @@ def filterBadReleases(name):
         if check_string:
             check_string = check_string + '-' + parse_result.release_group
         else:
-            check_string = parse_result.release_group 
+            check_string = parse_result.release_group
 
     # if there's no info after the season info then assume it's fine
     if not check_string:
-        return True
+        return ReleaseClassification(name, parse_result)
 
     # if any of the bad strings are in the name then say no
-    for x in resultFilters + sickbeard.IGNORE_WORDS.split(','):
-        if re.search('(^|[\W_])'+x+'($|[\W_])', check_string, re.I):
-            logger.log(u"Invalid scene release: "+name+" contains "+x+", ignoring it", logger.DEBUG)
-            return False
+    ignore_words, bad_regex, bad_string_regexes = _getBadReleaseRegexes()
+    if bad_regex.search(check_string):
+        # the combined regex doesn't say which one matched so find it for the log
+        for x, cur_regex in bad_string_regexes:
+            if cur_regex.search(check_string):
+                return ReleaseClassification(name, parse_result, u"contains "+x)
+
+    return ReleaseClassification(name, parse_result)
+
+def filterBadReleases(name):
+    """
+    Filters out non-english and just all-around stupid releases by comparing them
+    to the resultFilters contents.
+    
+    name: the release name to check
+    
+    Returns: True if the release name is OK, False if it's bad.
+    """
+
+    classification = classifyRelease(name)
+
+    if not classification.parse_result:
+        logger.log(u"Unable to parse the filename "+name+" into a valid episode", logger.WARNING)
+        return False
+
+    if not classification.accepted:
+        logger.log(u"Invalid scene release: "+name+" "+classification.reject_reason+", ignoring it", logger.DEBUG)
+        return False
 
     return True
 
@@ -199,27 +289,141 @@ def makeSceneSearchString (episode):
 
     return toReturn
 
+# whatever can follow the show name in a release name: S01E02, 1x02, 2010.01.02, Part 1, Season 1, E02
+episodeMarkers = '(?:(?:S\d[\dE._ -])|(?:\d\d?x)|(?:\d{4}\W\d\d\W\d\d)|(?:(?:part|pt)[\._ -]?(?:\d|[ivx]))|Season\W+\d+\W+|E\d+\W+)'
+
+# every place in a release name where the show name could end
+showNameEndRegex = re.compile('(?=\W+' + episodeMarkers + ')', re.I)
+
+def _matcherName(name):
+    """
+    Collapses every run of non-word characters to a single space, the show name regexes
+    treat those runs as interchangeable so names that match them always collapse the same.
+    """
+    return re.sub('\W+', ' ', name).strip().lower()
+
+def _showRegex(show):
+    """
+    Builds a single regex which matches a release name starting with any of the names of the show.
+    """
+
+    all_show_names = allPossibleShowNames(show)
+    showNames = set(map(sanitizeSceneName, all_show_names) + all_show_names)
+
+    escaped_names = [re.sub('\\\\[\\s.-]', '\W+', re.escape(curName)) for curName in showNames if curName]
+    # longest first so the reported match is the most specific name
+    escaped_names.sort(key=len, reverse=True)
+
+    curRegex = '^(?:' + '|'.join(escaped_names) + ')'
+    if show.startyear:
+        curRegex += "(?:\W+"+str(show.startyear)+")?"
+    curRegex += '\W+' + episodeMarkers
+
+    return re.compile(curRegex, re.I)
+
+class ShowNameMatcher(object):
+    """
+    Matches release names against every show in sickbeard.showList.
+
+    The names of every show are looked up once and kept in a dict keyed by their collapsed
+    form so a release name only has to be split where its show name could end and looked up,
+    instead of trying the regex of every show in turn. The regexes are compiled once per show.
+    Everything is rebuilt when the show list or the scene exceptions change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._state = None
+
+    def invalidate(self):
+        """
+        Throws away the names and regexes, the next lookup rebuilds them.
+        """
+        with self._lock:
+            self._generation += 1
+            self._state = None
+
+    def _stateKey(self, showList):
+        return (showList, len(showList), show_index.generation(), scene_exceptions.exceptions_generation, self._generation)
+
+    def _getState(self):
+        showList = sickbeard.showList
+        key = self._stateKey(showList)
+
+        state = self._state
+        if state is not None and state[0][0] is key[0] and state[0][1:] == key[1:]:
+            return state
+
+        aliases = {}
+        for curIndex, curShow in enumerate(list(showList)):
+            all_show_names = allPossibleShowNames(curShow)
+            for curName in set([_matcherName(x) for x in map(sanitizeSceneName, all_show_names) + all_show_names if x]):
+                aliases.setdefault(curName, []).append((curIndex, curShow))
+
+        # the regexes are only compiled the first time a show is checked
+        state = (key, aliases, {})
+
+        with self._lock:
+            if key[-1] == self._generation:
+                self._state = state
+
+        return state
+
+    def showRegex(self, show):
+        """
+        Returns the compiled regex for the given show, it's cached if the show is in the show list.
+        """
+
+        regexes = self._getState()[2]
+
+        entry = regexes.get(id(show))
+        if entry and entry[0] is show:
+            return entry[1]
+
+        regex = _showRegex(show)
+        if show_index.inShowList(show):
+            regexes[id(show)] = (show, regex)
+
+        return regex
+
+    def findShows(self, name):
+        """
+        Figures out which shows a release name could belong to.
+
+        name: the release name
+
+        Returns: a list of TVShow objects whose regex matches the name, in show list order
+        """
+
+        aliases = self._getState()[1]
+
+        candidates = {}
+        for curMatch in showNameEndRegex.finditer(name):
+            curPrefix = _matcherName(name[:curMatch.start()])
+            # the regex allows the show's year between the name and the episode info
+            for curName in (curPrefix, re.sub(' \d{4}$', '', curPrefix)):
+                for curIndex, curShow in aliases.get(curName, []):
+                    candidates[curIndex] = curShow
+
+        return [candidates[x] for x in sorted(candidates) if self.showRegex(candidates[x]).search(name)]
+
+showNameMatcher = ShowNameMatcher()
+
 def isGoodResult(name, show, log=True):
     """
     Use an automatically-created regex to make sure the result actually is the show it claims to be
     """
 
-    all_show_names = allPossibleShowNames(show)
-    showNames = map(sanitizeSceneName, all_show_names) + all_show_names
+    curRegex = showNameMatcher.showRegex(show)
+    if log:
+        logger.log(u"Checking if show "+name+" matches " + curRegex.pattern, logger.DEBUG)
 
-    for curName in set(showNames):
-        escaped_name = re.sub('\\\\[\\s.-]', '\W+', re.escape(curName))
-        if show.startyear:
-            escaped_name += "(?:\W+"+str(show.startyear)+")?"
-        curRegex = '^' + escaped_name + '\W+(?:(?:S\d[\dE._ -])|(?:\d\d?x)|(?:\d{4}\W\d\d\W\d\d)|(?:(?:part|pt)[\._ -]?(\d|[ivx]))|Season\W+\d+\W+|E\d+\W+)'
-        if log:
-            logger.log(u"Checking if show "+name+" matches " + curRegex, logger.DEBUG)
-
-        match = re.search(curRegex, name, re.I)
-
-        if match:
-            logger.log(u"Matched "+curRegex+" to "+name, logger.DEBUG)
-            return True
+    match = curRegex.search(name)
+
+    if match:
+        logger.log(u"Matched "+curRegex.pattern+" to "+name, logger.DEBUG)
+        return True
 
     if log:
         logger.log(u"Provider gave result "+name+" but that doesn't seem like a valid result for "+show.name+" so I'm ignoring it")
@@ -22,29 +22,57 @@ import traceback
 
 import sickbeard
 
-from lib.tvdb_api import tvdb_exceptions, tvdb_api
+from lib.tvdb_api import tvdb_exceptions
 
 from sickbeard.common import SKIPPED, WANTED
 
-from sickbeard.tv import TVShow
+from sickbeard.tv import TVShow, EpisodeSaveSession
 from sickbeard import exceptions, logger, ui, db
 from sickbeard import generic_queue
 from sickbeard import name_cache
+from sickbeard import show_index
+from sickbeard import show_stats
+from sickbeard import coming_episodes
+from sickbeard import tvdb_store
 from sickbeard.exceptions import ex
 
 
 class ShowQueue(generic_queue.GenericQueue):
 
+    # updates and refreshes of different shows run next to each other
+    max_workers = property(lambda self: sickbeard.SHOW_QUEUE_THREADS)
+
     def __init__(self):
         generic_queue.GenericQueue.__init__(self)
         self.queue_name = "SHOWQUEUE"
 
+        # adding a show changes the show list so only one add runs at a time
+        self.action_limits = {ShowQueueActions.ADD: 1}
+
+    def _canRun(self, queueItem, runningItems):
+        # never do two things to the same show at once
+        if queueItem.show != None and queueItem.show in [x.show for x in runningItems]:
+            return False
+
+        return generic_queue.GenericQueue._canRun(self, queueItem, runningItems)
+
+    def _indexKeys(self, item):
+        keys = generic_queue.GenericQueue._indexKeys(self, item)
+        if item.show != None:
+            keys.append((item.action_id, item.show))
+        return keys
+
     def _isInQueue(self, show, actions):
-        return show in [x.show for x in self.queue if x.action_id in actions]
+        for curAction in actions:
+            if self.is_queued((curAction, show)):
+                return True
+        return False
 
     def _isBeingSomethinged(self, show, actions):
-        return self.currentItem != None and show == self.currentItem.show and \
-                self.currentItem.action_id in actions
+        for curItem in self.currentItems:
+            if show == curItem.show and curItem.action_id in actions:
+                return True
+        return False
 
     def isInUpdateQueue(self, show):
         return self._isInQueue(show, (ShowQueueActions.UPDATE, ShowQueueActions.FORCEUPDATE))
@@ -68,7 +96,7 @@ class ShowQueue(generic_queue.GenericQueue):
         return self._isBeingSomethinged(show, (ShowQueueActions.RENAME,))
 
     def _getLoadingShowList(self):
-        return [x for x in self.queue + [self.currentItem] if x != None and x.isLoading]
+        return [x for x in self.queue + self.currentItems if x.isLoading]
 
     loadingShowList = property(_getLoadingShowList)
 
@@ -92,7 +120,7 @@ class ShowQueue(generic_queue.GenericQueue):
 
         return queueItemObj
 
-    def refreshShow(self, show, force=False):
+    def refreshShow(self, show, force=False, fullScan=False):
 
         if self.isBeingRefreshed(show) and not force:
             raise exceptions.CantRefreshException("This show is already being refreshed, not refreshing again.")
@@ -101,7 +129,7 @@ class ShowQueue(generic_queue.GenericQueue):
             logger.log(u"A refresh was attempted but there is already an update queued or in progress. Since updates do a refres at the end anyway I'm skipping this request.", logger.DEBUG)
             return
 
-        queueItemObj = QueueItemRefresh(show)
+        queueItemObj = QueueItemRefresh(show, fullScan)
 
         self.add_item(queueItemObj)
 
@@ -153,7 +181,8 @@ class ShowQueueItem(generic_queue.QueueItem):
         self.show = show
 
     def isInQueue(self):
-        return self in sickbeard.showQueueScheduler.action.queue + [sickbeard.showQueueScheduler.action.currentItem] #@UndefinedVariable
+        showQueue = sickbeard.showQueueScheduler.action #@UndefinedVariable
+        return showQueue.is_queued(self) or self in showQueue.currentItems
 
     def _getName(self):
         return str(self.show.tvdbid)
@@ -212,14 +241,8 @@ class QueueItemAdd(ShowQueueItem):
         try:
             # make sure the tvdb ids are valid
             try:
-                ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
-                if self.lang:
-                    ltvdb_api_parms['language'] = self.lang
-
-                logger.log(u"TVDB: " + repr(ltvdb_api_parms))
-
-                t = tvdb_api.Tvdb(**ltvdb_api_parms)
-                s = t[self.tvdb_id]
+                # the show is stored so loading it and its episodes below doesn't fetch it again
+                s = tvdb_store.getShow(self.tvdb_id, self.lang)
 
                 # this usually only happens if they have an NFO in their show dir which gave us a TVDB ID that has no proper english version of the show
                 if not s['seriesname']:
@@ -280,6 +303,7 @@ class QueueItemAdd(ShowQueueItem):
 
         # add it to the show list
         sickbeard.showList.append(self.show)
+        show_index.invalidate()
 
         try:
             self.show.loadEpisodesFromDir()
@@ -309,6 +333,8 @@ class QueueItemAdd(ShowQueueItem):
             logger.log(u"Setting all episodes to the specified default status: " + str(self.default_status))
             myDB = db.DBConnection()
             myDB.action("UPDATE tv_episodes SET status = ? WHERE status = ? AND showid = ? AND season != 0", [self.default_status, SKIPPED, self.show.tvdbid])
+            show_stats.recountShow(self.show.tvdbid)
+            coming_episodes.invalidate()
 
         # if they started with WANTED eps then run the backlog
         if self.default_status == WANTED:
@@ -327,9 +353,12 @@ class QueueItemAdd(ShowQueueItem):
 
 
 class QueueItemRefresh(ShowQueueItem):
-    def __init__(self, show=None):
+    def __init__(self, show=None, fullScan=False):
         ShowQueueItem.__init__(self, ShowQueueActions.REFRESH, show)
 
+        # look at every file in the show dir, not just the ones that changed since the last refresh
+        self.fullScan = fullScan
+
         # do refreshes first because they're quick
         self.priority = generic_queue.QueuePriorities.HIGH
 
@@ -339,7 +368,7 @@ class QueueItemRefresh(ShowQueueItem):
 
         logger.log(u"Performing refresh on " + self.show.name)
 
-        self.show.refreshDir()
+        self.show.refreshDir(self.fullScan)
         self.show.writeMetadata()
         self.show.populateCache()
 
@@ -405,39 +434,40 @@ class QueueItemUpdate(ShowQueueItem):
             logger.log(u"Unable to contact TVDB, aborting: " + ex(e), logger.WARNING)
             return
 
-        # get episode list from DB
-        logger.log(u"Loading all episodes from the database", logger.DEBUG)
-        DBEpList = self.show.loadEpisodesFromDB()
+        with EpisodeSaveSession():
+            # get episode list from DB
+            logger.log(u"Loading all episodes from the database", logger.DEBUG)
+            DBEpList = self.show.loadEpisodesFromDB()
 
-        # get episode list from TVDB
-        logger.log(u"Loading all episodes from theTVDB", logger.DEBUG)
-        try:
-            TVDBEpList = self.show.loadEpisodesFromTVDB(cache=not self.force)
-        except tvdb_exceptions.tvdb_exception, e:
-            logger.log(u"Unable to get info from TVDB, the show info will not be refreshed: " + ex(e), logger.ERROR)
-            TVDBEpList = None
+            # get episode list from TVDB
+            logger.log(u"Loading all episodes from theTVDB", logger.DEBUG)
+            try:
+                TVDBEpList = self.show.loadEpisodesFromTVDB(cache=not self.force)
+            except tvdb_exceptions.tvdb_exception, e:
+                logger.log(u"Unable to get info from TVDB, the show info will not be refreshed: " + ex(e), logger.ERROR)
+                TVDBEpList = None
 
-        if TVDBEpList == None:
-            logger.log(u"No data returned from TVDB, unable to update this show", logger.ERROR)
+            if TVDBEpList == None:
+                logger.log(u"No data returned from TVDB, unable to update this show", logger.ERROR)
 
-        else:
+            else:
 
-            # for each ep we found on TVDB delete it from the DB list
-            for curSeason in TVDBEpList:
-                for curEpisode in TVDBEpList[curSeason]:
-                    logger.log(u"Removing " + str(curSeason) + "x" + str(curEpisode) + " from the DB list", logger.DEBUG)
-                    if curSeason in DBEpList and curEpisode in DBEpList[curSeason]:
-                        del DBEpList[curSeason][curEpisode]
-
-            # for the remaining episodes in the DB list just delete them from the DB
-            for curSeason in DBEpList:
-                for curEpisode in DBEpList[curSeason]:
-                    logger.log(u"Permanently deleting episode " + str(curSeason) + "x" + str(curEpisode) + " from the database", logger.MESSAGE)
-                    curEp = self.show.getEpisode(curSeason, curEpisode)
-                    try:
-                        curEp.deleteEpisode()
-                    except exceptions.EpisodeDeletedException:
-                        pass
+                # for each ep we found on TVDB delete it from the DB list
+                for curSeason in TVDBEpList:
+                    for curEpisode in TVDBEpList[curSeason]:
+                        logger.log(u"Removing " + str(curSeason) + "x" + str(curEpisode) + " from the DB list", logger.DEBUG)
+                        if curSeason in DBEpList and curEpisode in DBEpList[curSeason]:
+                            del DBEpList[curSeason][curEpisode]
+
+                # for the remaining episodes in the DB list just delete them from the DB
+                for curSeason in DBEpList:
+                    for curEpisode in DBEpList[curSeason]:
+                        logger.log(u"Permanently deleting episode " + str(curSeason) + "x" + str(curEpisode) + " from the database", logger.MESSAGE)
+                        curEp = self.show.getEpisode(curSeason, curEpisode)
+                        try:
+                            curEp.deleteEpisode()
+                        except exceptions.EpisodeDeletedException:
+                            pass
 
         # now that we've updated the DB from TVDB see if there's anything we can add from TVRage
         with self.show.lock:
@@ -0,0 +1,343 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Episode counts for every show, kept in the show_stats and show_status_counts tables so the pages and the
+API don't have to count the episodes of every show whenever they're shown.
+
+show_stats has the counts of the aired episodes of the regular seasons (see episodeCounts) and the date
+the next episode airs. They depend on the day they were counted on, so every row remembers it (as_of) and
+the first date an episode airs on after that (recount_on), the show is counted again once that day has
+passed. show_status_counts has how many of a show's episodes there are with each status.
+
+When an episode is saved TVEpisode.saveToDB hands the old and new rows to episodesChanged which just
+adds the difference. checkStats counts everything again and fixes the rows which are wrong.
+"""
+
+from __future__ import with_statement
+
+import datetime
+import threading
+
+from sickbeard import db, logger
+from sickbeard.common import Quality, ARCHIVED, IGNORED, UNAIRED, WANTED
+
+# the counts in show_stats, in the order episodeCounts returns them
+STATS_FIELDS = ('downloaded', 'snatched', 'snatched_with_file', 'wanted', 'total')
+
+_DOWNLOADED = frozenset(Quality.DOWNLOADED + [ARCHIVED])
+_SNATCHED = frozenset(Quality.SNATCHED + Quality.SNATCHED_PROPER)
+
+# all the reads and writes of the tables, so two saves of the same show can't both add to an old row
+_lock = threading.RLock()
+
+def _today():
+    return datetime.date.today().toordinal()
+
+def episodeCounts(season, episode, airdate, status, location, today):
+    """
+    Returns what one episode adds to each of the STATS_FIELDS on the day today (an ordinal). Only the
+    episodes of the regular seasons which have aired by then are counted, the home page shows
+    downloaded + snatched_with_file out of total.
+    """
+
+    if season == 0 or episode == 0 or airdate > today:
+        return (0, 0, 0, 0, 0)
+
+    downloaded = int(status in _DOWNLOADED)
+    snatched = int(status in _SNATCHED)
+    snatchedWithFile = int(snatched and bool(location))
+    wanted = int(status == WANTED)
+    total = int((airdate != 1 or downloaded or snatched) and status != IGNORED)
+
+    return (downloaded, snatched, snatchedWithFile, wanted, total)
+
+class ShowStats(object):
+    """
+    The counts of one show as of one day.
+    """
+
+    def __init__(self, tvdbid, today):
+        self.tvdbid = tvdbid
+        self.asOf = today
+
+        self.counts = [0] * len(STATS_FIELDS)
+        self.statusCounts = {}
+
+        # the first UNAIRED episode on or after asOf, and the first episode of any kind
+        self.nextAirdate = None
+        self.recountOn = None
+
+    def addEpisode(self, season, episode, airdate, status, location, sign=1):
+        """
+        Counts an episode in, or out if sign is -1.
+        """
+
+        for i, curCount in enumerate(episodeCounts(season, episode, airdate, status, location, self.asOf)):
+            self.counts[i] += sign * curCount
+
+        self.statusCounts[status] = self.statusCounts.get(status, 0) + sign
+
+        # these can only be moved closer, an episode which is taken away has to be counted again
+        if sign > 0 and airdate >= self.asOf:
+            self.recountOn = min(x for x in (self.recountOn, airdate) if x != None)
+            if status == UNAIRED:
+                self.nextAirdate = min(x for x in (self.nextAirdate, airdate) if x != None)
+
+    def isStale(self, today):
+        """
+        Returns True if an episode has aired since the show was counted.
+        """
+        return today > self.asOf and self.recountOn != None and self.recountOn <= today
+
+    def toDict(self):
+        result = dict(zip(STATS_FIELDS, self.counts))
+        result['next_airdate'] = self.nextAirdate
+        return result
+
+    def _key(self):
+        return (self.counts, self.nextAirdate, dict([x for x in self.statusCounts.items() if x[1]]))
+
+    def __eq__(self, other):
+        return isinstance(other, ShowStats) and self.tvdbid == other.tvdbid and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+def _countRows(sqlResults, today):
+    """
+    Counts the episodes in sqlResults (showid, season, episode, airdate, status, location) and returns
+    a dict of tvdbid -> ShowStats.
+    """
+
+    stats = {}
+    for curRow in sqlResults:
+        tvdbid = int(curRow["showid"])
+        if tvdbid not in stats:
+            stats[tvdbid] = ShowStats(tvdbid, today)
+        stats[tvdbid].addEpisode(int(curRow["season"]), int(curRow["episode"]), int(curRow["airdate"]),
+                                 int(curRow["status"]), curRow["location"])
+    return stats
+
+def _countShow(myDB, tvdbid, today):
+    sqlResults = myDB.select("SELECT showid, season, episode, airdate, status, location FROM tv_episodes WHERE showid = ?", [tvdbid])
+    return _countRows(sqlResults, today).get(tvdbid, ShowStats(tvdbid, today))
+
+def _saveQueries(stats, statuses=None):
+    """
+    Returns the queries which replace the stored rows of a show with stats, only the counts of the
+    given statuses if there are any.
+    """
+
+    queries = [["INSERT OR REPLACE INTO show_stats (showid, " + ", ".join(STATS_FIELDS) + ", next_airdate, recount_on, as_of) VALUES (?,?,?,?,?,?,?,?,?)",
+                [stats.tvdbid] + stats.counts + [stats.nextAirdate, stats.recountOn, stats.asOf]]]
+
+    if statuses == None:
+        queries.append(["DELETE FROM show_status_counts WHERE showid = ?", [stats.tvdbid]])
+        statuses = stats.statusCounts.keys()
+
+    for curStatus in statuses:
+        curCount = stats.statusCounts.get(curStatus, 0)
+        if curCount:
+            queries.append(["INSERT OR REPLACE INTO show_status_counts (showid, status, count) VALUES (?,?,?)", [stats.tvdbid, curStatus, curCount]])
+        else:
+            queries.append(["DELETE FROM show_status_counts WHERE showid = ? AND status = ?", [stats.tvdbid, curStatus]])
+
+    return queries
+
+def _loadStats(myDB, tvdbidList=None):
+    """
+    Reads the stored counts of the given shows, or all of them, and returns a dict of tvdbid -> ShowStats.
+    """
+
+    # there's only so many parameters a query can have, a long list might as well be all of them
+    if tvdbidList == None or len(tvdbidList) > 100:
+        statsResults = myDB.select("SELECT * FROM show_stats")
+        statusResults = myDB.select("SELECT * FROM show_status_counts")
+    else:
+        where = " WHERE showid IN (" + ",".join(["?"] * len(tvdbidList)) + ")"
+        statsResults = myDB.select("SELECT * FROM show_stats" + where, tvdbidList)
+        statusResults = myDB.select("SELECT * FROM show_status_counts" + where, tvdbidList)
+
+    stats = {}
+    for curRow in statsResults:
+        curStats = ShowStats(int(curRow["showid"]), int(curRow["as_of"]))
+        curStats.counts = [int(curRow[x]) for x in STATS_FIELDS]
+        curStats.nextAirdate = curRow["next_airdate"]
+        curStats.recountOn = curRow["recount_on"]
+        stats[curStats.tvdbid] = curStats
+
+    for curRow in statusResults:
+        if int(curRow["showid"]) in stats:
+            stats[int(curRow["showid"])].statusCounts[int(curRow["status"])] = int(curRow["count"])
+
+    return stats
+
+def _getStats(tvdbidList):
+    """
+    Returns a dict of tvdbid -> ShowStats for the given shows, counting the ones which aren't stored
+    or are out of date again.
+    """
+
+    if not tvdbidList:
+        return {}
+
+    today = _today()
+    myDB = db.DBConnection()
+
+    with _lock:
+        stats = _loadStats(myDB, tvdbidList)
+
+        queries = []
+        for curID in tvdbidList:
+            if curID in stats and not stats[curID].isStale(today):
+                continue
+            logger.log(str(curID) + u": Counting the episodes again for the show stats", logger.DEBUG)
+            stats[curID] = _countShow(myDB, curID, today)
+            queries += _saveQueries(stats[curID])
+
+        if queries:
+            myDB.mass_action(queries)
+
+    return stats
+
+def getShowStats(showList):
+    """
+    Returns a dict of tvdbid -> dict of STATS_FIELDS and next_airdate (an ordinal or None) for the shows
+    in showList.
+    """
+
+    stats = _getStats([x.tvdbid for x in showList])
+    return dict([(x, stats[x].toDict()) for x in stats])
+
+def getStatusCounts(showList):
+    """
+    Returns a dict of tvdbid -> dict of episode status -> number of episodes for the shows in showList.
+    """
+
+    stats = _getStats([x.tvdbid for x in showList])
+    return dict([(x, dict([y for y in stats[x].statusCounts.items() if y[1]])) for x in stats])
+
+def _countsChanged(oldRow, newRow):
+    """
+    Returns False if the counts of an episode are the same for both rows, only the airdate, the status
+    and whether there's a file matter for them.
+    """
+    if not oldRow or not newRow:
+        return True
+    return int(oldRow["airdate"]) != int(newRow["airdate"]) or int(oldRow["status"]) != int(newRow["status"]) \
+        or bool(oldRow["location"]) != bool(newRow["location"])
+
+def episodesChanged(tvdbid, changes):
+    """
+    Adds the difference a few saves or deletes made to a show's counts. changes is a list of
+    (season, episode, old row, new row), the rows are dicts with airdate, status and location in them
+    (see TVShow.getEpisodeRow) and old is None for a new episode, new is None for a deleted one.
+    """
+
+    # a save which only changed the name, the description, hasnfo or hastbn doesn't change any count
+    changes = [x for x in changes if _countsChanged(x[2], x[3])]
+    if not changes:
+        return
+
+    today = _today()
+    myDB = db.DBConnection()
+
+    with _lock:
+        stats = _loadStats(myDB, [tvdbid]).get(tvdbid)
+
+        recount = stats == None or stats.isStale(today) or today < stats.asOf
+        statuses = set()
+
+        if not recount:
+            # the counts haven't changed since asOf so they can be taken to be today's
+            stats.asOf = today
+
+            for season, episode, oldRow, newRow in changes:
+                if oldRow:
+                    # the episode might have been the one that airs next or the first one to air
+                    if int(oldRow["airdate"]) in (stats.nextAirdate, stats.recountOn):
+                        recount = True
+                        break
+                    stats.addEpisode(season, episode, int(oldRow["airdate"]), int(oldRow["status"]), oldRow["location"], -1)
+                    statuses.add(int(oldRow["status"]))
+                if newRow:
+                    stats.addEpisode(season, episode, int(newRow["airdate"]), int(newRow["status"]), newRow["location"])
+                    statuses.add(int(newRow["status"]))
+
+        if recount:
+            stats = _countShow(myDB, tvdbid, today)
+            statuses = None
+
+        myDB.mass_action(_saveQueries(stats, statuses))
+
+def recountShow(tvdbid):
+    """
+    Counts a show's episodes again, for when they were changed with SQL.
+    """
+
+    myDB = db.DBConnection()
+    with _lock:
+        myDB.mass_action(_saveQueries(_countShow(myDB, tvdbid, _today())))
+
+def forgetShow(tvdbid):
+    myDB = db.DBConnection()
+    with _lock:
+        myDB.mass_action([["DELETE FROM show_stats WHERE showid = ?", [tvdbid]],
+                          ["DELETE FROM show_status_counts WHERE showid = ?", [tvdbid]]])
+
+def checkStats(myDB=None):
+    """
+    Counts the episodes of every show again and fixes the stored counts which don't match.
+
+    Returns a list of the tvdb ids of the shows whose counts were wrong.
+    """
+
+    if myDB == None:
+        myDB = db.DBConnection()
+
+    today = _today()
+
+    with _lock:
+        sqlResults = myDB.select("SELECT showid, season, episode, airdate, status, location FROM tv_episodes")
+        counted = _countRows(sqlResults, today)
+        for curRow in myDB.select("SELECT tvdb_id FROM tv_shows"):
+            tvdbid = int(curRow["tvdb_id"])
+            if tvdbid not in counted:
+                counted[tvdbid] = ShowStats(tvdbid, today)
+
+        stored = _loadStats(myDB)
+
+        wrong = []
+        queries = []
+        for tvdbid, curStats in counted.items():
+            storedStats = stored.get(tvdbid)
+            # a row that's out of date is counted again when it's read, that doesn't make it wrong
+            if storedStats == None or (storedStats != curStats and not storedStats.isStale(today)):
+                wrong.append(tvdbid)
+                queries += _saveQueries(curStats)
+
+        for tvdbid in stored:
+            if tvdbid not in counted:
+                wrong.append(tvdbid)
+                queries.append(["DELETE FROM show_stats WHERE showid = ?", [tvdbid]])
+                queries.append(["DELETE FROM show_status_counts WHERE showid = ?", [tvdbid]])
+
+        myDB.mass_action(queries)
+
+    return sorted(wrong)
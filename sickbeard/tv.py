@@ -21,7 +21,10 @@ from __future__ import with_statement
 import os.path
 import datetime
 import threading
+import time
+import traceback
 import re
+import weakref
 import glob
 
 import sickbeard
@@ -30,7 +33,7 @@ import xml.etree.cElementTree as etree
 
 from name_parser.parser import NameParser, InvalidNameException
 
-from lib.tvdb_api import tvdb_api, tvdb_exceptions
+from lib.tvdb_api import tvdb_exceptions
 
 from sickbeard import db
 from sickbeard import helpers, exceptions, logger
@@ -38,6 +41,11 @@ from sickbeard.exceptions import ex
 from sickbeard import tvrage
 from sickbeard import image_cache
 from sickbeard import postProcessor
+from sickbeard import show_index
+from sickbeard import file_index
+from sickbeard import show_stats
+from sickbeard import coming_episodes
+from sickbeard import tvdb_store
 
 from sickbeard import encodingKludge as ek
 
@@ -45,9 +53,199 @@ from common import Quality, Overview
 from common import DOWNLOADED, SNATCHED, SNATCHED_PROPER, ARCHIVED, IGNORED, UNAIRED, WANTED, SKIPPED, UNKNOWN
 from common import NAMING_DUPLICATE, NAMING_EXTEND, NAMING_LIMITED_EXTEND, NAMING_SEPARATED_REPEAT, NAMING_LIMITED_EXTEND_E_PREFIXED
 
+# the tv_episodes columns TVEpisode.loadFromDB needs, in the order they're kept in a show's row store
+EPISODE_ROW_FIELDS = ('name', 'description', 'airdate', 'status', 'location', 'file_size', 'tvdbid', 'release_name')
+
+class EpisodeCache(object):
+    """
+    Keeps track of the TVEpisode objects every show has in memory and throws out the least recently
+    used ones once there are more than sickbeard.EPISODE_CACHE_SIZE of them. An evicted episode's data
+    stays in its show's row store so building it again doesn't need the DB.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._episodes = {} # (tvdbid, season, episode) -> [last used, show]
+        self._tick = 0
+
+        # after a pass that couldn't make enough room the next one waits until there are this many episodes
+        self._retrySize = 0
+
+        self.hits = 0
+        self.rowHits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def touch(self, show, season, episode, hit=True):
+        """
+        Marks an episode object as just used, hit is False when it was only now created.
+        """
+        with self._lock:
+            self._tick += 1
+            if hit:
+                self.hits += 1
+
+            key = (show.tvdbid, season, episode)
+            if key in self._episodes:
+                self._episodes[key][0] = self._tick
+            else:
+                self._episodes[key] = [self._tick, show]
+
+    def recordRowLookup(self, found):
+        with self._lock:
+            if found:
+                self.rowHits += 1
+            else:
+                self.misses += 1
+
+    def remove(self, show, season, episode, evicted=False):
+        with self._lock:
+            self._episodes.pop((show.tvdbid, season, episode), None)
+            if evicted:
+                self.evictions += 1
+
+    def forgetShow(self, show):
+        with self._lock:
+            for key in [x for x in self._episodes if x[0] == show.tvdbid]:
+                del self._episodes[key]
+
+    def evict(self):
+        """
+        Evicts the least recently used episodes if there are too many in memory. Episodes that are dirty
+        or locked by someone are skipped, they'll go on a later pass. If a pass can't make enough room the
+        next one only happens once a tenth of maxSize more episodes are in memory, so a cache full of
+        busy episodes isn't sorted again on every new one.
+
+        Returns: the number of episodes that were evicted
+        """
+
+        maxSize = sickbeard.EPISODE_CACHE_SIZE
+        if maxSize <= 0:
+            return 0
+
+        with self._lock:
+            if len(self._episodes) <= max(maxSize, self._retrySize):
+                return 0
+            # make a bit of room at once so we don't sort on every new episode
+            toEvict = len(self._episodes) - maxSize * 9 / 10
+            candidates = sorted(self._episodes.items(), key=lambda x: x[1][0])
+
+        evicted = 0
+        for (tvdbid, season, episode), (lastUsed, show) in candidates:
+            if evicted >= toEvict:
+                break
+            if show.evictEpisode(season, episode):
+                evicted += 1
+
+        with self._lock:
+            if evicted < toEvict:
+                self._retrySize = len(self._episodes) + max(maxSize / 10, 1)
+            else:
+                self._retrySize = 0
+
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._episodes = {}
+            self._retrySize = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._episodes), 'max_size': sickbeard.EPISODE_CACHE_SIZE, 'hits': self.hits,
+                    'row_hits': self.rowHits, 'misses': self.misses, 'evictions': self.evictions}
+
+episodeCache = EpisodeCache()
+
+class EpisodeSaveSession(object):
+    """
+    A unit of work for episodes. While a session is open in a thread TVEpisode.saveToDB only remembers
+    the episode, and they're all written to the DB in one transaction when the outermost session is
+    closed or flush() is called. Sessions opened inside another one join it.
+
+        with EpisodeSaveSession():
+            for curEp in epList:
+                curEp.status = WANTED
+                curEp.saveToDB()
+
+    Anything that reads tv_episodes with SQL inside a session has to flush() first to see the saves.
+    """
+
+    _local = threading.local()
+
+    def __init__(self):
+        self._outer = None
+        self._pending = {} # (tvdbid, season, episode) -> (TVEpisode, its row in the DB)
+
+    @classmethod
+    def current(cls):
+        """
+        Returns the session that's open in this thread or None.
+        """
+        return getattr(cls._local, 'session', None)
+
+    def __enter__(self):
+        self._outer = EpisodeSaveSession.current()
+        if self._outer is not None:
+            return self._outer
+
+        EpisodeSaveSession._local.session = self
+        return self
+
+    def __exit__(self, type, value, tb):
+        if self._outer is None:
+            EpisodeSaveSession._local.session = None
+            self.flush()
+        return False
+
+    def add(self, ep):
+        key = (ep.show.tvdbid, ep.season, ep.episode)
+        if key in self._pending:
+            oldRow = self._pending[key][1]
+        else:
+            # the show stats need to know what changed
+            oldRow = ep.show.getEpisodeRow(ep.season, ep.episode, recordLookup=False)
+        self._pending[key] = (ep, oldRow)
+
+        # the show builds episodes from its row store so it has to know about the save already
+        ep.show.updateEpisodeRow(ep)
+
+    def discard(self, ep):
+        """
+        Forgets a save of ep, returns (ep, its row in the DB) if there was one.
+        """
+        return self._pending.pop((ep.show.tvdbid, ep.season, ep.episode), None)
+
+    def flush(self):
+        """
+        Writes every episode saved so far in one transaction.
+        """
+
+        pending = self._pending.values()
+        self._pending = {}
+        if not pending:
+            return
+
+        epList = [x[0] for x in pending]
+
+        logger.log(u"Saving " + str(len(epList)) + " episodes to the database in one transaction", logger.DEBUG)
+
+        myDB = db.DBConnection()
+        myDB.mass_upsert("tv_episodes", [x._dbValues() for x in epList])
+
+        changes = {}
+        for curEp, oldRow in pending:
+            curEp.dirty = False
+            curEp.show.updateEpisodeRow(curEp)
+            changes.setdefault(curEp.show.tvdbid, []).append((curEp.season, curEp.episode, oldRow, curEp.episodeRow()))
+
+        for tvdbid in changes:
+            show_stats.episodesChanged(tvdbid, changes[tvdbid])
+        coming_episodes.invalidate()
+
 class TVShow(object):
 
-    def __init__ (self, tvdbid, lang=""):
+    def __init__ (self, tvdbid, lang="", sqlShow=None):
 
         self.tvdbid = tvdbid
 
@@ -72,7 +270,20 @@ class TVShow(object):
         self._isDirGood = False
 
         self.episodes = {}
-        
+        # providers are searched from several threads at once so they can ask for the same episode together
+        self.episodesLock = threading.RLock()
+
+        # season -> {episode: tuple of EPISODE_ROW_FIELDS}, filled a season at a time by loadEpisodeRows
+        self._episodeRows = {}
+        # (season, episode) -> evicted episode objects which somebody is still holding on to
+        self._evictedEpisodes = weakref.WeakValueDictionary()
+        self._allEpisodeRowsLoaded = False
+
+        # shows loaded in bulk come with their tv_shows row, they're already in the DB so there's nothing to save
+        if sqlShow is not None:
+            self._loadFromDBRow(sqlShow)
+            return
+
         otherShow = helpers.findCertainShow(sickbeard.showList, self.tvdbid)
         if otherShow != None:
             raise exceptions.MultipleShowObjectsException("Can't create a show if it already exists")
@@ -110,47 +321,164 @@ class TVShow(object):
     # delete references to anything that's not in the internal lists
     def flushEpisodes(self):
 
-        for curSeason in self.episodes:
-            for curEp in self.episodes[curSeason]:
-                myEp = self.episodes[curSeason][curEp]
-                self.episodes[curSeason][curEp] = None
-                del myEp
+        with self.episodesLock:
+            for curSeason in self.episodes:
+                for curEp in self.episodes[curSeason]:
+                    myEp = self.episodes[curSeason][curEp]
+                    self.episodes[curSeason][curEp] = None
+                    del myEp
 
-    def getAllEpisodes(self, season=None, has_location=False):
+            # the DB may have been changed behind our back so the rows have to be read again too
+            self._episodeRows = {}
+            self._evictedEpisodes.clear()
+            self._allEpisodeRowsLoaded = False
+
+        episodeCache.forgetShow(self)
+
+    def loadEpisodeRows(self, season=None):
+        """
+        Reads all of the show's episodes, or just one season's, from the DB in a single query into the
+        row store so getEpisode can build them without going back to the DB one episode at a time.
+        """
 
         myDB = db.DBConnection()
+        if season is None:
+            sqlResults = myDB.select("SELECT * FROM tv_episodes WHERE showid = ?", [self.tvdbid])
+        else:
+            sqlResults = myDB.select("SELECT * FROM tv_episodes WHERE showid = ? AND season = ?", [self.tvdbid, season])
+
+        rows = {}
+        if season is not None:
+            rows[season] = {}
+        for sqlEp in sqlResults:
+            rows.setdefault(int(sqlEp["season"]), {})[int(sqlEp["episode"])] = tuple([sqlEp[x] for x in EPISODE_ROW_FIELDS])
+
+        with self.episodesLock:
+            self._episodeRows.update(rows)
+            if season is None:
+                self._allEpisodeRowsLoaded = True
+
+    def getEpisodeRow(self, season, episode, recordLookup=True):
+        """
+        Returns the stored DB row of an episode as a dict of EPISODE_ROW_FIELDS, loading the season's
+        rows first if they aren't there yet, or None if the episode isn't in the row store.
+
+        recordLookup: False if the lookup isn't for building an episode and shouldn't count in the cache stats
+        """
+
+        with self.episodesLock:
+            if season not in self._episodeRows:
+                self.loadEpisodeRows(season)
+
+            row = self._episodeRows[season].get(episode)
+
+        if recordLookup:
+            episodeCache.recordRowLookup(row is not None)
+
+        if row is None:
+            return None
+        return dict(zip(EPISODE_ROW_FIELDS, row))
 
-        sql_selection = "SELECT season, episode, "
+    def updateEpisodeRow(self, ep):
+        """
+        Puts an episode's current data in the row store, if its season is in there.
+        """
+        with self.episodesLock:
+            if ep.season in self._episodeRows:
+                self._episodeRows[ep.season][ep.episode] = ep.compactRow()
+
+    def removeEpisode(self, season, episode):
+        """
+        Forgets everything about an episode that was deleted from the DB.
+        """
+        with self.episodesLock:
+            if season in self.episodes:
+                self.episodes[season].pop(episode, None)
+            if season in self._episodeRows:
+                self._episodeRows[season].pop(episode, None)
+            self._evictedEpisodes.pop((season, episode), None)
+            episodeCache.remove(self, season, episode)
+
+    def evictEpisode(self, season, episode):
+        """
+        Drops an episode object from memory if nobody is using it, its data is kept in the row store.
+        The show only keeps a weak reference to it, so if something else (a search result, a queue
+        item, another episode's relatedEps) still has it getEpisode hands out that same object again
+        instead of building a second one.
 
-        # subselection to detect multi-episodes early, share_location > 0
-        sql_selection = sql_selection + " (SELECT COUNT (*) FROM tv_episodes WHERE showid = tve.showid AND season = tve.season AND location != '' AND location = tve.location AND episode != tve.episode) AS share_location "
+        Returns: True if the episode object isn't in memory anymore
+        """
 
-        sql_selection = sql_selection + " FROM tv_episodes tve WHERE showid = " + str(self.tvdbid)
+        # don't wait on a show that's busy, the episode can be evicted next time
+        if not self.episodesLock.acquire(False):
+            return False
+
+        try:
+            ep = self.episodes.get(season, {}).get(episode)
+            evicted = ep is not None
+
+            if evicted:
+                if ep.dirty or not ep.lock.acquire(False):
+                    return False
+                try:
+                    if season in self._episodeRows:
+                        self._episodeRows[season][episode] = ep.compactRow()
+                    del self.episodes[season][episode]
+                    self._evictedEpisodes[(season, episode)] = ep
+                finally:
+                    ep.lock.release()
+
+            episodeCache.remove(self, season, episode, evicted)
+            return True
+
+        finally:
+            self.episodesLock.release()
+
+    def getAllEpisodes(self, season=None, has_location=False):
+
+        myDB = db.DBConnection()
+
+        sql_selection = "SELECT season, episode, location FROM tv_episodes WHERE showid = ?"
+        sql_args = [self.tvdbid]
 
         if season is not None:
-            sql_selection = sql_selection + " AND season = " + str(season)
+            sql_selection = sql_selection + " AND season = ?"
+            sql_args.append(season)
         if has_location:
-            sql_selection = sql_selection + " AND location != '' "
+            sql_selection = sql_selection + " AND location != ''"
 
         # need ORDER episode ASC to rename multi-episodes in order S01E01-02
         sql_selection = sql_selection + " ORDER BY season ASC, episode ASC"
 
-        results = myDB.select(sql_selection)
+        results = myDB.select(sql_selection, sql_args)
+
+        # get all the episode data in one go instead of a query for every episode we build
+        if season is None and not self._allEpisodeRowsLoaded:
+            self.loadEpisodeRows()
 
         ep_list = []
+
+        # episodes in the same season with the same file are a multi-episode, (season, location) -> episodes
+        locationGroups = {}
+
         for cur_result in results:
             cur_ep = self.getEpisode(int(cur_result["season"]), int(cur_result["episode"]))
             if cur_ep:
-                if cur_ep.location:
-                    # if there is a location, check if it's a multi-episode (share_location > 0) and put them in relatedEps
-                    if cur_result["share_location"] > 0:
-                        related_eps_result = myDB.select("SELECT * FROM tv_episodes WHERE showid = ? AND season = ? AND location = ? AND episode != ? ORDER BY episode ASC", [self.tvdbid, cur_ep.season, cur_ep.location, cur_ep.episode])
-                        for cur_related_ep in related_eps_result:
-                            related_ep = self.getEpisode(int(cur_related_ep["season"]), int(cur_related_ep["episode"]))
-                            if related_ep not in cur_ep.relatedEps:
-                                cur_ep.relatedEps.append(related_ep)
+                if cur_result["location"]:
+                    locationGroups.setdefault((cur_ep.season, cur_result["location"]), []).append(cur_ep)
                 ep_list.append(cur_ep)
 
+        # put the episodes of each multi-episode in each other's relatedEps, the groups are already in episode order
+        for cur_group in locationGroups.values():
+            if len(cur_group) < 2:
+                continue
+            for cur_ep in cur_group:
+                if not cur_ep.location:
+                    continue
+                for related_ep in cur_group:
+                    if related_ep is not cur_ep and related_ep not in cur_ep.relatedEps:
+                        cur_ep.relatedEps.append(related_ep)
+
         return ep_list
 
 
@@ -158,26 +486,42 @@ class TVShow(object):
 
         #return TVEpisode(self, season, episode)
 
-        if not season in self.episodes:
-            self.episodes[season] = {}
+        with self.episodesLock:
 
-        ep = None
+            if not season in self.episodes:
+                self.episodes[season] = {}
 
-        if not episode in self.episodes[season] or self.episodes[season][episode] == None:
-            if noCreate:
-                return None
+            ep = None
+
+            if not episode in self.episodes[season] or self.episodes[season][episode] == None:
+                ep = self._evictedEpisodes.pop((season, episode), None)
+                if ep is not None:
+                    self.episodes[season][episode] = ep
+                    episodeCache.touch(self, season, episode)
 
-            logger.log(str(self.tvdbid) + ": An object for episode " + str(season) + "x" + str(episode) + " didn't exist in the cache, trying to create it", logger.DEBUG)
+            if not episode in self.episodes[season] or self.episodes[season][episode] == None:
+                if noCreate:
+                    return None
+
+                logger.log(str(self.tvdbid) + ": An object for episode " + str(season) + "x" + str(episode) + " didn't exist in the cache, trying to create it", logger.DEBUG)
+
+                if file != None:
+                    ep = TVEpisode(self, season, episode, file)
+                else:
+                    ep = TVEpisode(self, season, episode)
 
-            if file != None:
-                ep = TVEpisode(self, season, episode, file)
+                if ep != None:
+                    self.episodes[season][episode] = ep
+                    episodeCache.touch(self, season, episode, False)
             else:
-                ep = TVEpisode(self, season, episode)
+                episodeCache.touch(self, season, episode)
 
-            if ep != None:
-                self.episodes[season][episode] = ep
+            ep = self.episodes[season][episode]
 
-        return self.episodes[season][episode]
+        # done outside of the lock, evicting needs the locks of other shows
+        episodeCache.evict()
+
+        return ep
 
     def writeShowNFO(self):
 
@@ -223,52 +567,67 @@ class TVShow(object):
 
 
     # find all media files in the show folder and create episodes for as many as possible
-    def loadEpisodesFromDir (self):
+    def loadEpisodesFromDir (self, mediaFiles=None):
+        """
+        Creates or updates the episodes of the media files in the show directory.
+
+        mediaFiles: only look at these files instead of everything in the show directory
+
+        Returns: the files an episode was found for
+        """
 
         if not ek.ek(os.path.isdir, self._location):
             logger.log(str(self.tvdbid) + ": Show dir doesn't exist, not loading episodes from disk")
-            return
-
-        logger.log(str(self.tvdbid) + ": Loading all episodes from the show directory " + self._location)
+            return []
 
         # get file list
-        mediaFiles = helpers.listMediaFiles(self._location)
+        if mediaFiles is None:
+            logger.log(str(self.tvdbid) + ": Loading all episodes from the show directory " + self._location)
+            mediaFiles = helpers.listMediaFiles(self._location)
+        else:
+            logger.log(str(self.tvdbid) + ": Loading episodes from " + str(len(mediaFiles)) + " files in the show directory " + self._location)
+
+        loadedFiles = []
 
         # create TVEpisodes from each media file (if possible)
-        for mediaFile in mediaFiles:
+        with EpisodeSaveSession():
+            for mediaFile in mediaFiles:
 
-            curEpisode = None
+                curEpisode = None
 
-            logger.log(str(self.tvdbid) + ": Creating episode from " + mediaFile, logger.DEBUG)
-            try:
-                curEpisode = self.makeEpFromFile(ek.ek(os.path.join, self._location, mediaFile))
-            except (exceptions.ShowNotFoundException, exceptions.EpisodeNotFoundException), e:
-                logger.log(u"Episode "+mediaFile+" returned an exception: "+ex(e), logger.ERROR)
-                continue
-            except exceptions.EpisodeDeletedException:
-                logger.log(u"The episode deleted itself when I tried making an object for it", logger.DEBUG)
+                logger.log(str(self.tvdbid) + ": Creating episode from " + mediaFile, logger.DEBUG)
+                try:
+                    curEpisode = self.makeEpFromFile(ek.ek(os.path.join, self._location, mediaFile))
+                except (exceptions.ShowNotFoundException, exceptions.EpisodeNotFoundException), e:
+                    logger.log(u"Episode "+mediaFile+" returned an exception: "+ex(e), logger.ERROR)
+                    continue
+                except exceptions.EpisodeDeletedException:
+                    logger.log(u"The episode deleted itself when I tried making an object for it", logger.DEBUG)
 
-            if curEpisode is None:
-                continue
+                if curEpisode is None:
+                    continue
 
-            # see if we should save the release name in the db
-            ep_file_name = ek.ek(os.path.basename, curEpisode.location)
-            ep_file_name = ek.ek(os.path.splitext, ep_file_name)[0]
+                # see if we should save the release name in the db
+                ep_file_name = ek.ek(os.path.basename, curEpisode.location)
+                ep_file_name = ek.ek(os.path.splitext, ep_file_name)[0]
             
-            parse_result = None
-            try:
-                np = NameParser(False)
-                parse_result = np.parse(ep_file_name)
-            except InvalidNameException:
-                pass
+                parse_result = None
+                try:
+                    np = NameParser(False)
+                    parse_result = np.parse(ep_file_name)
+                except InvalidNameException:
+                    pass
         
-            if not ' ' in ep_file_name and parse_result and parse_result.release_group:
-                logger.log(u"Name " + ep_file_name + " gave release group of " + parse_result.release_group + ", seems valid", logger.DEBUG)
-                curEpisode.release_name = ep_file_name
+                if not ' ' in ep_file_name and parse_result and parse_result.release_group:
+                    logger.log(u"Name " + ep_file_name + " gave release group of " + parse_result.release_group + ", seems valid", logger.DEBUG)
+                    curEpisode.release_name = ep_file_name
+
+                # store the reference in the show
+                if curEpisode != None:
+                    curEpisode.saveToDB()
+                    loadedFiles.append(mediaFile)
 
-            # store the reference in the show
-            if curEpisode != None:
-                curEpisode.saveToDB()
+        return loadedFiles
 
 
     def loadEpisodesFromDB(self):
@@ -281,66 +640,49 @@ class TVShow(object):
 
         scannedEps = {}
 
-        ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
-
-        if self.lang:
-            ltvdb_api_parms['language'] = self.lang
-
-        t = tvdb_api.Tvdb(**ltvdb_api_parms)
-
-        cachedShow = t[self.tvdbid]
+        cachedShow = tvdb_store.getShow(self.tvdbid, self.lang)
         cachedSeasons = {}
 
-        for curResult in sqlResults:
+        with EpisodeSaveSession():
+            for curResult in sqlResults:
 
-            deleteEp = False
+                deleteEp = False
                     
-            curSeason = int(curResult["season"])
-            curEpisode = int(curResult["episode"])
-            if curSeason not in cachedSeasons:
-                try:
-                    cachedSeasons[curSeason] = cachedShow[curSeason]
-                except tvdb_exceptions.tvdb_seasonnotfound, e:
-                    logger.log(u"Error when trying to load the episode from TVDB: "+e.message, logger.WARNING)
-                    deleteEp = True
+                curSeason = int(curResult["season"])
+                curEpisode = int(curResult["episode"])
+                if curSeason not in cachedSeasons:
+                    try:
+                        cachedSeasons[curSeason] = cachedShow[curSeason]
+                    except tvdb_exceptions.tvdb_seasonnotfound, e:
+                        logger.log(u"Error when trying to load the episode from TVDB: "+e.message, logger.WARNING)
+                        deleteEp = True
 
-            if not curSeason in scannedEps:
-                scannedEps[curSeason] = {}
+                if not curSeason in scannedEps:
+                    scannedEps[curSeason] = {}
 
-            logger.log(u"Loading episode "+str(curSeason)+"x"+str(curEpisode)+" from the DB", logger.DEBUG)
+                logger.log(u"Loading episode "+str(curSeason)+"x"+str(curEpisode)+" from the DB", logger.DEBUG)
 
-            try:
-                curEp = self.getEpisode(curSeason, curEpisode)
+                try:
+                    curEp = self.getEpisode(curSeason, curEpisode)
                 
-                # if we found out that the ep is no longer on TVDB then delete it from our database too
-                if deleteEp:
-                    curEp.deleteEpisode()
+                    # if we found out that the ep is no longer on TVDB then delete it from our database too
+                    if deleteEp:
+                        curEp.deleteEpisode()
                 
-                curEp.loadFromDB(curSeason, curEpisode)
-                curEp.loadFromTVDB(tvapi=t, cachedSeason=cachedSeasons[curSeason])
-                scannedEps[curSeason][curEpisode] = True
-            except exceptions.EpisodeDeletedException:
-                logger.log(u"Tried loading an episode from the DB that should have been deleted, skipping it", logger.DEBUG)
-                continue
+                    curEp.loadFromDB(curSeason, curEpisode)
+                    curEp.loadFromTVDB(cachedSeason=cachedSeasons[curSeason])
+                    scannedEps[curSeason][curEpisode] = True
+                except exceptions.EpisodeDeletedException:
+                    logger.log(u"Tried loading an episode from the DB that should have been deleted, skipping it", logger.DEBUG)
+                    continue
 
         return scannedEps
 
 
     def loadEpisodesFromTVDB(self, cache=True):
 
-        # There's gotta be a better way of doing this but we don't wanna
-        # change the cache value elsewhere
-        ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
-
-        if not cache:
-            ltvdb_api_parms['cache'] = False
-
-        if self.lang:
-            ltvdb_api_parms['language'] = self.lang
-
         try:
-            t = tvdb_api.Tvdb(**ltvdb_api_parms)
-            showObj = t[self.tvdbid]
+            showObj = tvdb_store.getShow(self.tvdbid, self.lang, cache)
         except tvdb_exceptions.tvdb_error:
             logger.log(u"TVDB timed out, unable to update episodes from TVDB", logger.ERROR)
             return None
@@ -349,32 +691,33 @@ class TVShow(object):
 
         scannedEps = {}
 
-        for season in showObj:
-            scannedEps[season] = {}
-            for episode in showObj[season]:
-                # need some examples of wtf episode 0 means to decide if we want it or not
-                if episode == 0:
-                    continue
-                try:
-                    #ep = TVEpisode(self, season, episode)
-                    ep = self.getEpisode(season, episode)
-                except exceptions.EpisodeNotFoundException:
-                    logger.log(str(self.tvdbid) + ": TVDB object for " + str(season) + "x" + str(episode) + " is incomplete, skipping this episode")
-                    continue
-                else:
+        with EpisodeSaveSession():
+            for season in showObj:
+                scannedEps[season] = {}
+                for episode in showObj[season]:
+                    # need some examples of wtf episode 0 means to decide if we want it or not
+                    if episode == 0:
+                        continue
                     try:
-                        ep.loadFromTVDB(tvapi=t)
-                    except exceptions.EpisodeDeletedException:
-                        logger.log(u"The episode was deleted, skipping the rest of the load")
+                        #ep = TVEpisode(self, season, episode)
+                        ep = self.getEpisode(season, episode)
+                    except exceptions.EpisodeNotFoundException:
+                        logger.log(str(self.tvdbid) + ": TVDB object for " + str(season) + "x" + str(episode) + " is incomplete, skipping this episode")
                         continue
+                    else:
+                        try:
+                            ep.loadFromTVDB(cachedSeason=showObj[season])
+                        except exceptions.EpisodeDeletedException:
+                            logger.log(u"The episode was deleted, skipping the rest of the load")
+                            continue
 
-                with ep.lock:
-                    logger.log(str(self.tvdbid) + ": Loading info from theTVDB for episode " + str(season) + "x" + str(episode), logger.DEBUG)
-                    ep.loadFromTVDB(season, episode, tvapi=t)
-                    if ep.dirty:
-                        ep.saveToDB()
+                    with ep.lock:
+                        logger.log(str(self.tvdbid) + ": Loading info from theTVDB for episode " + str(season) + "x" + str(episode), logger.DEBUG)
+                        ep.loadFromTVDB(season, episode, cachedSeason=showObj[season])
+                        if ep.dirty:
+                            ep.saveToDB()
 
-                scannedEps[season][episode] = True
+                    scannedEps[season][episode] = True
 
         return scannedEps
 
@@ -453,16 +796,7 @@ class TVShow(object):
         # if we have an air-by-date show then get the real season/episode numbers
         if parse_result.air_by_date:
             try:
-                # There's gotta be a better way of doing this but we don't wanna
-                # change the cache value elsewhere
-                ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
-
-                if self.lang:
-                    ltvdb_api_parms['language'] = self.lang
-
-                t = tvdb_api.Tvdb(**ltvdb_api_parms)
-
-                epObj = t[self.tvdbid].airedOn(parse_result.air_date)[0]
+                epObj = tvdb_store.getShow(self.tvdbid, self.lang).airedOn(parse_result.air_date)[0]
                 season = int(epObj["seasonnumber"])
                 episodes = [int(epObj["episodenumber"])]
             except tvdb_exceptions.tvdb_episodenotfound:
@@ -578,64 +912,55 @@ class TVShow(object):
             logger.log(str(self.tvdbid) + ": Unable to find the show in the database")
             return
         else:
-            if self.name == "":
-                self.name = sqlResults[0]["show_name"]
-            self.tvrname = sqlResults[0]["tvr_name"]
-            if self.network == "":
-                self.network = sqlResults[0]["network"]
-            if self.genre == "":
-                self.genre = sqlResults[0]["genre"]
+            self._loadFromDBRow(sqlResults[0])
 
-            self.runtime = sqlResults[0]["runtime"]
+    def _loadFromDBRow(self, sqlShow):
 
-            self.status = sqlResults[0]["status"]
-            if self.status == None:
-                self.status = ""
-            self.airs = sqlResults[0]["airs"]
-            if self.airs == None:
-                self.airs = ""
-            self.startyear = sqlResults[0]["startyear"]
-            if self.startyear == None:
-                self.startyear = 0
+        if self.name == "":
+            self.name = sqlShow["show_name"]
+        self.tvrname = sqlShow["tvr_name"]
+        if self.network == "":
+            self.network = sqlShow["network"]
+        if self.genre == "":
+            self.genre = sqlShow["genre"]
 
-            self.air_by_date = sqlResults[0]["air_by_date"]
-            if self.air_by_date == None:
-                self.air_by_date = 0
+        self.runtime = sqlShow["runtime"]
 
-            self.quality = int(sqlResults[0]["quality"])
-            self.flatten_folders = int(sqlResults[0]["flatten_folders"])
-            self.paused = int(sqlResults[0]["paused"])
+        self.status = sqlShow["status"]
+        if self.status == None:
+            self.status = ""
+        self.airs = sqlShow["airs"]
+        if self.airs == None:
+            self.airs = ""
+        self.startyear = sqlShow["startyear"]
+        if self.startyear == None:
+            self.startyear = 0
+
+        self.air_by_date = sqlShow["air_by_date"]
+        if self.air_by_date == None:
+            self.air_by_date = 0
 
-            self._location = sqlResults[0]["location"]
+        self.quality = int(sqlShow["quality"])
+        self.flatten_folders = int(sqlShow["flatten_folders"])
+        self.paused = int(sqlShow["paused"])
 
-            if self.tvrid == 0:
-                self.tvrid = int(sqlResults[0]["tvr_id"])
+        self._location = sqlShow["location"]
 
-            if self.lang == "":
-                self.lang = sqlResults[0]["lang"]
+        if self.tvrid == 0:
+            self.tvrid = int(sqlShow["tvr_id"])
+
+        if self.lang == "":
+            self.lang = sqlShow["lang"]
 
 
     def loadFromTVDB(self, cache=True, tvapi=None, cachedSeason=None):
 
         logger.log(str(self.tvdbid) + ": Loading show info from theTVDB")
 
-        # There's gotta be a better way of doing this but we don't wanna
-        # change the cache value elsewhere
         if tvapi is None:
-            ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
-
-            if not cache:
-                ltvdb_api_parms['cache'] = False
-            
-            if self.lang:
-                ltvdb_api_parms['language'] = self.lang
-
-            t = tvdb_api.Tvdb(**ltvdb_api_parms)
-
+            myEp = tvdb_store.getShow(self.tvdbid, self.lang, cache)
         else:
-            t = tvapi
-
-        myEp = t[self.tvdbid]
+            myEp = tvapi[self.tvdbid]
 
         self.name = myEp["seriesname"]
 
@@ -747,9 +1072,13 @@ class TVShow(object):
         myDB = db.DBConnection()
         myDB.action("DELETE FROM tv_episodes WHERE showid = ?", [self.tvdbid])
         myDB.action("DELETE FROM tv_shows WHERE tvdb_id = ?", [self.tvdbid])
+        file_index.clearFileStates(self.tvdbid)
+        show_stats.forgetShow(self.tvdbid)
+        tvdb_store.forgetShow(self.tvdbid)
 
         # remove self from show list
         sickbeard.showList = [x for x in sickbeard.showList if x.tvdbid != self.tvdbid]
+        show_index.invalidate()
         
         # clear the cache
         image_cache_dir = ek.ek(os.path.join, sickbeard.CACHE_DIR, 'images')
@@ -763,45 +1092,89 @@ class TVShow(object):
         logger.log(u"Checking & filling cache for show "+self.name)
         cache_inst.fill_cache(self)
 
-    def refreshDir(self):
+    def refreshDir(self, fullScan=False):
+        """
+        Picks up the new and changed files in the show directory and forgets the episode files that
+        are gone. The files that haven't changed since the last refresh aren't parsed again, only their
+        nfo and tbn are looked for if the folder they're in (or one of its subfolders) changed.
+
+        fullScan: look at every file again, even the ones that haven't changed
+        """
 
         # make sure the show dir is where we think it is unless dirs are created on the fly
         if not ek.ek(os.path.isdir, self._location) and not sickbeard.CREATE_MISSING_SHOW_DIRS:
             return False
 
-        # load from dir
-        self.loadEpisodesFromDir()
+        myDB = db.DBConnection()
 
-        # run through all locations from DB, check that they exist
-        logger.log(str(self.tvdbid) + ": Loading all episodes with a location from the database")
+        scan = file_index.DirScan(self.tvdbid, self._location, fullScan)
 
-        myDB = db.DBConnection()
-        sqlResults = myDB.select("SELECT * FROM tv_episodes WHERE showid = ? AND location != ''", [self.tvdbid])
+        # a file that no episode points to is looked at again even if it hasn't changed
+        knownLocations = set([ek.ek(os.path.normpath, x["location"]) for x in myDB.select("SELECT location FROM tv_episodes WHERE showid = ? AND location != ''", [self.tvdbid])])
+        changedFiles = set(scan.changed)
+        newFiles = [x for x in scan.files if x in changedFiles or ek.ek(os.path.normpath, x) not in knownLocations]
 
-        for ep in sqlResults:
-            curLoc = os.path.normpath(ep["location"])
-            season = int(ep["season"])
-            episode = int(ep["episode"])
+        logger.log(str(self.tvdbid) + ": Refreshing " + str(len(scan.files)) + " files, " + str(len(newFiles)) + " of them new or changed and " + str(len(scan.removed)) + " gone since the last refresh")
 
-            try:
-                curEp = self.getEpisode(season, episode)
-            except exceptions.EpisodeDeletedException:
-                logger.log(u"The episode was deleted while we were refreshing it, moving on to the next one", logger.DEBUG)
-                continue
+        with EpisodeSaveSession() as session:
+            # load from dir
+            loadedFiles = self.loadEpisodesFromDir(newFiles)
 
-            # if the path doesn't exist or if it's not in our show dir
-            if not ek.ek(os.path.isfile, curLoc) or not os.path.normpath(curLoc).startswith(os.path.normpath(self.location)):
+            # the files we just found have to be in the DB before we go through the locations in it
+            session.flush()
 
-                with curEp.lock:
-                    # if it used to have a file associated with it and it doesn't anymore then set it to IGNORED
-                    if curEp.location and curEp.status in Quality.DOWNLOADED:
-                        logger.log(str(self.tvdbid) + ": Location for " + str(season) + "x" + str(episode) + " doesn't exist, removing it and changing our status to IGNORED", logger.DEBUG)
-                        curEp.status = IGNORED
-                    curEp.location = ''
-                    curEp.hasnfo = False
-                    curEp.hastbn = False
-                    curEp.release_name = ''
-                    curEp.saveToDB()
+            # run through all locations from DB, check that they exist
+            logger.log(str(self.tvdbid) + ": Loading all episodes with a location from the database")
+
+            sqlResults = myDB.select("SELECT * FROM tv_episodes WHERE showid = ? AND location != ''", [self.tvdbid])
+
+            presentFiles = set([ek.ek(os.path.normpath, x) for x in scan.files])
+            parsedFiles = set([ek.ek(os.path.normpath, x) for x in loadedFiles])
+            metaFolders = set([ek.ek(os.path.normpath, x) for x in scan.metaFolders()])
+
+            for ep in sqlResults:
+                curLoc = os.path.normpath(ep["location"])
+
+                # a file that was just parsed had its nfo and tbn checked already and the ones of an unchanged
+                # file can only have been made or deleted if a folder around it changed
+                if curLoc in parsedFiles or (curLoc in presentFiles and os.path.dirname(curLoc) not in metaFolders):
+                    continue
+
+                season = int(ep["season"])
+                episode = int(ep["episode"])
+
+                try:
+                    curEp = self.getEpisode(season, episode)
+                except exceptions.EpisodeDeletedException:
+                    logger.log(u"The episode was deleted while we were refreshing it, moving on to the next one", logger.DEBUG)
+                    continue
+
+                # the file hasn't changed but its nfo or tbn may have been made or deleted since the last refresh
+                if curLoc in presentFiles:
+                    with curEp.lock:
+                        if curEp.checkForMetaFiles():
+                            curEp.saveToDB()
+                    continue
+
+                # if the path doesn't exist or if it's not in our show dir
+                if not ek.ek(os.path.isfile, curLoc) or not os.path.normpath(curLoc).startswith(os.path.normpath(self.location)):
+
+                    with curEp.lock:
+                        # if it used to have a file associated with it and it doesn't anymore then set it to IGNORED
+                        if curEp.location and curEp.status in Quality.DOWNLOADED:
+                            logger.log(str(self.tvdbid) + ": Location for " + str(season) + "x" + str(episode) + " doesn't exist, removing it and changing our status to IGNORED", logger.DEBUG)
+                            curEp.status = IGNORED
+                        curEp.location = ''
+                        curEp.hasnfo = False
+                        curEp.hastbn = False
+                        curEp.release_name = ''
+                        curEp.saveToDB()
+
+        # remember the files that gave an episode, the others get another try next time
+        failedFiles = set(newFiles) - set(loadedFiles)
+        states = dict([(x, scan.files[x]) for x in loadedFiles])
+        states.update(dict([(x, scan.folders[x]) for x in scan.changedFolders]))
+        file_index.updateFileStates(self.tvdbid, states, scan.removed + scan.removedFolders + list(failedFiles))
 
     def saveToDB(self):
 
@@ -829,6 +1202,9 @@ class TVShow(object):
 
         myDB.upsert("tv_shows", newValueDict, controlValueDict)
 
+        # the ids or names may have changed
+        show_index.invalidate()
+
 
     def __str__(self):
         toReturn = ""
@@ -1054,42 +1430,64 @@ class TVEpisode(object):
 
         logger.log(str(self.show.tvdbid) + ": Loading episode details from DB for episode " + str(season) + "x" + str(episode), logger.DEBUG)
 
-        myDB = db.DBConnection()
-        sqlResults = myDB.select("SELECT * FROM tv_episodes WHERE showid = ? AND season = ? AND episode = ?", [self.show.tvdbid, season, episode])
+        # most of the time the show already read the row along with the rest of the season
+        sqlEp = self.show.getEpisodeRow(season, episode)
 
-        if len(sqlResults) > 1:
-            raise exceptions.MultipleDBEpisodesException("Your DB has two records for the same show somehow.")
-        elif len(sqlResults) == 0:
-            logger.log(str(self.show.tvdbid) + ": Episode " + str(self.season) + "x" + str(self.episode) + " not found in the database", logger.DEBUG)
-            return False
+        if sqlEp is None:
+            myDB = db.DBConnection()
+            sqlResults = myDB.select("SELECT * FROM tv_episodes WHERE showid = ? AND season = ? AND episode = ?", [self.show.tvdbid, season, episode])
+
+            if len(sqlResults) > 1:
+                raise exceptions.MultipleDBEpisodesException("Your DB has two records for the same show somehow.")
+            elif len(sqlResults) == 0:
+                logger.log(str(self.show.tvdbid) + ": Episode " + str(self.season) + "x" + str(self.episode) + " not found in the database", logger.DEBUG)
+                return False
+
+            sqlEp = sqlResults[0]
+
+        self._loadFromDBRow(season, episode, sqlEp)
+        return True
+
+    def _loadFromDBRow(self, season, episode, sqlEp):
+
+        #NAMEIT logger.log(u"AAAAA from" + str(self.season)+"x"+str(self.episode) + " -" + self.name + " to " + str(sqlEp["name"]))
+        if sqlEp["name"] != None:
+            self.name = sqlEp["name"]
+        self.season = season
+        self.episode = episode
+        self.description = sqlEp["description"]
+        if self.description == None:
+            self.description = ""
+        self.airdate = datetime.date.fromordinal(int(sqlEp["airdate"]))
+        #logger.log(u"1 Status changes from " + str(self.status) + " to " + str(sqlEp["status"]), logger.DEBUG)
+        self.status = int(sqlEp["status"])
+
+        # don't overwrite my location
+        if sqlEp["location"] != "" and sqlEp["location"] != None:
+            self.location = os.path.normpath(sqlEp["location"])
+        if sqlEp["file_size"]:
+            self.file_size = int(sqlEp["file_size"])
         else:
-            #NAMEIT logger.log(u"AAAAA from" + str(self.season)+"x"+str(self.episode) + " -" + self.name + " to " + str(sqlResults[0]["name"]))
-            if sqlResults[0]["name"] != None:
-                self.name = sqlResults[0]["name"]
-            self.season = season
-            self.episode = episode
-            self.description = sqlResults[0]["description"]
-            if self.description == None:
-                self.description = ""
-            self.airdate = datetime.date.fromordinal(int(sqlResults[0]["airdate"]))
-            #logger.log(u"1 Status changes from " + str(self.status) + " to " + str(sqlResults[0]["status"]), logger.DEBUG)
-            self.status = int(sqlResults[0]["status"])
-
-            # don't overwrite my location
-            if sqlResults[0]["location"] != "" and sqlResults[0]["location"] != None:
-                self.location = os.path.normpath(sqlResults[0]["location"])
-            if sqlResults[0]["file_size"]:
-                self.file_size = int(sqlResults[0]["file_size"])
-            else:
-                self.file_size = 0
+            self.file_size = 0
 
-            self.tvdbid = int(sqlResults[0]["tvdbid"])
-            
-            if sqlResults[0]["release_name"] != None:
-                self.release_name = sqlResults[0]["release_name"]
+        self.tvdbid = int(sqlEp["tvdbid"])
 
-            self.dirty = False
-            return True
+        if sqlEp["release_name"] != None:
+            self.release_name = sqlEp["release_name"]
+
+        self.dirty = False
+
+    def compactRow(self):
+        """
+        Returns this episode's data the way its show keeps it in the row store, see EPISODE_ROW_FIELDS.
+        """
+        return (self.name, self.description, self.airdate.toordinal(), self.status, self.location, self.file_size, self.tvdbid, self.release_name)
+
+    def episodeRow(self):
+        """
+        Returns this episode's data as a dict of EPISODE_ROW_FIELDS, like TVShow.getEpisodeRow.
+        """
+        return dict(zip(EPISODE_ROW_FIELDS, self.compactRow()))
 
     def loadFromTVDB(self, season=None, episode=None, cache=True, tvapi=None, cachedSeason=None):
 
@@ -1105,20 +1503,9 @@ class TVEpisode(object):
         try:
             if cachedSeason is None:
                 if tvapi is None:
-                    # There's gotta be a better way of doing this but we don't wanna
-                    # change the cache value elsewhere
-                    ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
-
-                    if not cache:
-                        ltvdb_api_parms['cache'] = False
-
-                    if tvdb_lang:
-                            ltvdb_api_parms['language'] = tvdb_lang
-
-                    t = tvdb_api.Tvdb(**ltvdb_api_parms)
+                    myEp = tvdb_store.getEpisode(self.show.tvdbid, tvdb_lang, season, episode, cache)
                 else:
-                    t = tvapi
-                myEp = t[self.show.tvdbid][season][episode]
+                    myEp = tvapi[self.show.tvdbid][season][episode]
             else:
                 myEp = cachedSeason[episode]
 
@@ -1139,8 +1526,10 @@ class TVEpisode(object):
             return
 
 
-        if not myEp["firstaired"] or myEp["firstaired"] == "0000-00-00":
-            myEp["firstaired"] = str(datetime.date.fromordinal(1))
+        # the TVDB objects are shared, don't change them
+        firstAired = myEp["firstaired"]
+        if not firstAired or firstAired == "0000-00-00":
+            firstAired = str(datetime.date.fromordinal(1))
 
         if myEp["episodename"] == None or myEp["episodename"] == "":
             logger.log(u"This episode ("+self.show.name+" - "+str(season)+"x"+str(episode)+") has no name on TVDB")
@@ -1158,7 +1547,7 @@ class TVEpisode(object):
             self.description = ""
         else:
             self.description = tmp_description
-        rawAirdate = [int(x) for x in myEp["firstaired"].split("-")]
+        rawAirdate = [int(x) for x in firstAired.split("-")]
         try:
             self.airdate = datetime.date(rawAirdate[0], rawAirdate[1], rawAirdate[2])
         except ValueError:
@@ -1329,10 +1718,19 @@ class TVEpisode(object):
 
         logger.log(u"Deleting "+self.show.name+" "+str(self.season)+"x"+str(self.episode)+" from the DB", logger.DEBUG)
 
+        oldRow = self.show.getEpisodeRow(self.season, self.episode, recordLookup=False)
+
         # remove myself from the show dictionary
-        if self.show.getEpisode(self.season, self.episode, noCreate=True) == self:
-            logger.log(u"Removing myself from my show's list", logger.DEBUG)
-            del self.show.episodes[self.season][self.episode]
+        logger.log(u"Removing myself from my show's list", logger.DEBUG)
+        self.show.removeEpisode(self.season, self.episode)
+
+        # a save that's waiting for the end of a session would put me right back
+        session = EpisodeSaveSession.current()
+        if session is not None:
+            discarded = session.discard(self)
+            # the row store already has the save that never made it to the DB
+            if discarded:
+                oldRow = discarded[1]
 
         # delete myself from the DB
         logger.log(u"Deleting myself from the database", logger.DEBUG)
@@ -1340,6 +1738,10 @@ class TVEpisode(object):
         sql = "DELETE FROM tv_episodes WHERE showid="+str(self.show.tvdbid)+" AND season="+str(self.season)+" AND episode="+str(self.episode)
         myDB.action(sql)
 
+        if oldRow:
+            show_stats.episodesChanged(self.show.tvdbid, [(self.season, self.episode, oldRow, None)])
+            coming_episodes.invalidate()
+
         raise exceptions.EpisodeDeletedException()
 
     def saveToDB(self, forceSave=False):
@@ -1354,11 +1756,34 @@ class TVEpisode(object):
             logger.log(str(self.show.tvdbid) + ": Not saving episode to db - record is not dirty", logger.DEBUG)
             return
 
+        session = EpisodeSaveSession.current()
+        if session is not None:
+            session.add(self)
+            return
+
         logger.log(str(self.show.tvdbid) + ": Saving episode details to database", logger.DEBUG)
 
         logger.log(u"STATUS IS " + str(self.status), logger.DEBUG)
 
         myDB = db.DBConnection()
+
+        oldRow = self.show.getEpisodeRow(self.season, self.episode, recordLookup=False)
+
+        # use a custom update/insert method to get the data into the DB
+        newValueDict, controlValueDict = self._dbValues()
+        myDB.upsert("tv_episodes", newValueDict, controlValueDict)
+
+        self.dirty = False
+        self.show.updateEpisodeRow(self)
+
+        show_stats.episodesChanged(self.show.tvdbid, [(self.season, self.episode, oldRow, self.episodeRow())])
+        coming_episodes.invalidate()
+
+    def _dbValues(self):
+        """
+        Returns the (newValueDict, controlValueDict) to upsert this episode into tv_episodes with.
+        """
+
         newValueDict = {"tvdbid": self.tvdbid,
                         "name": self.name,
                         "description": self.description,
@@ -1373,8 +1798,7 @@ class TVEpisode(object):
                             "season": self.season,
                             "episode": self.episode}
 
-        # use a custom update/insert method to get the data into the DB
-        myDB.upsert("tv_episodes", newValueDict, controlValueDict)
+        return (newValueDict, controlValueDict)
 
     def fullPath (self):
         if self.location == None or self.location == "":
@@ -1745,3 +2169,37 @@ class TVEpisode(object):
             self.saveToDB()
             for relEp in self.relatedEps:
                 relEp.saveToDB()
+
+
+def loadShowsFromDB():
+    """
+    Builds a TVShow for every show in the database out of a single query. Unlike TVShow(tvdbid) this
+    doesn't look every show up again, check it against the show list or write it back to the DB.
+
+    Returns: a list of TVShow objects
+    """
+
+    startTime = time.time()
+
+    myDB = db.DBConnection()
+    sqlResults = myDB.select("SELECT * FROM tv_shows")
+
+    queryTime = time.time()
+
+    showList = []
+    seenIDs = set()
+
+    for sqlShow in sqlResults:
+        try:
+            tvdbid = int(sqlShow["tvdb_id"])
+            if tvdbid in seenIDs:
+                raise exceptions.MultipleShowObjectsException("Can't create a show if it already exists")
+            showList.append(TVShow(tvdbid, sqlShow=sqlShow))
+            seenIDs.add(tvdbid)
+        except Exception, e:
+            logger.log(u"There was an error creating the show in " + sqlShow["location"] + ": " + str(e).decode('utf-8'), logger.ERROR)
+            logger.log(traceback.format_exc(), logger.DEBUG)
+
+    logger.log(u"Loaded " + str(len(showList)) + " shows from the database: query %.3fs, building shows %.3fs" % (queryTime - startTime, time.time() - queryTime), logger.DEBUG)
+
+    return showList
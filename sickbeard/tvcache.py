@@ -28,14 +28,18 @@ from sickbeard.common import Quality
 
 from sickbeard import helpers, exceptions, show_name_helpers
 from sickbeard import name_cache
+from sickbeard import tvdb_store
 from sickbeard.exceptions import ex
 
 #import xml.etree.cElementTree as etree
 import xml.dom.minidom
 
-from lib.tvdb_api import tvdb_api, tvdb_exceptions
+from lib.tvdb_api import tvdb_exceptions
 
-from name_parser.parser import NameParser, InvalidNameException
+from sickbeard.databases import cache_db
+
+# the order of the values in a cache entry as returned by TVCache._addCacheEntry
+CACHE_COLUMNS = ('name', 'season', 'episodes', 'tvrid', 'tvdbid', 'url', 'time', 'quality')
 
 
 class CacheDBConnection(db.DBConnection):
@@ -47,6 +51,8 @@ class CacheDBConnection(db.DBConnection):
         try:
             sql = "CREATE TABLE "+providerName+" (name TEXT, season NUMERIC, episodes TEXT, tvrid NUMERIC, tvdbid NUMERIC, url TEXT, time NUMERIC, quality TEXT);"
             self.connection.execute(sql)
+            for sql in cache_db.providerIndexQueries(providerName):
+                self.connection.execute(sql)
             self.connection.commit()
         except sqlite3.OperationalError, e:
             if str(e) != "table "+providerName+" already exists":
@@ -69,6 +75,9 @@ class TVCache():
         self.providerID = self.provider.getID()
         self.minTime = 10
 
+        # only write new items and drop the ones which left the feed instead of rewriting the whole table
+        self.incremental = True
+
     def _getDB(self):
 
         return CacheDBConnection(self.providerID)
@@ -77,7 +86,8 @@ class TVCache():
 
         myDB = self._getDB()
 
-        myDB.action("DELETE FROM "+self.providerID+" WHERE 1")
+        myDB.mass_action([["DELETE FROM "+self.providerID+" WHERE 1"],
+                          ["DELETE FROM cache_episodes WHERE provider = ?", [self.providerID]]])
 
     def _getRSSData(self):
 
@@ -104,10 +114,6 @@ class TVCache():
         else:
             return []
 
-        # now that we've loaded the current RSS feed lets delete the old cache
-        logger.log(u"Clearing "+self.provider.name+" cache and updating with new information")
-        self._clearCache()
-
         if not self._checkAuth(data):
             raise exceptions.AuthException("Your authentication info for "+self.provider.name+" is incorrect, check your config")
 
@@ -123,9 +129,63 @@ class TVCache():
             logger.log(u"Resulting XML from "+self.provider.name+" isn't RSS, not parsing it", logger.ERROR)
             return []
 
+        cacheEntries = []
         for item in items:
+            cacheEntry = self._parseItem(item)
+            if cacheEntry:
+                cacheEntries.append(cacheEntry)
+
+        self._updateCacheEntries(cacheEntries)
+
+    def _updateCacheEntries(self, cacheEntries):
+        """
+        Replaces the contents of the cache with the given entries in a single transaction.
+
+        In incremental mode rows whose URL is still in the feed are left alone, only
+        the new entries are inserted and the ones no longer in the feed are removed.
+        """
+
+        myDB = self._getDB()
+
+        insertSQL = "INSERT INTO "+self.providerID+" ("+", ".join(CACHE_COLUMNS)+") VALUES ("+",".join(["?"] * len(CACHE_COLUMNS))+")"
+        mappingSQL = "INSERT INTO cache_episodes (provider, url, tvdbid, season, episode) VALUES (?,?,?,?,?)"
+        urlIndex = CACHE_COLUMNS.index('url')
+
+        if self.incremental:
+            cachedURLs = set([x["url"] for x in myDB.select("SELECT url FROM "+self.providerID)])
+        else:
+            cachedURLs = set()
+
+        # a feed can list the same release more than once, only keep the first
+        newEntries = []
+        feedURLs = set()
+        for curEntry in cacheEntries:
+            if curEntry[urlIndex] not in cachedURLs and curEntry[urlIndex] not in feedURLs:
+                newEntries.append(curEntry)
+            feedURLs.add(curEntry[urlIndex])
+
+        mappings = []
+        for name, season, episodes, tvrid, tvdbid, url, curTime, quality in newEntries:
+            for curEpisode in cache_db.episodeNumbers(episodes):
+                mappings.append([self.providerID, url, tvdbid, season, curEpisode])
+
+        if not self.incremental:
+            logger.log(u"Clearing "+self.provider.name+" cache and updating with new information")
+            myDB.mass_action([["DELETE FROM "+self.providerID+" WHERE 1"],
+                              ["DELETE FROM cache_episodes WHERE provider = ?", [self.providerID]],
+                              [insertSQL, newEntries, True],
+                              [mappingSQL, mappings, True]])
+            return
+
+        staleURLs = [[x] for x in cachedURLs - feedURLs]
 
-            self._parseItem(item)
+        logger.log(u"Updating "+self.provider.name+" cache: "+str(len(newEntries))+" new, "+str(len(staleURLs))+" removed, "+str(len(feedURLs) - len(newEntries))+" unchanged")
+
+        if newEntries or staleURLs:
+            myDB.mass_action([["DELETE FROM "+self.providerID+" WHERE url = ?", staleURLs, True],
+                              ["DELETE FROM cache_episodes WHERE provider = ? AND url = ?", [[self.providerID, x[0]] for x in staleURLs], True],
+                              [insertSQL, newEntries, True],
+                              [mappingSQL, mappings, True]])
 
     def _translateLinkURL(self, url):
         return url.replace('&amp;','&')
@@ -145,7 +205,7 @@ class TVCache():
 
         logger.log(u"Adding item from RSS to cache: "+title, logger.DEBUG)
 
-        self._addCacheEntry(title, url)
+        return self._addCacheEntry(title, url)
 
     def _getLastUpdate(self):
         myDB = self._getDB()
@@ -179,19 +239,25 @@ class TVCache():
         return True
 
     def _addCacheEntry(self, name, url, season=None, episodes=None, tvdb_id=0, tvrage_id=0, quality=None, extraNames=[]):
-
-        myDB = self._getDB()
+        """
+        Works out the show, episode and quality of a release and returns the cache row
+        for it (values in CACHE_COLUMNS order), or False if it can't be used. Nothing is
+        written here, updateCache stores all the rows of a feed at once.
+        """
 
         parse_result = None
 
         # if we don't have complete info then parse the filename to get it
+        classification = show_name_helpers.classifyRelease(name)
         for curName in [name] + extraNames:
-            try:
-                myParser = NameParser()
-                parse_result = myParser.parse(curName)
-            except InvalidNameException:
+            if curName == name:
+                curClassification = classification
+            else:
+                curClassification = show_name_helpers.classifyRelease(curName)
+            if not curClassification.parse_result:
                 logger.log(u"Unable to parse the filename "+curName+" into a valid episode", logger.DEBUG)
                 continue
+            parse_result = curClassification.parse_result
 
         if not parse_result:
             logger.log(u"Giving up because I'm unable to parse this name: "+name, logger.DEBUG)
@@ -252,12 +318,12 @@ class TVCache():
                 # if the DB lookup fails then do a comprehensive regex search
                 if tvdb_id == None:
                     logger.log(u"Couldn't figure out a show name straight from the DB, trying a regex search instead", logger.DEBUG)
-                    for curShow in sickbeard.showList:
-                        if show_name_helpers.isGoodResult(name, curShow, False):
-                            logger.log(u"Successfully matched "+name+" to "+curShow.name+" with regex", logger.DEBUG)
-                            tvdb_id = curShow.tvdbid
-                            tvdb_lang = curShow.lang
-                            break
+                    matchedShows = show_name_helpers.showNameMatcher.findShows(name)
+                    if matchedShows:
+                        curShow = matchedShows[0]
+                        logger.log(u"Successfully matched "+name+" to "+curShow.name+" with regex", logger.DEBUG)
+                        tvdb_id = curShow.tvdbid
+                        tvdb_lang = curShow.lang
 
                 # if tvdb_id was anything but None (0 or a number) then 
                 if not from_cache:
@@ -283,15 +349,7 @@ class TVCache():
         # if we have an air-by-date show then get the real season/episode numbers
         if parse_result.air_by_date and tvdb_id:
             try:
-                # There's gotta be a better way of doing this but we don't wanna
-                # change the language value elsewhere
-                ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
-
-                if not (tvdb_lang == "" or tvdb_lang == "en" or tvdb_lang == None):
-                    ltvdb_api_parms['language'] = tvdb_lang
-
-                t = tvdb_api.Tvdb(**ltvdb_api_parms)
-                epObj = t[tvdb_id].airedOn(parse_result.air_date)[0]
+                epObj = tvdb_store.getShow(tvdb_id, tvdb_lang).airedOn(parse_result.air_date)[0]
                 season = int(epObj["seasonnumber"])
                 episodes = [int(epObj["episodenumber"])]
             except tvdb_exceptions.tvdb_episodenotfound:
@@ -307,10 +365,9 @@ class TVCache():
         curTimestamp = int(time.mktime(datetime.datetime.today().timetuple()))
 
         if not quality:
-            quality = Quality.nameQuality(name)
+            quality = classification.quality
 
-        myDB.action("INSERT INTO "+self.providerID+" (name, season, episodes, tvrid, tvdbid, url, time, quality) VALUES (?,?,?,?,?,?,?,?)",
-                    [name, season, episodeText, tvrage_id, tvdb_id, url, curTimestamp, quality])
+        return [name, season, episodeText, tvrage_id, tvdb_id, url, curTimestamp, quality]
 
 
     def searchCache(self, episode, manualSearch=False):
@@ -321,8 +378,9 @@ class TVCache():
 
         myDB = self._getDB()
 
-        sql = "SELECT * FROM "+self.providerID+" WHERE name LIKE '%.PROPER.%' OR name LIKE '%.REPACK.%'"
+        sql = "SELECT * FROM "+self.providerID+" WHERE (name LIKE '%.PROPER.%' OR name LIKE '%.REPACK.%')"
 
+        # the time index narrows this down before the names are matched
         if date != None:
             sql += " AND time >= "+str(int(time.mktime(date.timetuple())))
 
@@ -340,7 +398,9 @@ class TVCache():
         if not episode:
             sqlResults = myDB.select("SELECT * FROM "+self.providerID)
         else:
-            sqlResults = myDB.select("SELECT * FROM "+self.providerID+" WHERE tvdbid = ? AND season = ? AND episodes LIKE ?", [episode.show.tvdbid, episode.season, "%|"+str(episode.episode)+"|%"])
+            sqlResults = myDB.select("SELECT "+self.providerID+".* FROM cache_episodes JOIN "+self.providerID+" ON "+self.providerID+".url = cache_episodes.url"+
+                                     " WHERE cache_episodes.tvdbid = ? AND cache_episodes.season = ? AND cache_episodes.episode = ? AND cache_episodes.provider = ?",
+                                     [episode.show.tvdbid, episode.season, episode.episode, self.providerID])
 
         # for each cache entry
         for curResult in sqlResults:
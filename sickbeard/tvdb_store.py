@@ -0,0 +1,299 @@
+# Author: Nic Wolfe <nic@wolfeden.ca>
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+The TVDB info of the shows, kept in the tvdb_shows and tvdb_episodes tables of cache.db.
+
+Only the fields Sick Beard uses are stored, already parsed, so loading a show or an episode is a
+query instead of reading and parsing all of the show's XML again. Every row remembers when it was
+fetched and is used for MAX_AGE seconds, after that the show is fetched from TVDB again. Only one
+thread fetches a show at a time, the others wait for it and then use what it stored.
+
+The shows and episodes are handed out as tvdb_api Show, Season and Episode objects so they can be
+used (and raise the same exceptions) like the ones from a Tvdb instance. The most recently used shows
+are also kept in memory by showCache, those objects are shared so nobody may change them.
+"""
+
+from __future__ import with_statement
+
+import threading
+import time
+
+import sickbeard
+
+from sickbeard import db, logger
+from sickbeard.exceptions import ex
+
+from lib.tvdb_api import tvdb_api, tvdb_exceptions
+
+# the same as the max age of tvdb_api's cache
+MAX_AGE = 6 * 60 * 60
+
+SHOW_FIELDS = ('seriesname', 'genre', 'network', 'airs_dayofweek', 'airs_time', 'firstaired', 'status')
+EPISODE_FIELDS = ('id', 'episodename', 'overview', 'firstaired')
+
+# (tvdbid, lang) -> the lock held while the show is fetched
+_fetchLocks = {}
+_fetchLocksLock = threading.Lock()
+
+def _fetchLock(tvdbid, lang):
+    with _fetchLocksLock:
+        if (tvdbid, lang) not in _fetchLocks:
+            _fetchLocks[(tvdbid, lang)] = threading.Lock()
+        return _fetchLocks[(tvdbid, lang)]
+
+class ShowCache(object):
+    """
+    Keeps the most recently used shows in memory so looking one up again, like the air date of every
+    air-by-date result in an RSS feed, doesn't even have to read the store. A show is only used until
+    its stored rows are too old and once there are more than sickbeard.TVDB_SHOW_CACHE_SIZE shows the
+    least recently used ones are thrown out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shows = {} # (tvdbid, lang) -> [last used, fetched, show]
+        self._tick = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, tvdbid, lang, oldest):
+        """
+        Returns the show if it's here and was fetched after oldest, None otherwise.
+        """
+        with self._lock:
+            entry = self._shows.get((tvdbid, lang))
+            if entry is not None and entry[1] < oldest:
+                del self._shows[(tvdbid, lang)]
+                self.expired += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._tick += 1
+            entry[0] = self._tick
+            self.hits += 1
+            return entry[2]
+
+    def add(self, tvdbid, lang, fetched, tvdbShow):
+        maxSize = sickbeard.TVDB_SHOW_CACHE_SIZE
+        if maxSize <= 0:
+            return
+
+        with self._lock:
+            self._tick += 1
+            self._shows[(tvdbid, lang)] = [self._tick, fetched, tvdbShow]
+
+            if len(self._shows) > maxSize:
+                for curKey, curEntry in sorted(self._shows.items(), key=lambda x: x[1][0])[:len(self._shows) - maxSize]:
+                    del self._shows[curKey]
+                    self.evictions += 1
+
+    def forgetShow(self, tvdbid):
+        with self._lock:
+            for curKey in [x for x in self._shows if x[0] == tvdbid]:
+                del self._shows[curKey]
+
+    def clear(self):
+        with self._lock:
+            self._shows = {}
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._shows),
+                    'max_size': sickbeard.TVDB_SHOW_CACHE_SIZE,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'expired': self.expired,
+                    'evictions': self.evictions,
+                    'hit_ratio': round(float(self.hits) / lookups, 3) if lookups else 0.0,
+                    }
+
+showCache = ShowCache()
+
+def _lang(lang):
+    if lang:
+        return lang
+    return sickbeard.TVDB_API_PARMS.get('language', 'en')
+
+def _oldestFresh():
+    return int(time.time()) - MAX_AGE
+
+def _buildEpisode(season, episode, epRow, tvdbSeason=None):
+    tvdbEp = tvdb_api.Episode(season=tvdbSeason)
+    for curField in EPISODE_FIELDS:
+        tvdbEp[curField] = epRow[curField]
+    tvdbEp['seasonnumber'] = unicode(season)
+    tvdbEp['episodenumber'] = unicode(episode)
+    return tvdbEp
+
+def _buildShow(showRow, epRows):
+    tvdbShow = tvdb_api.Show()
+    for curField in SHOW_FIELDS:
+        tvdbShow.data[curField] = showRow[curField]
+
+    for curRow in epRows:
+        season = int(curRow["season"])
+        episode = int(curRow["episode"])
+        if season not in tvdbShow:
+            tvdbShow[season] = tvdb_api.Season(show=tvdbShow)
+        tvdbShow[season][episode] = _buildEpisode(season, episode, curRow, tvdbShow[season])
+
+    return tvdbShow
+
+def _loadShow(tvdbid, lang, oldest):
+    """
+    Returns the stored show if it was fetched after oldest, None otherwise. It's kept in memory
+    if it's fresh.
+    """
+
+    myDB = db.DBConnection("cache.db")
+    showResults = myDB.select("SELECT * FROM tvdb_shows WHERE tvdb_id = ? AND lang = ? AND fetched >= ?", [tvdbid, lang, oldest])
+    if not showResults:
+        return None
+
+    epResults = myDB.select("SELECT * FROM tvdb_episodes WHERE tvdb_id = ? AND lang = ?", [tvdbid, lang])
+    tvdbShow = _buildShow(showResults[0], epResults)
+
+    fetched = int(showResults[0]["fetched"])
+    if fetched >= _oldestFresh():
+        showCache.add(tvdbid, lang, fetched, tvdbShow)
+
+    return tvdbShow
+
+def _fetchShow(tvdbid, lang):
+    """
+    Gets the show from TVDB, bypassing tvdb_api's cache since this is the cache.
+    """
+
+    ltvdb_api_parms = sickbeard.TVDB_API_PARMS.copy()
+    ltvdb_api_parms['cache'] = False
+    ltvdb_api_parms['language'] = lang
+
+    t = tvdb_api.Tvdb(**ltvdb_api_parms)
+    return t[tvdbid]
+
+def _storeShow(tvdbid, lang, tvdbShow):
+    """
+    Replaces what's stored for the show with the show from tvdb_api and returns it as it was stored.
+    """
+
+    fetched = int(time.time())
+
+    showRow = dict([(x, tvdbShow.data.get(x)) for x in SHOW_FIELDS])
+    epRows = []
+    for season in tvdbShow:
+        for episode in tvdbShow[season]:
+            tvdbEp = tvdbShow[season][episode]
+            curRow = dict([(x, tvdbEp.get(x)) for x in EPISODE_FIELDS])
+            curRow['season'] = season
+            curRow['episode'] = episode
+            epRows.append(curRow)
+
+    myDB = db.DBConnection("cache.db")
+    myDB.mass_action([["INSERT OR REPLACE INTO tvdb_shows (tvdb_id, lang, " + ", ".join(SHOW_FIELDS) + ", fetched) VALUES (" + ",".join(["?"] * (len(SHOW_FIELDS) + 3)) + ")",
+                       [tvdbid, lang] + [showRow[x] for x in SHOW_FIELDS] + [fetched]],
+                      ["DELETE FROM tvdb_episodes WHERE tvdb_id = ? AND lang = ?", [tvdbid, lang]],
+                      ["INSERT INTO tvdb_episodes (tvdb_id, lang, season, episode, " + ", ".join(EPISODE_FIELDS) + ", fetched) VALUES (" + ",".join(["?"] * (len(EPISODE_FIELDS) + 5)) + ")",
+                       [[tvdbid, lang, x['season'], x['episode']] + [x[y] for y in EPISODE_FIELDS] + [fetched] for x in epRows], True]])
+
+    tvdbShow = _buildShow(showRow, epRows)
+    showCache.add(tvdbid, lang, fetched, tvdbShow)
+    return tvdbShow
+
+def getShow(tvdbid, lang=None, cache=True):
+    """
+    Returns the show as a tvdb_api Show, from the store if it's there and fresh and from TVDB otherwise.
+
+    lang: the show's language, TVDB_API_PARMS' if it's empty
+    cache: False to get the show from TVDB no matter what's stored
+
+    Raises the tvdb_exceptions a Tvdb instance would. If TVDB can't be reached a show that's stored
+    but not fresh anymore is returned instead.
+    """
+
+    lang = _lang(lang)
+
+    if cache:
+        tvdbShow = showCache.get(tvdbid, lang, _oldestFresh())
+        if tvdbShow is None:
+            tvdbShow = _loadShow(tvdbid, lang, _oldestFresh())
+        if tvdbShow is not None:
+            return tvdbShow
+
+    with _fetchLock(tvdbid, lang):
+
+        # another thread might have fetched it while we were waiting
+        if cache:
+            tvdbShow = _loadShow(tvdbid, lang, _oldestFresh())
+            if tvdbShow is not None:
+                return tvdbShow
+
+        try:
+            tvdbShow = _fetchShow(tvdbid, lang)
+        except tvdb_exceptions.tvdb_error, e:
+            staleShow = None
+            if cache:
+                staleShow = _loadShow(tvdbid, lang, 0)
+            if staleShow is None:
+                raise e
+            logger.log(str(tvdbid) + u": Unable to get the show from TVDB, using the info from " + str(MAX_AGE / 3600) + " or more hours ago: " + ex(e), logger.WARNING)
+            return staleShow
+
+        return _storeShow(tvdbid, lang, tvdbShow)
+
+def getEpisode(tvdbid, lang, season, episode, cache=True):
+    """
+    Returns one episode of a show as a tvdb_api Episode. If the show is in memory it comes from there,
+    if it's stored and fresh only the episode is read, otherwise it's the same as
+    getShow(tvdbid, lang, cache)[season][episode].
+    """
+
+    if cache:
+        lang = _lang(lang)
+        oldest = _oldestFresh()
+
+        tvdbShow = showCache.get(tvdbid, lang, oldest)
+        if tvdbShow is not None:
+            return tvdbShow[season][episode]
+
+        myDB = db.DBConnection("cache.db")
+        epResults = myDB.select("SELECT * FROM tvdb_episodes WHERE tvdb_id = ? AND lang = ? AND season = ? AND episode = ? AND fetched >= ?",
+                                [tvdbid, lang, season, episode, oldest])
+        if epResults:
+            return _buildEpisode(season, episode, epResults[0])
+
+        # a fresh show without the episode means TVDB doesn't have it
+        if myDB.select("SELECT fetched FROM tvdb_shows WHERE tvdb_id = ? AND lang = ? AND fetched >= ?", [tvdbid, lang, oldest]):
+            if not myDB.select("SELECT episode FROM tvdb_episodes WHERE tvdb_id = ? AND lang = ? AND season = ? LIMIT 1", [tvdbid, lang, season]):
+                raise tvdb_exceptions.tvdb_seasonnotfound("Could not find season %s" % (repr(season)))
+            raise tvdb_exceptions.tvdb_episodenotfound("Could not find episode %s" % (repr(episode)))
+
+    return getShow(tvdbid, lang, cache)[season][episode]
+
+def forgetShow(tvdbid):
+    showCache.forgetShow(tvdbid)
+    myDB = db.DBConnection("cache.db")
+    myDB.mass_action([["DELETE FROM tvdb_shows WHERE tvdb_id = ?", [tvdbid]],
+                      ["DELETE FROM tvdb_episodes WHERE tvdb_id = ?", [tvdbid]]])
@@ -27,7 +27,7 @@ import sickbeard
 from sickbeard import logger
 from sickbeard.common import UNAIRED
 
-from sickbeard import db
+from sickbeard import db, show_stats, coming_episodes
 from sickbeard import exceptions, helpers
 from sickbeard.exceptions import ex
 
@@ -329,6 +329,8 @@ class TVRage:
         # insert it
         myDB.action("INSERT INTO tv_episodes (showid, tvdbid, name, season, episode, description, airdate, hasnfo, hastbn, status, location) VALUES (?,?,?,?,?,?,?,?,?,?,?)", \
                     [self.show.tvdbid, -1, self.nextEpInfo['name'], self.nextEpInfo['season'], self.nextEpInfo['episode'], '', self.nextEpInfo['airdate'].toordinal(), 0, 0, UNAIRED, ''])
+        show_stats.recountShow(self.show.tvdbid)
+        coming_episodes.invalidate()
 
         # once it's in the DB make an object and return it
         ep = None
@@ -30,13 +30,15 @@ import traceback
 import cherrypy
 import sickbeard
 import webserve
-from sickbeard import db, logger, exceptions, history, ui, helpers
+from sickbeard import db, logger, exceptions, history, ui, helpers, http_client, scheduler, show_stats, coming_episodes, tvdb_store
 from sickbeard.exceptions import ex
 from sickbeard import encodingKludge as ek
-from sickbeard import search_queue
+from sickbeard import search_queue, search
 from sickbeard.common import SNATCHED, SNATCHED_PROPER, DOWNLOADED, SKIPPED, UNAIRED, IGNORED, ARCHIVED, WANTED, UNKNOWN
 from common import Quality, qualityPresetStrings, statusStrings
 from sickbeard import image_cache
+from sickbeard.name_parser.parser import name_parser_cache
+from sickbeard.tv import episodeCache, EpisodeSaveSession
 from lib.tvdb_api import tvdb_api, tvdb_exceptions
 try:
     import json
@@ -149,7 +151,6 @@ class Api:
         t.seasonSQLResults = seasonSQLResults
         t.episodeSQLResults = episodeSQLResults
 
-        myDB.connection.close()
         if len(sickbeard.API_KEY) == 32:
             t.apikey = sickbeard.API_KEY
         else:
@@ -704,39 +705,14 @@ class CMD_ComingEpisodes(ApiCall):
 
     def run(self):
         """ display the coming episodes """
-        today = datetime.date.today().toordinal()
-        next_week = (datetime.date.today() + datetime.timedelta(days=7)).toordinal()
-        recently = (datetime.date.today() - datetime.timedelta(days=3)).toordinal()
-
-        done_show_list = []
-        qualList = Quality.DOWNLOADED + Quality.SNATCHED + [ARCHIVED, IGNORED]
-
-        myDB = db.DBConnection(row_type="dict")
-        sql_results = myDB.select("SELECT airdate, airs, episode, name AS 'ep_name', description AS 'ep_plot', network, season, showid AS 'tvdbid', show_name, tv_shows.quality AS quality, tv_shows.status AS 'show_status', tv_shows.paused AS 'paused' FROM tv_episodes, tv_shows WHERE season != 0 AND airdate >= ? AND airdate < ? AND tv_shows.tvdb_id = tv_episodes.showid AND tv_episodes.status NOT IN (" + ','.join(['?'] * len(qualList)) + ")", [today, next_week] + qualList)
-        for cur_result in sql_results:
-            done_show_list.append(int(cur_result["tvdbid"]))
-
-        more_sql_results = myDB.select("SELECT airdate, airs, episode, name AS 'ep_name', description AS 'ep_plot', network, season, showid AS 'tvdbid', show_name, tv_shows.quality AS quality, tv_shows.status AS 'show_status', tv_shows.paused AS 'paused' FROM tv_episodes outer_eps, tv_shows WHERE season != 0 AND showid NOT IN (" + ','.join(['?'] * len(done_show_list)) + ") AND tv_shows.tvdb_id = outer_eps.showid AND airdate = (SELECT airdate FROM tv_episodes inner_eps WHERE inner_eps.showid = outer_eps.showid AND inner_eps.airdate >= ? ORDER BY inner_eps.airdate ASC LIMIT 1) AND outer_eps.status NOT IN (" + ','.join(['?'] * len(Quality.DOWNLOADED + Quality.SNATCHED)) + ")", done_show_list + [next_week] + Quality.DOWNLOADED + Quality.SNATCHED)
-        sql_results += more_sql_results
-
-        more_sql_results = myDB.select("SELECT airdate, airs, episode, name AS 'ep_name', description AS 'ep_plot', network, season, showid AS 'tvdbid', show_name, tv_shows.quality AS quality, tv_shows.status AS 'show_status', tv_shows.paused AS 'paused' FROM tv_episodes, tv_shows WHERE season != 0 AND tv_shows.tvdb_id = tv_episodes.showid AND airdate < ? AND airdate >= ? AND tv_episodes.status = ? AND tv_episodes.status NOT IN (" + ','.join(['?'] * len(qualList)) + ")", [today, recently, WANTED] + qualList)
-        sql_results += more_sql_results
-
-        # sort by air date
-        sorts = {
-            'date': (lambda x, y: cmp(int(x["airdate"]), int(y["airdate"]))),
-            'show': (lambda a, b: cmp(a["show_name"], b["show_name"])),
-            'network': (lambda a, b: cmp(a["network"], b["network"])),
-        }
-
-        sql_results.sort(sorts[self.sort])
+        coming = coming_episodes.getComingEpisodes()
         finalEpResults = {}
 
         # add all requested types or all
         for curType in self.type:
             finalEpResults[curType] = []
 
-        for ep in sql_results:
+        for curEp in coming.sortedEpisodes(self.sort):
             """
                 Missed:   yesterday... (less than 1week)
                 Today:    today
@@ -744,29 +720,29 @@ class CMD_ComingEpisodes(ApiCall):
                 Later:    later than next week
             """
 
-            if ep["paused"] and not self.paused:
+            if curEp["paused"] and not self.paused:
                 continue
 
-            status = "soon"
-            if ep["airdate"] < today:
-                status = "missed"
-            elif ep["airdate"] >= next_week:
-                status = "later"
-            elif ep["airdate"] >= today and ep["airdate"] < next_week:
-                if ep["airdate"] == today:
-                    status = "today"
-                else:
-                    status = "soon"
+            status = coming.airType(curEp)
 
             # skip unwanted
             if self.type != None and not status in self.type:
                 continue
 
-            ordinalAirdate = int(ep["airdate"])
-            if not ep["network"]:
-                ep["network"] = ""
-            ep["airdate"] = _ordinal_to_dateForm(ordinalAirdate)
-            ep["quality"] = _get_quality_string(ep["quality"])
+            # the coming episodes are shared so the answer gets its own dict
+            ordinalAirdate = curEp["airdate"]
+            ep = {"airdate": _ordinal_to_dateForm(ordinalAirdate),
+                  "airs": curEp["airs"],
+                  "episode": curEp["episode"],
+                  "ep_name": curEp["name"],
+                  "ep_plot": curEp["description"],
+                  "network": curEp["network"] or "",
+                  "season": curEp["season"],
+                  "tvdbid": curEp["showid"],
+                  "show_name": curEp["show_name"],
+                  "quality": _get_quality_string(curEp["quality"]),
+                  "show_status": curEp["show_status"],
+                  "paused": curEp["paused"]}
             # clean up tvdb horrible airs field
             ep["airs"] = str(ep["airs"]).replace('am', ' AM').replace('pm', ' PM').replace('  ', ' ')
             # start day of the week on 1 (monday)
@@ -777,7 +753,6 @@ class CMD_ComingEpisodes(ApiCall):
                 finalEpResults[status] = []
 
             finalEpResults[status].append(ep)
-        myDB.connection.close()
         return _responds(RESULT_SUCCESS, finalEpResults)
 
 
@@ -835,7 +810,6 @@ class CMD_Episode(ApiCall):
         episode["quality"] = _get_quality_string(quality)
         episode["file_size_human"] = _sizeof_fmt(episode["file_size"])
 
-        myDB.connection.close()
         return _responds(RESULT_SUCCESS, episode)
 
 
@@ -938,34 +912,35 @@ class CMD_EpisodeSetStatus(ApiCall):
         failure = False
         start_backlog = False
         ep_segment = None
-        for epObj in ep_list:
-            if ep_segment == None and self.status == WANTED:
-                # figure out what segment the episode is in and remember it so we can backlog it
-                if showObj.air_by_date:
-                    ep_segment = str(epObj.airdate)[:7]
-                else:
-                    ep_segment = epObj.season
-
-            with epObj.lock:
-                # don't let them mess up UNAIRED episodes
-                if epObj.status == UNAIRED:
-                    if self.e != None: # setting the status of a unaired is only considert a failure if we directly wanted this episode, but is ignored on a season request
-                        ep_results.append(_epResult(RESULT_FAILURE, epObj, "Refusing to change status because it is UNAIRED"))
+        with EpisodeSaveSession():
+            for epObj in ep_list:
+                if ep_segment == None and self.status == WANTED:
+                    # figure out what segment the episode is in and remember it so we can backlog it
+                    if showObj.air_by_date:
+                        ep_segment = str(epObj.airdate)[:7]
+                    else:
+                        ep_segment = epObj.season
+
+                with epObj.lock:
+                    # don't let them mess up UNAIRED episodes
+                    if epObj.status == UNAIRED:
+                        if self.e != None: # setting the status of a unaired is only considert a failure if we directly wanted this episode, but is ignored on a season request
+                            ep_results.append(_epResult(RESULT_FAILURE, epObj, "Refusing to change status because it is UNAIRED"))
+                            failure = True
+                        continue
+
+                    # allow the user to force setting the status for an already downloaded episode
+                    if epObj.status in Quality.DOWNLOADED and not self.force:
+                        ep_results.append(_epResult(RESULT_FAILURE, epObj, "Refusing to change status because it is already marked as DOWNLOADED"))
                         failure = True
-                    continue
-
-                # allow the user to force setting the status for an already downloaded episode
-                if epObj.status in Quality.DOWNLOADED and not self.force:
-                    ep_results.append(_epResult(RESULT_FAILURE, epObj, "Refusing to change status because it is already marked as DOWNLOADED"))
-                    failure = True
-                    continue
+                        continue
 
-                epObj.status = self.status
-                epObj.saveToDB()
+                    epObj.status = self.status
+                    epObj.saveToDB()
 
-                if self.status == WANTED:
-                    start_backlog = True
-                ep_results.append(_epResult(RESULT_SUCCESS, epObj))
+                    if self.status == WANTED:
+                        start_backlog = True
+                    ep_results.append(_epResult(RESULT_SUCCESS, epObj))
 
         extra_msg = ""
         if start_backlog:
@@ -1016,7 +991,6 @@ class CMD_Exceptions(ApiCall):
             for row in sqlResults:
                 scene_exceptions.append(row["show_name"])
 
-        myDB.connection.close()
         return _responds(RESULT_SUCCESS, scene_exceptions)
 
 
@@ -1024,6 +998,7 @@ class CMD_History(ApiCall):
     _help = {"desc": "display sickbeard downloaded/snatched history",
              "optionalParameters": {"limit": {"desc": "limit returned results"},
                                     "type": {"desc": "only show a specific type of results"},
+                                    "before": {"desc": "only show the results older than the one with this history_id, for the next page"},
                                    }
              }
 
@@ -1032,6 +1007,7 @@ class CMD_History(ApiCall):
         # optional
         self.limit, args = self.check_params(args, kwargs, "limit", 100, False, "int", [])
         self.type, args = self.check_params(args, kwargs, "type", None, False, "string", ["downloaded", "snatched"])
+        self.before, args = self.check_params(args, kwargs, "before", None, False, "int", [])
         # super, missing, help
         ApiCall.__init__(self, args, kwargs)
 
@@ -1048,13 +1024,8 @@ class CMD_History(ApiCall):
         else:
             typeCodes = Quality.SNATCHED + Quality.DOWNLOADED
 
-        myDB = db.DBConnection(row_type="dict")
-
         ulimit = min(int(self.limit), 100)
-        if ulimit == 0:
-            sqlResults = myDB.select("SELECT h.*, show_name FROM history h, tv_shows s WHERE h.showid=s.tvdb_id AND action in (" + ','.join(['?'] * len(typeCodes)) + ") ORDER BY date DESC", typeCodes)
-        else:
-            sqlResults = myDB.select("SELECT h.*, show_name FROM history h, tv_shows s WHERE h.showid=s.tvdb_id AND action in (" + ','.join(['?'] * len(typeCodes)) + ") ORDER BY date DESC LIMIT ?", typeCodes + [ulimit])
+        sqlResults = history.getHistory(ulimit, self.before, typeCodes)[0]
 
         results = []
         for row in sqlResults:
@@ -1071,7 +1042,6 @@ class CMD_History(ApiCall):
             row["resource"] = os.path.basename(row["resource"])
             results.append(row)
 
-        myDB.connection.close()
         return _responds(RESULT_SUCCESS, results)
 
 
@@ -1090,7 +1060,6 @@ class CMD_HistoryClear(ApiCall):
         myDB = db.DBConnection()
         myDB.action("DELETE FROM history WHERE 1=1")
 
-        myDB.connection.close()
         return _responds(RESULT_SUCCESS, msg="History cleared")
 
 
@@ -1109,7 +1078,6 @@ class CMD_HistoryTrim(ApiCall):
         myDB = db.DBConnection()
         myDB.action("DELETE FROM history WHERE date < " + str((datetime.datetime.today() - datetime.timedelta(days=30)).strftime(history.dateFormat)))
 
-        myDB.connection.close()
         return _responds(RESULT_SUCCESS, msg="Removed history entries greater than 30 days old")
 
 
@@ -1266,8 +1234,17 @@ class CMD_SickBeardCheckScheduler(ApiCall):
         nextSearch = str(sickbeard.currentSearchScheduler.timeLeft()).split('.')[0]
         nextBacklog = sickbeard.backlogSearchScheduler.nextRun().strftime(dateFormat).decode(sickbeard.SYS_ENCODING)
 
-        myDB.connection.close()
-        data = {"backlog_is_paused": int(backlogPaused), "backlog_is_running": int(backlogRunning), "last_backlog": _ordinal_to_dateForm(sqlResults[0]["last_backlog"]), "search_is_running": int(searchStatus), "next_search": nextSearch, "next_backlog": nextBacklog}
+        # when each scheduled job runs next (in seconds) and how long it took last time
+        jobs = {}
+        now = datetime.datetime.now()
+        for jobName, jobStats in scheduler.schedulerLoop.stats().items():
+            nextRun = max(jobStats["next_run"] - now, datetime.timedelta(0))
+            lastDuration = jobStats["last_duration"]
+            if lastDuration != None:
+                lastDuration = round(lastDuration, 3)
+            jobs[jobName] = {"next_run": nextRun.days * 86400 + nextRun.seconds, "last_duration": lastDuration, "runs": jobStats["runs"], "is_running": int(jobStats["running"])}
+
+        data = {"backlog_is_paused": int(backlogPaused), "backlog_is_running": int(backlogRunning), "last_backlog": _ordinal_to_dateForm(sqlResults[0]["last_backlog"]), "search_is_running": int(searchStatus), "next_search": nextSearch, "next_backlog": nextBacklog, "jobs": jobs}
         return _responds(RESULT_SUCCESS, data)
 
 
@@ -1337,6 +1314,95 @@ class CMD_SickBeardForceSearch(ApiCall):
         return _responds(RESULT_FAILURE, msg="Can not search for episode")
 
 
+class CMD_SickBeardGetDbStats(ApiCall):
+    _help = {"desc": "get database connection pool and lock statistics"}
+
+    def __init__(self, args, kwargs):
+        # required
+        # optional
+        # super, missing, help
+        ApiCall.__init__(self, args, kwargs)
+
+    def run(self):
+        """ get database connection pool and lock statistics """
+        data = db.connectionPool.stats()
+        data["locks"] = db.dbLocks.stats()
+        return _responds(RESULT_SUCCESS, data)
+
+
+class CMD_SickBeardGetCacheStats(ApiCall):
+    _help = {"desc": "get name parser, episode and tvdb show cache statistics"}
+
+    def __init__(self, args, kwargs):
+        # required
+        # optional
+        # super, missing, help
+        ApiCall.__init__(self, args, kwargs)
+
+    def run(self):
+        """ get name parser, episode and tvdb show cache statistics """
+        return _responds(RESULT_SUCCESS, {"name_parser": name_parser_cache.stats(), "episodes": episodeCache.stats(),
+                                          "tvdb_shows": tvdb_store.showCache.stats()})
+
+
+class CMD_SickBeardGetSearchStats(ApiCall):
+    _help = {"desc": "get the timing of the most recent search of each provider"}
+
+    def __init__(self, args, kwargs):
+        # required
+        # optional
+        # super, missing, help
+        ApiCall.__init__(self, args, kwargs)
+
+    def run(self):
+        """ get the timing of the most recent search of each provider """
+        return _responds(RESULT_SUCCESS, search.getProviderSearchStats())
+
+
+class CMD_SickBeardBacklogPlan(ApiCall):
+    _help = {"desc": "get what the next backlog search would search for, without searching"}
+
+    def __init__(self, args, kwargs):
+        # required
+        # optional
+        # super, missing, help
+        ApiCall.__init__(self, args, kwargs)
+
+    def run(self):
+        """ get what the next backlog search would search for, without searching """
+        plan = sickbeard.backlogSearchScheduler.action.searchBacklog(dryRun=True) #@UndefinedVariable
+        return _responds(RESULT_SUCCESS, plan.summary())
+
+
+class CMD_SickBeardCheckStats(ApiCall):
+    _help = {"desc": "count the episodes of every show again and fix the show stats that are wrong"}
+
+    def __init__(self, args, kwargs):
+        # required
+        # optional
+        # super, missing, help
+        ApiCall.__init__(self, args, kwargs)
+
+    def run(self):
+        """ count the episodes of every show again and fix the show stats that are wrong """
+        wrongShows = show_stats.checkStats()
+        return _responds(RESULT_SUCCESS, {"fixed": wrongShows}, msg=str(len(wrongShows)) + " shows had wrong stats")
+
+
+class CMD_SickBeardGetHTTPStats(ApiCall):
+    _help = {"desc": "get http connection pool statistics"}
+
+    def __init__(self, args, kwargs):
+        # required
+        # optional
+        # super, missing, help
+        ApiCall.__init__(self, args, kwargs)
+
+    def run(self):
+        """ get http connection pool statistics """
+        return _responds(RESULT_SUCCESS, http_client.httpClient.stats())
+
+
 class CMD_SickBeardGetDefaults(ApiCall):
     _help = {"desc": "get sickbeard user defaults"}
 
@@ -2022,6 +2088,8 @@ class CMD_ShowPause(ApiCall):
 class CMD_ShowRefresh(ApiCall):
     _help = {"desc": "refresh a show in sickbeard",
              "requiredParameters": {"tvdbid": {"desc": "thetvdb.com unique id of a show"},
+                                  },
+             "optionalParameters": {"full": {"desc": "look at every file again, not just the ones that changed since the last refresh"}
                                   }
              }
 
@@ -2029,6 +2097,7 @@ class CMD_ShowRefresh(ApiCall):
         # required
         self.tvdbid, args = self.check_params(args, kwargs, "tvdbid", None, True, "int", [])
         # optional
+        self.full, args = self.check_params(args, kwargs, "full", 0, False, "bool", [])
         # super, missing, help
         ApiCall.__init__(self, args, kwargs)
 
@@ -2039,7 +2108,7 @@ class CMD_ShowRefresh(ApiCall):
             return _responds(RESULT_FAILURE, msg="Show not found")
 
         try:
-            sickbeard.showQueueScheduler.action.refreshShow(showObj) #@UndefinedVariable
+            sickbeard.showQueueScheduler.action.refreshShow(showObj, fullScan=bool(self.full)) #@UndefinedVariable
             return _responds(RESULT_SUCCESS, msg=str(showObj.name) + " has queued to be refreshed")
         except exceptions.CantRefreshException:
             # TODO: log the excption
@@ -2077,7 +2146,6 @@ class CMD_ShowSeasonList(ApiCall):
         for row in sqlResults:
             seasonList.append(int(row["season"]))
 
-        myDB.connection.close()
         return _responds(RESULT_SUCCESS, seasonList)
 
 
@@ -2137,7 +2205,6 @@ class CMD_ShowSeasons(ApiCall):
                     seasons[curEpisode] = {}
                 seasons[curEpisode] = row
 
-        myDB.connection.close()
         return _responds(RESULT_SUCCESS, seasons)
 
 
@@ -2244,24 +2311,23 @@ class CMD_ShowStats(ApiCall):
                 continue
             episode_qualities_counts_snatch[statusCode] = 0
 
-        myDB = db.DBConnection(row_type="dict")
-        sqlResults = myDB.select("SELECT status, season FROM tv_episodes WHERE showid = ?", [self.tvdbid])
-        # the main loop that goes through all episodes
-        for row in sqlResults:
-            status, quality = Quality.splitCompositeStatus(int(row["status"]))
+        statusCounts = show_stats.getStatusCounts([showObj])[showObj.tvdbid]
+        # the main loop that goes through all the statuses the episodes have
+        for statusCode, count in statusCounts.items():
+            status, quality = Quality.splitCompositeStatus(statusCode)
 
-            episode_status_counts_total["total"] += 1
+            episode_status_counts_total["total"] += count
 
             if status in Quality.DOWNLOADED:
-                episode_qualities_counts_download["total"] += 1
-                episode_qualities_counts_download[int(row["status"])] += 1
+                episode_qualities_counts_download["total"] += count
+                episode_qualities_counts_download[statusCode] += count
             elif status in Quality.SNATCHED + Quality.SNATCHED_PROPER:
-                episode_qualities_counts_snatch["total"] += 1
-                episode_qualities_counts_snatch[int(row["status"])] += 1
+                episode_qualities_counts_snatch["total"] += count
+                episode_qualities_counts_snatch[statusCode] += count
             elif status == 0: # we dont count NONE = 0 = N/A
                 pass
             else:
-                episode_status_counts_total[status] += 1
+                episode_status_counts_total[status] += count
 
         # the outgoing container
         episodes_stats = {}
@@ -2298,7 +2364,6 @@ class CMD_ShowStats(ApiCall):
             statusString = statusStrings.statusStrings[statusCode].lower().replace(" ", "_").replace("(", "").replace(")", "")
             episodes_stats[statusString] = episode_status_counts_total[statusCode]
 
-        myDB.connection.close()
         return _responds(RESULT_SUCCESS, episodes_stats)
 
 
@@ -2347,11 +2412,11 @@ class CMD_Shows(ApiCall):
     def run(self):
         """ display_is_int_multi( self.tvdbid )shows in sickbeard """
         shows = {}
+        showStats = show_stats.getShowStats(sickbeard.showList)
         for curShow in sickbeard.showList:
             nextAirdate = ''
-            nextEps = curShow.nextEpisode()
-            if (len(nextEps) != 0):
-                nextAirdate = _ordinal_to_dateForm(nextEps[0].airdate.toordinal())
+            if showStats[curShow.tvdbid]["next_airdate"]:
+                nextAirdate = _ordinal_to_dateForm(showStats[curShow.tvdbid]["next_airdate"])
 
             if self.paused != None and bool(self.paused) != bool(curShow.paused):
                 continue
@@ -2391,14 +2456,12 @@ class CMD_ShowsStats(ApiCall):
         """ display the global shows and episode stats """
         stats = {}
 
-        myDB = db.DBConnection()
-        today = str(datetime.date.today().toordinal())
+        showStats = show_stats.getShowStats(sickbeard.showList).values()
         stats["shows_total"] = len(sickbeard.showList)
         stats["shows_active"] = len([show for show in sickbeard.showList if show.paused == 0 and show.status != "Ended"])
-        stats["ep_downloaded"] = myDB.select("SELECT COUNT(*) FROM tv_episodes WHERE status IN (" + ",".join([str(show) for show in Quality.DOWNLOADED + [ARCHIVED]]) + ") AND season != 0 and episode != 0 AND airdate <= " + today + "")[0][0]
-        stats["ep_total"] = myDB.select("SELECT COUNT(*) FROM tv_episodes WHERE season != 0 and episode != 0 AND (airdate != 1 OR status IN (" + ",".join([str(show) for show in (Quality.DOWNLOADED + Quality.SNATCHED + Quality.SNATCHED_PROPER) + [ARCHIVED]]) + ")) AND airdate <= " + today + " AND status != " + str(IGNORED) + "")[0][0]
+        stats["ep_downloaded"] = sum([x["downloaded"] for x in showStats])
+        stats["ep_total"] = sum([x["total"] for x in showStats])
 
-        myDB.connection.close()
         return _responds(RESULT_SUCCESS, stats)
 
 # WARNING: never define a cmd call string that contains a "_" (underscore)
@@ -2418,9 +2481,15 @@ _functionMaper = {"help": CMD_Help,
                   "logs": CMD_Logs,
                   "sb": CMD_SickBeard,
                   "sb.addrootdir": CMD_SickBeardAddRootDir,
+                  "sb.backlogplan": CMD_SickBeardBacklogPlan,
                   "sb.checkscheduler": CMD_SickBeardCheckScheduler,
+                  "sb.checkstats": CMD_SickBeardCheckStats,
                   "sb.deleterootdir": CMD_SickBeardDeleteRootDir,
                   "sb.forcesearch": CMD_SickBeardForceSearch,
+                  "sb.getdbstats": CMD_SickBeardGetDbStats,
+                  "sb.getcachestats": CMD_SickBeardGetCacheStats,
+                  "sb.getsearchstats": CMD_SickBeardGetSearchStats,
+                  "sb.gethttpstats": CMD_SickBeardGetHTTPStats,
                   "sb.getdefaults": CMD_SickBeardGetDefaults,
                   "sb.getmessages": CMD_SickBeardGetMessages,
                   "sb.getrootdirs": CMD_SickBeardGetRootDirs,
@@ -40,10 +40,13 @@ from sickbeard import encodingKludge as ek
 from sickbeard import search_queue
 from sickbeard import image_cache
 from sickbeard import naming
+from sickbeard import show_stats
+from sickbeard import coming_episodes
 
 from sickbeard.providers import newznab
 from sickbeard.common import Quality, Overview, statusStrings
 from sickbeard.common import SNATCHED, SKIPPED, UNAIRED, IGNORED, ARCHIVED, WANTED
+from sickbeard.tv import EpisodeSaveSession
 from sickbeard.exceptions import ex
 from sickbeard.webapi import Api
 
@@ -329,6 +332,8 @@ class Manage:
         showCats = {}
         showSQLResults = {}
 
+        statusCounts = show_stats.getStatusCounts(sickbeard.showList)
+
         for curShow in sickbeard.showList:
 
             epCounts = {}
@@ -340,13 +345,21 @@ class Manage:
             epCounts[Overview.UNAIRED] = 0
             epCounts[Overview.SNATCHED] = 0
 
-            sqlResults = myDB.select("SELECT * FROM tv_episodes WHERE showid = ? ORDER BY season DESC, episode DESC", [curShow.tvdbid])
+            # only the wanted and low quality episodes are listed so only those have to be read
+            backlogStatuses = []
+            for curStatus, curCount in statusCounts[curShow.tvdbid].items():
+                curEpCat = curShow.getOverview(curStatus)
+                epCounts[curEpCat] += curCount
+                if curEpCat in (Overview.WANTED, Overview.QUAL):
+                    backlogStatuses.append(curStatus)
 
-            for curResult in sqlResults:
+            sqlResults = []
+            if backlogStatuses:
+                sqlResults = myDB.select("SELECT * FROM tv_episodes WHERE showid = ? AND status IN (" + ",".join(["?"] * len(backlogStatuses)) + ") ORDER BY season DESC, episode DESC",
+                                         [curShow.tvdbid] + backlogStatuses)
 
-                curEpCat = curShow.getOverview(int(curResult["status"]))
-                epCats[str(curResult["season"]) + "x" + str(curResult["episode"])] = curEpCat
-                epCounts[curEpCat] += 1
+            for curResult in sqlResults:
+                epCats[str(curResult["season"]) + "x" + str(curResult["episode"])] = curShow.getOverview(int(curResult["status"]))
 
             showCounts[curShow.tvdbid] = epCounts
             showCats[curShow.tvdbid] = epCats
@@ -573,19 +586,23 @@ class Manage:
 class History:
 
     @cherrypy.expose
-    def index(self, limit=100):
+    def index(self, limit="100", before=None):
 
-        myDB = db.DBConnection()
+        try:
+            intLimit = int(limit)
+            if before != None:
+                before = int(before)
+        except ValueError:
+            intLimit = 100
+            before = None
 
-#        sqlResults = myDB.select("SELECT h.*, show_name, name FROM history h, tv_shows s, tv_episodes e WHERE h.showid=s.tvdb_id AND h.showid=e.showid AND h.season=e.season AND h.episode=e.episode ORDER BY date DESC LIMIT "+str(numPerPage*(p-1))+", "+str(numPerPage))
-        if limit == "0":
-            sqlResults = myDB.select("SELECT h.*, show_name FROM history h, tv_shows s WHERE h.showid=s.tvdb_id ORDER BY date DESC")
-        else:
-            sqlResults = myDB.select("SELECT h.*, show_name FROM history h, tv_shows s WHERE h.showid=s.tvdb_id ORDER BY date DESC LIMIT ?", [limit])
+        sqlResults, nextPage = history.getHistory(intLimit, before)
 
         t = PageTemplate(file="history.tmpl")
         t.historyResults = sqlResults
-        t.limit = limit
+        t.limit = str(intLimit)
+        t.before = before
+        t.nextPage = nextPage
         t.submenu = [
             { 'title': 'Clear History', 'path': 'history/clearHistory' },
             { 'title': 'Trim History',  'path': 'history/trimHistory'  },
@@ -1508,13 +1525,16 @@ class HomePostProcess:
         if not dir:
             redirect("/home/postprocess")
         else:
-            result = processTV.processDir(dir, nzbName)
+            # scripts get the log as it's written so they don't sit there waiting for all of it
             if quiet != None and int(quiet) == 1:
-                return result
+                return processTV.streamDir(dir, nzbName)
 
+            result = processTV.processDir(dir, nzbName)
             result = result.replace("\n","<br />\n")
             return _genericMessage("Postprocessing results", result)
 
+    processEpisode._cp_config = {'response.stream': True}
+
 
 class NewHomeAddShows:
 
@@ -2469,9 +2489,9 @@ class Home:
         if showObj == None:
             return _genericMessage("Error", "Unable to find the specified show")
 
-        # force the update from the DB
+        # force the update from the DB, asking for it by hand means every file is looked at again
         try:
-            sickbeard.showQueueScheduler.action.refreshShow(showObj) #@UndefinedVariable
+            sickbeard.showQueueScheduler.action.refreshShow(showObj, fullScan=True) #@UndefinedVariable
         except exceptions.CantRefreshException, e:
             ui.notifications.error("Unable to refresh this show.",
                         ex(e))
@@ -2558,39 +2578,40 @@ class Home:
 
         if eps != None:
 
-            for curEp in eps.split('|'):
+            with EpisodeSaveSession():
+                for curEp in eps.split('|'):
 
-                logger.log(u"Attempting to set status on episode "+curEp+" to "+status, logger.DEBUG)
+                    logger.log(u"Attempting to set status on episode "+curEp+" to "+status, logger.DEBUG)
 
-                epInfo = curEp.split('x')
+                    epInfo = curEp.split('x')
 
-                epObj = showObj.getEpisode(int(epInfo[0]), int(epInfo[1]))
+                    epObj = showObj.getEpisode(int(epInfo[0]), int(epInfo[1]))
 
-                if int(status) == WANTED:
-                    # figure out what segment the episode is in and remember it so we can backlog it
-                    if epObj.show.air_by_date:
-                        ep_segment = str(epObj.airdate)[:7]
-                    else:
-                        ep_segment = epObj.season
+                    if int(status) == WANTED:
+                        # figure out what segment the episode is in and remember it so we can backlog it
+                        if epObj.show.air_by_date:
+                            ep_segment = str(epObj.airdate)[:7]
+                        else:
+                            ep_segment = epObj.season
 
-                    if ep_segment not in segment_list:
-                        segment_list.append(ep_segment)
+                        if ep_segment not in segment_list:
+                            segment_list.append(ep_segment)
 
-                if epObj == None:
-                    return _genericMessage("Error", "Episode couldn't be retrieved")
+                    if epObj == None:
+                        return _genericMessage("Error", "Episode couldn't be retrieved")
 
-                with epObj.lock:
-                    # don't let them mess up UNAIRED episodes
-                    if epObj.status == UNAIRED:
-                        logger.log(u"Refusing to change status of "+curEp+" because it is UNAIRED", logger.ERROR)
-                        continue
+                    with epObj.lock:
+                        # don't let them mess up UNAIRED episodes
+                        if epObj.status == UNAIRED:
+                            logger.log(u"Refusing to change status of "+curEp+" because it is UNAIRED", logger.ERROR)
+                            continue
 
-                    if int(status) in Quality.DOWNLOADED and epObj.status not in Quality.SNATCHED + Quality.SNATCHED_PROPER + Quality.DOWNLOADED + [IGNORED] and not ek.ek(os.path.isfile, epObj.location):
-                        logger.log(u"Refusing to change status of "+curEp+" to DOWNLOADED because it's not SNATCHED/DOWNLOADED", logger.ERROR)
-                        continue
+                        if int(status) in Quality.DOWNLOADED and epObj.status not in Quality.SNATCHED + Quality.SNATCHED_PROPER + Quality.DOWNLOADED + [IGNORED] and not ek.ek(os.path.isfile, epObj.location):
+                            logger.log(u"Refusing to change status of "+curEp+" to DOWNLOADED because it's not SNATCHED/DOWNLOADED", logger.ERROR)
+                            continue
 
-                    epObj.status = int(status)
-                    epObj.saveToDB()
+                        epObj.status = int(status)
+                        epObj.saveToDB()
 
         msg = "Backlog was automatically started for the following seasons of <b>"+showObj.name+"</b>:<br />"
         for cur_segment in segment_list:
@@ -2831,35 +2852,7 @@ class WebInterface:
     @cherrypy.expose
     def comingEpisodes(self, layout="None"):
 
-        myDB = db.DBConnection()
-
-        today = datetime.date.today().toordinal()
-        next_week = (datetime.date.today() + datetime.timedelta(days=7)).toordinal()
-        recently = (datetime.date.today() - datetime.timedelta(days=3)).toordinal()
-
-        done_show_list = []
-        qualList = Quality.DOWNLOADED + Quality.SNATCHED + [ARCHIVED, IGNORED]
-        sql_results = myDB.select("SELECT *, tv_shows.status as show_status FROM tv_episodes, tv_shows WHERE season != 0 AND airdate >= ? AND airdate < ? AND tv_shows.tvdb_id = tv_episodes.showid AND tv_episodes.status NOT IN ("+','.join(['?']*len(qualList))+")", [today, next_week] + qualList)
-        for cur_result in sql_results:
-            done_show_list.append(int(cur_result["showid"]))
-
-        more_sql_results = myDB.select("SELECT *, tv_shows.status as show_status FROM tv_episodes outer_eps, tv_shows WHERE season != 0 AND showid NOT IN ("+','.join(['?']*len(done_show_list))+") AND tv_shows.tvdb_id = outer_eps.showid AND airdate = (SELECT airdate FROM tv_episodes inner_eps WHERE inner_eps.showid = outer_eps.showid AND inner_eps.airdate >= ? ORDER BY inner_eps.airdate ASC LIMIT 1) AND outer_eps.status NOT IN ("+','.join(['?']*len(Quality.DOWNLOADED+Quality.SNATCHED))+")", done_show_list + [next_week] + Quality.DOWNLOADED + Quality.SNATCHED)
-        sql_results += more_sql_results
-
-        more_sql_results = myDB.select("SELECT *, tv_shows.status as show_status FROM tv_episodes, tv_shows WHERE season != 0 AND tv_shows.tvdb_id = tv_episodes.showid AND airdate < ? AND airdate >= ? AND tv_episodes.status = ? AND tv_episodes.status NOT IN ("+','.join(['?']*len(qualList))+")", [today, recently, WANTED] + qualList)
-        sql_results += more_sql_results
-
-        #epList = sickbeard.comingList
-
-        # sort by air date
-        sorts = {
-            'date': (lambda x, y: cmp(int(x["airdate"]), int(y["airdate"]))),
-            'show': (lambda a, b: cmp(a["show_name"], b["show_name"])),
-            'network': (lambda a, b: cmp(a["network"], b["network"])),
-        }
-
-        #epList.sort(sorts[sort])
-        sql_results.sort(sorts[sickbeard.COMING_EPS_SORT])
+        coming = coming_episodes.getComingEpisodes()
 
         t = PageTemplate(file="comingEpisodes.tmpl")
         paused_item = { 'title': '', 'path': 'toggleComingEpsDisplayPaused' }
@@ -2877,9 +2870,9 @@ class WebInterface:
             paused_item,
         ]
 
-        t.next_week = next_week
-        t.today = today
-        t.sql_results = sql_results
+        t.next_week = coming.next_week
+        t.today = coming.today
+        t.sql_results = coming.sortedEpisodes(sickbeard.COMING_EPS_SORT)
 
         # Allow local overriding of layout parameter
         if layout and layout in ('poster', 'banner', 'list'):
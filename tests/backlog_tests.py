@@ -0,0 +1,231 @@
+# coding=UTF-8
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import unittest
+
+import test_lib as test
+
+import sickbeard
+from sickbeard import db, searchBacklog
+from sickbeard.common import Quality, WANTED, SKIPPED, DOWNLOADED
+
+
+class FakeProvider(object):
+    def __init__(self, name, searchStrings=1):
+        self.name = name
+        self.searchStrings = searchStrings
+        self.calls = 0
+
+    def isActive(self):
+        return True
+
+    def _get_season_search_strings(self, show, season):
+        self.calls += 1
+        return ["search"] * self.searchStrings
+
+
+class FakeQueue(object):
+    def __init__(self):
+        self.items = []
+
+    def is_in_queue(self, show, segment):
+        return False
+
+    def add_item(self, item):
+        self.items.append((item.show.tvdbid, item.segment))
+
+
+class FakeQueueScheduler(object):
+    def __init__(self):
+        self.action = FakeQueue()
+
+
+class BacklogPlanTests(test.SickbeardTestDBCase):
+
+    def setUp(self):
+        test.SickbeardTestDBCase.setUp(self)
+        self.oldBudget = sickbeard.BACKLOG_PROVIDER_BUDGET
+        self.oldSearchQueue = sickbeard.searchQueueScheduler
+        sickbeard.BACKLOG_PROVIDER_BUDGET = 0
+        sickbeard.searchQueueScheduler = None
+        self.oldShowList = sickbeard.showList
+        self.fromDate = datetime.date.fromordinal(1)
+
+    def tearDown(self):
+        sickbeard.BACKLOG_PROVIDER_BUDGET = self.oldBudget
+        sickbeard.searchQueueScheduler = self.oldSearchQueue
+        sickbeard.showList = self.oldShowList
+        test.SickbeardTestDBCase.tearDown(self)
+
+    def _addShow(self, tvdbid, name, episodes, air_by_date=0):
+        """
+        episodes is a list of (season, episode, airdate, status)
+        """
+        return test.addTestShow(tvdbid, name, episodes, air_by_date=air_by_date,
+                                quality=Quality.combineQualities([Quality.SDTV], [Quality.HDTV]))
+
+    def _segments(self, segmentList):
+        return [(x.show.tvdbid, x.segment) for x in segmentList]
+
+    def test_plan_order(self):
+        first = self._addShow(1, "First", [(1, 1, 733000, Quality.compositeStatus(DOWNLOADED, Quality.HDTV)), (1, 2, 733001, WANTED),
+                                           (2, 1, 734000, WANTED), (2, 2, 734001, WANTED),
+                                           (3, 1, 735000, Quality.compositeStatus(DOWNLOADED, Quality.HDTV))])
+        second = self._addShow(2, "Second", [(1, 1, 733000, Quality.compositeStatus(DOWNLOADED, Quality.SDTV)),
+                                             (2, 1, 735500, WANTED), (0, 1, 733000, WANTED)])
+
+        plan = searchBacklog.planBacklog([first, second], self.fromDate, [FakeProvider("a", 2), FakeProvider("b")], dryRun=True)
+
+        # two wanted in season 2 of the first show, then the newest of the single ones
+        self.assertEqual(self._segments(plan.segments), [(1, 2), (2, 2), (1, 1), (2, 1)])
+        self.assertEqual([x.wanted for x in plan.segments], [2, 1, 1, 1])
+        self.assertEqual(plan.satisfied, 1)
+        self.assertEqual(plan.deferred, [])
+        self.assertEqual(plan.requests, {"a": 8, "b": 4})
+        self.assertEqual(plan.segments[0].providerList, None)
+        self.assertEqual(plan.summary()["wanted_episodes"], 5)
+
+        # without a budget the requests are only counted for a dry run
+        provider = FakeProvider("a")
+        plan = searchBacklog.planBacklog([first, second], self.fromDate, [provider])
+        self.assertEqual(self._segments(plan.segments), [(1, 2), (2, 2), (1, 1), (2, 1)])
+        self.assertEqual(provider.calls, 0)
+
+    def test_recent_only(self):
+        show = self._addShow(1, "Show", [(1, 1, 733000, WANTED), (2, 1, 734000, SKIPPED), (2, 2, 736000, WANTED)])
+
+        plan = searchBacklog.planBacklog([show], datetime.date.fromordinal(735000), [FakeProvider("a")])
+        self.assertEqual(self._segments(plan.segments), [(1, 2)])
+        self.assertEqual(plan.segments[0].wanted, 1)
+
+    def test_limited_query(self):
+        show = self._addShow(1, "Show", [(1, 1, 733000, WANTED), (1, 2, 733001, WANTED), (2, 1, 734000, SKIPPED), (2, 2, 736000, WANTED)])
+        daily = self._addShow(2, "Daily", [(2010, 1, datetime.date(2010, 1, 5).toordinal(), WANTED),
+                                           (2010, 2, datetime.date(2010, 2, 3).toordinal(), WANTED),
+                                           (2010, 3, datetime.date(2010, 2, 20).toordinal(), WANTED)], air_by_date=1)
+
+        read = []
+        oldSelect = db.DBConnection.select
+
+        def select(self, query, args=None):
+            sqlResults = oldSelect(self, query, args)
+            if "tv_episodes" in query:
+                read.extend([(x["showid"], x["season"], x["airdate"]) for x in sqlResults])
+            return sqlResults
+
+        db.DBConnection.select = select
+        try:
+            segmentList = searchBacklog._getWantedSegments([show, daily], datetime.date(2010, 2, 10))
+        finally:
+            db.DBConnection.select = oldSelect
+
+        # only the season and the month with an episode after the date are read, all of them
+        self.assertEqual(sorted(read), [(1, 2, 734000), (1, 2, 736000),
+                                        (2, 2010, datetime.date(2010, 2, 3).toordinal()), (2, 2010, datetime.date(2010, 2, 20).toordinal())])
+        self.assertEqual(sorted([(x.show.tvdbid, x.segment, x.wanted) for x in segmentList]), [(1, 2, 1), (2, "2010-02", 2)])
+
+    def test_paused_and_other_shows(self):
+        show = self._addShow(1, "Show", [(1, 1, 733000, WANTED)])
+        other = self._addShow(2, "Other", [(1, 1, 733000, WANTED)])
+        paused = self._addShow(3, "Paused", [(1, 1, 733000, WANTED)])
+        paused.paused = 1
+
+        plan = searchBacklog.planBacklog([show, paused], self.fromDate, [FakeProvider("a")])
+        self.assertEqual(self._segments(plan.segments), [(1, 1)])
+
+    def test_air_by_date(self):
+        show = self._addShow(1, "Daily", [(2010, 1, datetime.date(2010, 1, 5).toordinal(), WANTED),
+                                          (2010, 2, datetime.date(2010, 1, 6).toordinal(), WANTED),
+                                          (2010, 3, datetime.date(2010, 2, 1).toordinal(), SKIPPED)], air_by_date=1)
+
+        plan = searchBacklog.planBacklog([show], self.fromDate, [FakeProvider("a")])
+        self.assertEqual(self._segments(plan.segments), [(1, "2010-01")])
+        self.assertEqual(plan.segments[0].wanted, 2)
+        self.assertEqual(plan.satisfied, 1)
+
+    def test_budget(self):
+        sickbeard.BACKLOG_PROVIDER_BUDGET = 3
+        show = self._addShow(1, "Show", [(1, 1, 733000, WANTED), (1, 2, 733001, WANTED),
+                                         (2, 1, 734000, WANTED), (3, 1, 735000, WANTED)])
+        cheap = FakeProvider("cheap")
+        expensive = FakeProvider("expensive", 2)
+
+        plan = searchBacklog.planBacklog([show], self.fromDate, [cheap, expensive])
+
+        self.assertEqual(self._segments(plan.segments), [(1, 1), (1, 3), (1, 2)])
+        self.assertEqual([x.providerList for x in plan.segments], [[cheap, expensive], [cheap], [cheap]])
+        self.assertEqual(plan.requests, {"cheap": 3, "expensive": 2})
+        self.assertEqual(plan.deferred, [])
+
+        sickbeard.BACKLOG_PROVIDER_BUDGET = 1
+        plan = searchBacklog.planBacklog([show], self.fromDate, [expensive])
+        self.assertEqual(plan.segments, [])
+        self.assertEqual(len(plan.deferred), 3)
+        self.assertEqual(plan.requests, {"expensive": 0})
+
+    def test_deferred(self):
+        sickbeard.BACKLOG_PROVIDER_BUDGET = 1
+        sickbeard.searchQueueScheduler = FakeQueueScheduler()
+        sickbeard.showList = [self._addShow(1, "Show", [(1, 1, 733000, WANTED), (1, 2, 733001, WANTED), (2, 1, 734000, WANTED)])]
+
+        oldSortedProviderList = searchBacklog.providers.sortedProviderList
+        searchBacklog.providers.sortedProviderList = lambda: [FakeProvider("a")]
+        try:
+            searcher = searchBacklog.BacklogSearcher()
+            searcher._set_lastBacklog(1)
+
+            # season 2 doesn't fit, the backlog isn't done until it's had its turn
+            plan = searcher.searchBacklog()
+            self.assertEqual(self._segments(plan.segments), [(1, 1)])
+            self.assertEqual(searchBacklog.getDeferred(), set([(1, "2")]))
+            self.assertEqual(searcher._get_lastBacklog(), 1)
+
+            # so the next one searches it first even though season 1 has more wanted
+            plan = searcher.searchBacklog()
+            self.assertEqual(self._segments(plan.segments), [(1, 2)])
+            self.assertEqual(searchBacklog.getDeferred(), set([(1, "1")]))
+            self.assertEqual(sickbeard.searchQueueScheduler.action.items, [(1, 1), (1, 2)])
+
+            # once nothing is deferred it counts as a backlog search
+            sickbeard.BACKLOG_PROVIDER_BUDGET = 0
+            searcher.searchBacklog()
+            self.assertEqual(searchBacklog.getDeferred(), set())
+            self.assertEqual(searcher._get_lastBacklog(), datetime.date.today().toordinal())
+        finally:
+            searchBacklog.providers.sortedProviderList = oldSortedProviderList
+
+    def test_dry_run(self):
+        sickbeard.showList = [self._addShow(1, "Show", [(1, 1, 733000, WANTED)])]
+        searcher = searchBacklog.BacklogSearcher()
+        lastBacklog = searcher._get_lastBacklog()
+
+        plan = searcher.searchBacklog(dryRun=True)
+
+        self.assertEqual(self._segments(plan.segments), [(1, 1)])
+        self.assertEqual(searcher._get_lastBacklog(), lastBacklog)
+        self.assertFalse(searcher.amActive)
+
+
+if __name__ == '__main__':
+    print "=================="
+    print "STARTING - BACKLOG TESTS"
+    print "=================="
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(BacklogPlanTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
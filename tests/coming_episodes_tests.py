@@ -0,0 +1,99 @@
+# coding=UTF-8
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import unittest
+
+import test_lib as test
+
+import sickbeard
+from sickbeard import db, coming_episodes, show_index
+from sickbeard.common import Quality, DOWNLOADED, SNATCHED, WANTED, SKIPPED, UNAIRED, IGNORED, ARCHIVED
+
+TODAY = datetime.date.today().toordinal()
+
+
+class ComingEpisodesTests(test.SickbeardTestDBCase):
+
+    def setUp(self):
+        test.SickbeardTestDBCase.setUp(self)
+        coming_episodes.invalidate()
+
+    def _addShow(self, tvdbid, name, episodes, paused=0):
+        """
+        episodes is a list of (season, episode, days from today, status)
+        """
+        return test.addTestShow(tvdbid, name, [(season, episode, TODAY + days, status) for (season, episode, days, status) in episodes],
+                                network="Net " + name, paused=paused)
+
+    def _oldComingEpisodes(self):
+        # the three queries the coming episodes used to be found with
+        today = TODAY
+        next_week = TODAY + 7
+        recently = TODAY - 3
+
+        myDB = db.DBConnection()
+        qualList = Quality.DOWNLOADED + Quality.SNATCHED + [ARCHIVED, IGNORED]
+        sql_results = myDB.select("SELECT *, tv_shows.status as show_status FROM tv_episodes, tv_shows WHERE season != 0 AND airdate >= ? AND airdate < ? AND tv_shows.tvdb_id = tv_episodes.showid AND tv_episodes.status NOT IN ("+','.join(['?']*len(qualList))+")", [today, next_week] + qualList)
+        done_show_list = [int(x["showid"]) for x in sql_results]
+        sql_results += myDB.select("SELECT *, tv_shows.status as show_status FROM tv_episodes outer_eps, tv_shows WHERE season != 0 AND showid NOT IN ("+','.join(['?']*len(done_show_list))+") AND tv_shows.tvdb_id = outer_eps.showid AND airdate = (SELECT airdate FROM tv_episodes inner_eps WHERE inner_eps.showid = outer_eps.showid AND inner_eps.airdate >= ? ORDER BY inner_eps.airdate ASC LIMIT 1) AND outer_eps.status NOT IN ("+','.join(['?']*len(Quality.DOWNLOADED+Quality.SNATCHED))+")", done_show_list + [next_week] + Quality.DOWNLOADED + Quality.SNATCHED)
+        sql_results += myDB.select("SELECT *, tv_shows.status as show_status FROM tv_episodes, tv_shows WHERE season != 0 AND tv_shows.tvdb_id = tv_episodes.showid AND airdate < ? AND airdate >= ? AND tv_episodes.status = ? AND tv_episodes.status NOT IN ("+','.join(['?']*len(qualList))+")", [today, recently, WANTED] + qualList)
+
+        return sorted([(int(x["showid"]), int(x["season"]), int(x["episode"])) for x in sql_results])
+
+    def _episodes(self, coming):
+        return sorted([(x["showid"], x["season"], x["episode"]) for x in coming.episodes])
+
+    def _addShows(self):
+        self._addShow(1, "Weekly", [(1, 1, -10, Quality.compositeStatus(DOWNLOADED, Quality.SDTV)), (1, 2, -2, WANTED), (1, 3, -1, SKIPPED),
+                                    (1, 4, 0, UNAIRED), (1, 5, 5, UNAIRED), (1, 6, 12, UNAIRED)])
+        self._addShow(2, "Later", [(1, 1, -5, WANTED), (0, 1, 9, UNAIRED), (1, 2, 9, UNAIRED), (1, 3, 9, UNAIRED), (1, 4, 20, UNAIRED)])
+        self._addShow(3, "Done", [(2, 1, 1, Quality.compositeStatus(SNATCHED, Quality.SDTV)), (2, 2, 2, IGNORED), (2, 3, 30, UNAIRED)])
+        self._addShow(4, "Special", [(0, 1, 8, UNAIRED), (1, 1, 10, UNAIRED)], paused=1)
+
+    def test_same_as_before(self):
+        self._addShows()
+        coming = coming_episodes.getComingEpisodes()
+
+        self.assertEqual(self._episodes(coming), self._oldComingEpisodes())
+        self.assertEqual(self._episodes(coming), [(1, 1, 2), (1, 1, 4), (1, 1, 5), (2, 1, 2), (2, 1, 3), (3, 2, 3)])
+
+        self.assertEqual([coming.airType(x) for x in coming.sortedEpisodes('date')], ["missed", "today", "soon", "later", "later", "later"])
+        self.assertEqual([x["show_name"] for x in coming.sortedEpisodes('show')], ["Done", "Later", "Later", "Weekly", "Weekly", "Weekly"])
+
+    def test_cached(self):
+        self._addShows()
+        coming = coming_episodes.getComingEpisodes()
+        self.assertTrue(coming_episodes.getComingEpisodes() is coming)
+
+        # a change to a show or an episode builds the list again
+        show_index.invalidate()
+        self.assertFalse(coming_episodes.getComingEpisodes() is coming)
+
+        coming = coming_episodes.getComingEpisodes()
+        coming_episodes.invalidate()
+        self.assertFalse(coming_episodes.getComingEpisodes() is coming)
+
+
+if __name__ == '__main__':
+    print "=================="
+    print "STARTING - COMING EPISODES TESTS"
+    print "=================="
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(ComingEpisodesTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
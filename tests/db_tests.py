@@ -17,6 +17,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
+import threading
 import unittest
 import test_lib as test
 
@@ -30,11 +31,88 @@ class DBBasicTests(test.SickbeardTestDBCase):
     def test_select(self):
         self.db.select("SELECT * FROM tv_episodes WHERE showid = ? AND location != ''", [0000])
 
+    def test_connection_reused(self):
+        before = test.db.connectionPool.stats()
+        otherDB = test.db.DBConnection()
+        after = test.db.connectionPool.stats()
+        self.assertTrue(otherDB.connection is self.db.connection)
+        self.assertEqual(after["opens"], before["opens"])
+        self.assertEqual(after["reuses"], before["reuses"] + 1)
+
+    def test_row_types(self):
+        dictDB = test.db.DBConnection(row_type="dict")
+        self.assertEqual(type(dictDB.select("SELECT db_version FROM db_version")[0]), dict)
+        self.assertEqual(self.db.select("SELECT db_version FROM db_version")[0]["db_version"], dictDB.select("SELECT db_version FROM db_version")[0]["db_version"])
+
+    def test_dead_thread_connections_closed(self):
+        def worker():
+            test.db.DBConnection().select("SELECT 1")
+        closesBefore = test.db.connectionPool.stats()["closes"]
+        # the second thread's new connection reaps the one left by the first
+        for i in range(2):
+            t = threading.Thread(target=worker)
+            t.start()
+            t.join()
+        self.assertEqual(test.db.connectionPool.stats()["closes"], closesBefore + 1)
+
+    def test_mass_upsert(self):
+        self.db.action("INSERT INTO tv_episodes (showid, season, episode, name) VALUES (1, 1, 1, 'old')")
+        self.db.mass_upsert("tv_episodes", [({"name": "new"}, {"showid": 1, "season": 1, "episode": 1}),
+                                            ({"name": "added"}, {"showid": 1, "season": 1, "episode": 2})])
+        results = self.db.select("SELECT episode, name FROM tv_episodes WHERE showid = 1 ORDER BY episode")
+        self.assertEqual([(x["episode"], x["name"]) for x in results], [(1, "new"), (2, "added")])
+
+
+class DBLockTests(test.SickbeardTestDBCase):
+
+    def test_query_shape(self):
+        self.assertEqual(test.db.queryShape("DELETE FROM history WHERE date < 20120101 AND provider = 'foo'"),
+                         "DELETE FROM history WHERE date < ? AND provider = ?")
+        self.assertEqual(test.db.queryShape("SELECT * FROM tv_episodes WHERE status IN (2,4, 102)"),
+                         "SELECT * FROM tv_episodes WHERE status IN (?)")
+
+    def test_readers_share_lock(self):
+        rwLock = test.db.ReadWriteLock()
+        rwLock.acquireRead()
+        acquired = []
+
+        def reader():
+            rwLock.acquireRead()
+            acquired.append(True)
+            rwLock.releaseRead()
+        t = threading.Thread(target=reader)
+        t.start()
+        t.join(5)
+        rwLock.releaseRead()
+        self.assertEqual(acquired, [True])
+
+    def test_writer_excludes_readers(self):
+        rwLock = test.db.ReadWriteLock()
+        rwLock.acquireWrite()
+        acquired = []
+
+        def reader():
+            rwLock.acquireRead()
+            acquired.append(True)
+            rwLock.releaseRead()
+        t = threading.Thread(target=reader)
+        t.start()
+        t.join(0.2)
+        self.assertEqual(acquired, [])
+        rwLock.releaseWrite()
+        t.join(5)
+        self.assertEqual(acquired, [True])
+
+    def test_hold_times_recorded(self):
+        myDB = test.db.DBConnection()
+        myDB.action("UPDATE db_version SET db_version = db_version")
+        self.assertTrue(myDB.lock.queries["UPDATE db_version SET db_version = db_version"][0] >= 1)
+        self.assertTrue(sum(myDB.lock.stats()["hold_histogram"].values()) >= 1)
 
 if __name__ == '__main__':
     print "=================="
     print "STARTING - DB TESTS"
     print "=================="
     print "######################################################################"
-    suite = unittest.TestLoader().loadTestsFromTestCase(DBBasicTests)
+    suite = unittest.TestSuite([unittest.TestLoader().loadTestsFromTestCase(DBBasicTests), unittest.TestLoader().loadTestsFromTestCase(DBLockTests)])
     unittest.TextTestRunner(verbosity=2).run(suite)
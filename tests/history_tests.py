@@ -0,0 +1,94 @@
+# coding=UTF-8
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import unittest
+
+import test_lib as test
+
+from sickbeard import db, history
+from sickbeard.common import Quality, SNATCHED, DOWNLOADED
+from sickbeard.tv import TVShow
+
+
+class HistoryTests(test.SickbeardTestDBCase):
+
+    def setUp(self):
+        test.SickbeardTestDBCase.setUp(self)
+        self.show = TVShow(0001, "en")
+        self.show.name = "Show Name"
+        self.show.saveToDB()
+
+    def _addHistory(self, date, episode, resource, action=None):
+        if action == None:
+            action = Quality.compositeStatus(SNATCHED, Quality.SDTV)
+        db.DBConnection().action("INSERT INTO history (action, date, showid, season, episode, quality, resource, provider, resource_key) VALUES (?,?,?,?,?,?,?,?,?)",
+                                 [action, date, self.show.tvdbid, 1, episode, Quality.SDTV, resource, "provider", history.resourceKey(resource)])
+
+    def test_pages(self):
+        # a few entries share a date so the pages can't just go by it
+        for curEp in range(1, 8):
+            self._addHistory(20120101000000 + curEp / 3, curEp, "Show.Name.S01E%02d" % curEp)
+
+        allResults, nextPage = history.getHistory(0)
+        self.assertEqual(nextPage, None)
+        self.assertEqual(len(allResults), 7)
+        self.assertEqual(allResults[0]["show_name"], "Show Name")
+
+        pages = []
+        nextPage = None
+        while True:
+            curResults, nextPage = history.getHistory(3, nextPage)
+            pages.append([x["episode"] for x in curResults])
+            if nextPage == None:
+                break
+
+        self.assertEqual(pages, [[7, 6, 5], [4, 3, 2], [1]])
+        self.assertEqual([x["episode"] for x in allResults], [7, 6, 5, 4, 3, 2, 1])
+
+        downloaded = Quality.compositeStatus(DOWNLOADED, Quality.SDTV)
+        self._addHistory(20120101000000, 8, "/tv/Show.Name.S01E08.avi", downloaded)
+        self.assertEqual([x["episode"] for x in history.getHistory(10, None, [downloaded])[0]], [8])
+
+    def test_resource(self):
+        self._addHistory(20120101000000, 1, "Show.Name.S01E01.720p-GROUP")
+        self.assertEqual(len(history.findByResource("show name s01e01 720p-group")), 1)
+        self.assertEqual(len(history.findByResource("Show_Name_S01E01_720p_GROUP")), 1)
+        self.assertEqual(history.findByResource("Show.Name.S01E02.720p-GROUP"), [])
+
+    def test_archive(self):
+        oldDate = (datetime.datetime.today() - datetime.timedelta(days=40)).strftime(history.dateFormat)
+        newDate = datetime.datetime.today().strftime(history.dateFormat)
+        self._addHistory(oldDate, 1, "/downloads/Show.Name.S01E01/Show.Name.S01E01.avi")
+        self._addHistory(newDate, 2, "Show.Name.S01E02")
+
+        self.assertEqual(history.archiveHistory(30), 1)
+        self.assertEqual(history.archiveHistory(30), 0)
+
+        self.assertEqual([x["episode"] for x in history.getHistory(0)[0]], [2])
+        archived = db.DBConnection().select("SELECT * FROM history_archive")
+        self.assertEqual([(x["episode"], x["resource"]) for x in archived], [(1, "Show.Name.S01E01.avi")])
+
+
+if __name__ == '__main__':
+    print "=================="
+    print "STARTING - HISTORY TESTS"
+    print "=================="
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(HistoryTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,179 @@
+# coding=UTF-8
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import StringIO
+import threading
+import unittest
+import BaseHTTPServer
+import SocketServer
+
+import test_lib as test
+
+import sickbeard
+from sickbeard import helpers, http_client
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    A keep-alive HTTP/1.1 server which counts the connections made to it.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, body, headers=[]):
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.path == '/plain':
+            self._send(200, 'plain data')
+        elif self.path == '/gzip':
+            data = StringIO.StringIO()
+            gzipFile = gzip.GzipFile(fileobj=data, mode='wb')
+            gzipFile.write('gzipped data')
+            gzipFile.close()
+            self._send(200, data.getvalue(), [('Content-Encoding', 'gzip')])
+        elif self.path == '/redirect':
+            self._send(302, '', [('Location', '/plain')])
+        elif self.path == '/close':
+            self._send(200, 'closed', [('Connection', 'close')])
+        elif self.path == '/drop':
+            # answer like the connection stays open then drop it anyway, like an idle timeout would
+            self._send(200, 'dropped')
+            self.close_connection = 1
+        elif self.path == '/headers':
+            self._send(200, self.headers.get('X-Test', ''))
+        else:
+            self._send(404, 'not found')
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.connections = 0
+        self.paths = []
+
+
+class HTTPClientTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer()
+        self.serverThread = threading.Thread(target=self.server.serve_forever)
+        self.serverThread.setDaemon(True)
+        self.serverThread.start()
+
+        self.oldSettings = (sickbeard.HTTP_POOL_SIZE, sickbeard.HTTP_KEEPALIVE_TIMEOUT, http_client.httpClient)
+        # a fresh client so the stats only cover this test
+        http_client.httpClient = http_client.HTTPClient()
+
+    def tearDown(self):
+        http_client.httpClient.closeAll()
+        sickbeard.HTTP_POOL_SIZE, sickbeard.HTTP_KEEPALIVE_TIMEOUT, http_client.httpClient = self.oldSettings
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.server.server_address[1], path)
+
+    def test_keepalive(self):
+        for i in range(3):
+            self.assertEqual(helpers.getURL(self._url('/plain')), 'plain data')
+
+        self.assertEqual(self.server.connections, 1)
+        stats = http_client.httpClient.stats()
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['reused'], 2)
+
+    def test_gzip(self):
+        self.assertEqual(helpers.getURL(self._url('/gzip')), 'gzipped data')
+
+    def test_redirect(self):
+        self.assertEqual(helpers.getURL(self._url('/redirect')), 'plain data')
+        self.assertEqual(self.server.paths, ['/redirect', '/plain'])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_headers(self):
+        self.assertEqual(helpers.getURL(self._url('/headers'), [('X-Test', 'header value')]), 'header value')
+
+    def test_http_error(self):
+        self.assertEqual(helpers.getURL(self._url('/missing')), None)
+        # the error response was read completely so the connection is still good
+        self.assertEqual(helpers.getURL(self._url('/plain')), 'plain data')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_connection_close(self):
+        self.assertEqual(helpers.getURL(self._url('/close')), 'closed')
+        self.assertEqual(helpers.getURL(self._url('/plain')), 'plain data')
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(http_client.httpClient.stats()['reused'], 0)
+
+    def test_stale_connection(self):
+        self.assertEqual(helpers.getURL(self._url('/drop')), 'dropped')
+        # the pooled connection is dead by now, the request is retried on a new one
+        self.assertEqual(helpers.getURL(self._url('/plain')), 'plain data')
+        self.assertEqual(http_client.httpClient.stats()['retries'], 1)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_keepalive_timeout(self):
+        sickbeard.HTTP_KEEPALIVE_TIMEOUT = -1
+        helpers.getURL(self._url('/plain'))
+        helpers.getURL(self._url('/plain'))
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(http_client.httpClient.stats()['reused'], 0)
+
+    def test_pool_size(self):
+        sickbeard.HTTP_POOL_SIZE = 0
+        helpers.getURL(self._url('/plain'))
+        helpers.getURL(self._url('/plain'))
+        self.assertEqual(self.server.connections, 2)
+
+    def test_connection_refused(self):
+        url = self._url('/plain')
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertEqual(helpers.getURL(url), None)
+        # so tearDown has something to shut down
+        self.server = StubServer()
+        self.serverThread = threading.Thread(target=self.server.serve_forever)
+        self.serverThread.setDaemon(True)
+        self.serverThread.start()
+
+
+if __name__ == '__main__':
+    print "=================="
+    print "STARTING - HTTP CLIENT TESTS"
+    print "=================="
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(HTTPClientTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
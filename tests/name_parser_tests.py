@@ -334,6 +334,58 @@ class BasicTests(unittest.TestCase):
     def test_combination_names(self):
         pass
 
+class CacheTests(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = parser.NameParserCache(2)
+        cache.add('a', 1)
+        cache.add('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        # b is now the least recently used so it goes first
+        cache.add('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+        stats = cache.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['max_size'], 2)
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['evictions'], 1)
+
+    def test_readd(self):
+        cache = parser.NameParserCache(2)
+        cache.add('a', 1)
+        cache.add('b', 2)
+        cache.add('a', 3)
+        cache.add('c', 4)
+        self.assertEqual(cache.get('a'), 3)
+        self.assertEqual(cache.get('b'), None)
+        cache.clear()
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_default_size(self):
+        old_size = sickbeard.NAME_PARSER_CACHE_SIZE
+        sickbeard.NAME_PARSER_CACHE_SIZE = 1
+        try:
+            cache = parser.NameParserCache()
+            cache.add('a', 1)
+            cache.add('b', 2)
+            self.assertEqual(cache.stats()['size'], 1)
+        finally:
+            sickbeard.NAME_PARSER_CACHE_SIZE = old_size
+
+    def test_file_name_key(self):
+        # the extension is only stripped when parsing file names so the results can't be shared
+        name = 'Show.Name.S01E02.Source.Quality.Etc-Group.avi'
+        self.assertEqual(parser.NameParser(True).parse(name).release_group, 'Group')
+        self.assertEqual(parser.NameParser(False).parse(name).release_group, 'Group.avi')
+
+    def test_shared_regexes(self):
+        self.assertTrue(parser.NameParser().compiled_regexes is parser.NameParser(False).compiled_regexes)
+
 if __name__ == '__main__':
     if len(sys.argv) > 1:
         suite = unittest.TestLoader().loadTestsFromName('name_parser_tests.BasicTests.test_'+sys.argv[1])
@@ -349,3 +401,6 @@ if __name__ == '__main__':
 
     suite = unittest.TestLoader().loadTestsFromTestCase(FailureCaseTests)
     unittest.TextTestRunner(verbosity=2).run(suite)
+
+    suite = unittest.TestLoader().loadTestsFromTestCase(CacheTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,208 @@
+# coding=UTF-8
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import with_statement
+
+import os
+import shutil
+import threading
+import time
+import unittest
+
+import test_lib as test
+
+import sickbeard
+from sickbeard import processTV, postProcessor
+
+DOWNLOADDIR = os.path.join(test.TESTDIR, 'pp downloads')
+
+
+class FakeShow(object):
+    def __init__(self, location):
+        self._location = location
+
+
+class FakePostProcessor(object):
+    """
+    Stands in for the real post-processor, it remembers what ran at the same time.
+    """
+
+    lock = threading.Lock()
+    running = []
+    maxRunning = 0
+    maxRunningPerShow = 0
+    processed = []
+    failFiles = []
+
+    def __init__(self, file_path, nzb_name=None):
+        self.file_path = file_path
+        self.nzb_name = nzb_name
+        self.log = u"processing " + os.path.basename(file_path) + u"\n"
+
+    def process(self):
+        cls = FakePostProcessor
+        showKey = processTV._showKey(self.file_path, self.nzb_name)
+
+        with cls.lock:
+            cls.running.append(showKey)
+            cls.maxRunning = max(cls.maxRunning, len(cls.running))
+            cls.maxRunningPerShow = max(cls.maxRunningPerShow, cls.running.count(showKey))
+            cls.processed.append((os.path.basename(self.file_path), self.nzb_name))
+
+        time.sleep(0.05)
+
+        with cls.lock:
+            cls.running.remove(showKey)
+
+        return os.path.basename(self.file_path) not in cls.failFiles
+
+
+def showKeyFromName(filePath, nzbName):
+    # the files are named "<show>.<episode>.avi", anything starting with "unknown" doesn't match a show
+    name = os.path.basename(filePath).split('.')[0]
+    if name == 'unknown':
+        return None
+    return name
+
+
+class ProcessTVTests(unittest.TestCase):
+
+    def setUp(self):
+        self.oldPostProcessor = postProcessor.PostProcessor
+        self.oldShowKey = processTV._showKey
+        self.oldThreads = sickbeard.POST_PROCESS_THREADS
+        self.oldDownloadDir = sickbeard.TV_DOWNLOAD_DIR
+        self.oldKeepDir = sickbeard.KEEP_PROCESSED_DIR
+        self.oldShowList = sickbeard.showList
+
+        postProcessor.PostProcessor = FakePostProcessor
+        processTV._showKey = showKeyFromName
+        sickbeard.POST_PROCESS_THREADS = 2
+        sickbeard.TV_DOWNLOAD_DIR = DOWNLOADDIR
+        sickbeard.KEEP_PROCESSED_DIR = False
+        sickbeard.showList = []
+
+        FakePostProcessor.running = []
+        FakePostProcessor.maxRunning = 0
+        FakePostProcessor.maxRunningPerShow = 0
+        FakePostProcessor.processed = []
+        FakePostProcessor.failFiles = []
+
+        os.mkdir(DOWNLOADDIR)
+
+    def tearDown(self):
+        postProcessor.PostProcessor = self.oldPostProcessor
+        processTV._showKey = self.oldShowKey
+        sickbeard.POST_PROCESS_THREADS = self.oldThreads
+        sickbeard.TV_DOWNLOAD_DIR = self.oldDownloadDir
+        sickbeard.KEEP_PROCESSED_DIR = self.oldKeepDir
+        sickbeard.showList = self.oldShowList
+
+        shutil.rmtree(DOWNLOADDIR)
+
+    def _makeFiles(self, *paths):
+        for curPath in paths:
+            fullPath = os.path.join(DOWNLOADDIR, curPath)
+            if not os.path.isdir(os.path.dirname(fullPath)):
+                os.makedirs(os.path.dirname(fullPath))
+            open(fullPath, 'w').close()
+
+    def _processed(self):
+        return sorted([x[0] for x in FakePostProcessor.processed])
+
+    def test_process_folders(self):
+        self._makeFiles('a.1.avi', 'a.2.avi', 'release/b.1.avi', 'release/b.1.nfo', 'release/b.1.sample.avi',
+                        'nested/c.1.avi', 'nested/inner/c.2.avi', 'failed/a.3.avi')
+        FakePostProcessor.failFiles = ['a.3.avi']
+
+        result = processTV.processDir(DOWNLOADDIR)
+
+        self.assertEqual(self._processed(), ['a.1.avi', 'a.2.avi', 'a.3.avi', 'b.1.avi', 'c.1.avi', 'c.2.avi'])
+        self.assertTrue(u"processing b.1.avi" in result)
+        self.assertTrue(u"Processing failed for " + os.path.join(DOWNLOADDIR, 'failed', 'a.3.avi') in result)
+
+        # folders with one processed video go, the download dir and failed ones stay
+        self.assertTrue(os.path.isdir(DOWNLOADDIR))
+        self.assertFalse(os.path.exists(os.path.join(DOWNLOADDIR, 'release')))
+        self.assertFalse(os.path.exists(os.path.join(DOWNLOADDIR, 'nested')))
+        self.assertTrue(os.path.isdir(os.path.join(DOWNLOADDIR, 'failed')))
+
+    def test_keep_processed_dir(self):
+        sickbeard.KEEP_PROCESSED_DIR = True
+        self._makeFiles('release/b.1.avi')
+
+        processTV.processDir(DOWNLOADDIR)
+
+        self.assertEqual(self._processed(), ['b.1.avi'])
+        self.assertTrue(os.path.isdir(os.path.join(DOWNLOADDIR, 'release')))
+
+    def test_skipped_folders(self):
+        self._makeFiles('_FAILED_release/a.1.avi', '_UNPACK_release/a.2.avi', 'show dir/a.3.avi', 'ok/a.4.avi')
+        sickbeard.showList = [FakeShow(os.path.join(DOWNLOADDIR, 'show dir'))]
+
+        result = processTV.processDir(DOWNLOADDIR)
+
+        self.assertEqual(self._processed(), ['a.4.avi'])
+        self.assertTrue(u"already been moved to its show dir" in result)
+        self.assertTrue(processTV.isInShowDir(os.path.join(DOWNLOADDIR, 'show dir', 'Season 1')))
+        self.assertFalse(processTV.isInShowDir(os.path.join(DOWNLOADDIR, 'show dir 2')))
+
+    def test_nzb_name(self):
+        self._makeFiles('release/b.1.avi', 'release/inner/b.2.avi')
+        processTV.processDir(os.path.join(DOWNLOADDIR, 'release'), 'b.1.nzb')
+
+        self.assertEqual(sorted(FakePostProcessor.processed), [('b.1.avi', 'b.1.nzb'), ('b.2.avi', None)])
+
+        # with more than one video the nzb name can't be right for all of them
+        FakePostProcessor.processed = []
+        self._makeFiles('two/b.3.avi', 'two/b.4.avi')
+        processTV.processDir(os.path.join(DOWNLOADDIR, 'two'), 'b.3.nzb')
+        self.assertEqual([x[1] for x in FakePostProcessor.processed], [None, None])
+
+    def test_one_file_per_show_at_once(self):
+        self._makeFiles('a.1.avi', 'a.2.avi', 'a.3.avi', 'b.1.avi', 'b.2.avi', 'c.1.avi', 'unknown.1.avi', 'unknown.2.avi')
+
+        processTV.processDir(DOWNLOADDIR)
+
+        self.assertEqual(len(FakePostProcessor.processed), 8)
+        self.assertEqual(FakePostProcessor.maxRunning, 2)
+        self.assertEqual(FakePostProcessor.maxRunningPerShow, 1)
+
+        # the files we can't tell the show of go last, on their own
+        self.assertEqual(sorted([x[0] for x in FakePostProcessor.processed[-2:]]), ['unknown.1.avi', 'unknown.2.avi'])
+
+    def test_stream(self):
+        self._makeFiles('a.1.avi', 'b.1.avi')
+
+        chunks = []
+        result = processTV.processDir(DOWNLOADDIR, output=chunks.append)
+        self.assertEqual(u"".join(chunks), result)
+
+        self._makeFiles('a.2.avi')
+        streamed = list(processTV.streamDir(DOWNLOADDIR))
+        self.assertTrue(len(streamed) > 2)
+        self.assertTrue([x for x in streamed if x.startswith(u"processing a.2.avi\n")])
+
+
+if __name__ == '__main__':
+    print "=================="
+    print "STARTING - PROCESSTV TESTS"
+    print "=================="
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(ProcessTVTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,206 @@
+# coding=UTF-8
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+
+import test_lib as test
+
+import sickbeard
+from sickbeard import generic_queue, show_queue, search_queue
+from sickbeard.show_queue import ShowQueueActions
+
+
+class FakeShow(object):
+    def __init__(self, tvdbid):
+        self.tvdbid = tvdbid
+        self.name = "Show %d" % tvdbid
+        self.air_by_date = False
+        self.quality = 0
+
+
+class BlockingItem(show_queue.ShowQueueItem):
+    """
+    A show queue item that runs until it's told to stop.
+    """
+
+    def __init__(self, action_id, show):
+        show_queue.ShowQueueItem.__init__(self, action_id, show)
+        self.started = threading.Event()
+        self.done = threading.Event()
+
+    def execute(self):
+        show_queue.ShowQueueItem.execute(self)
+        self.started.set()
+        self.done.wait(5)
+        self.finish()
+
+
+class QueueTests(test.SickbeardTestDBCase):
+
+    def setUp(self):
+        test.SickbeardTestDBCase.setUp(self)
+        self.oldThreads = sickbeard.SHOW_QUEUE_THREADS
+        sickbeard.SHOW_QUEUE_THREADS = 3
+        self.items = []
+
+    def tearDown(self):
+        sickbeard.SHOW_QUEUE_THREADS = self.oldThreads
+        for curItem in self.items:
+            curItem.done.set()
+        test.SickbeardTestDBCase.tearDown(self)
+
+    def _add(self, queue, action_id, show):
+        item = BlockingItem(action_id, show)
+        self.items.append(item)
+        queue.add_item(item)
+        return item
+
+    def _finish(self, queue, item):
+        item.done.set()
+        for curThread, curItem in queue.workers:
+            if curItem is item:
+                curThread.join(5)
+        queue.run()
+
+    def test_one_worker_by_default(self):
+        queue = generic_queue.GenericQueue()
+        first = self._add(queue, ShowQueueActions.UPDATE, FakeShow(1))
+        second = self._add(queue, ShowQueueActions.UPDATE, FakeShow(2))
+
+        queue.run()
+        first.started.wait(5)
+        self.assertEqual(queue.currentItems, [first])
+        self.assertEqual(queue.currentItem, first)
+        self.assertEqual(queue.queue, [second])
+
+        self._finish(queue, first)
+        self.assertFalse(first.inProgress)
+        self.assertEqual(queue.currentItems, [second])
+
+    def test_shows_in_parallel(self):
+        queue = show_queue.ShowQueue()
+        shows = [FakeShow(x) for x in range(4)]
+        items = [self._add(queue, ShowQueueActions.UPDATE, x) for x in shows]
+
+        queue.run()
+        for curItem in items[:3]:
+            curItem.started.wait(5)
+        self.assertEqual(queue.currentItems, items[:3])
+        self.assertEqual(queue.queue, items[3:])
+        self.assertTrue(queue.isBeingUpdated(shows[1]))
+
+        self._finish(queue, items[1])
+        self.assertEqual(queue.currentItems, [items[0], items[2], items[3]])
+
+    def test_same_show_waits(self):
+        queue = show_queue.ShowQueue()
+        show = FakeShow(1)
+        update = self._add(queue, ShowQueueActions.UPDATE, show)
+        refresh = self._add(queue, ShowQueueActions.REFRESH, show)
+        other = self._add(queue, ShowQueueActions.UPDATE, FakeShow(2))
+
+        queue.run()
+        # the refresh has the higher priority but the show is busy, the other show goes ahead of it
+        self.assertEqual(queue.currentItems, [update, other])
+        self.assertEqual(queue.queue, [refresh])
+
+        self._finish(queue, update)
+        self.assertEqual(queue.currentItems, [other, refresh])
+
+    def test_action_limit(self):
+        queue = show_queue.ShowQueue()
+        firstAdd = self._add(queue, ShowQueueActions.ADD, None)
+        secondAdd = self._add(queue, ShowQueueActions.ADD, None)
+        refresh = self._add(queue, ShowQueueActions.REFRESH, FakeShow(1))
+
+        queue.run()
+        # only one add at a time, the refresh doesn't have to wait for the second one
+        self.assertEqual(queue.currentItems, [firstAdd, refresh])
+        self.assertEqual(queue.queue, [secondAdd])
+
+        self._finish(queue, firstAdd)
+        self.assertEqual(queue.currentItems, [refresh, secondAdd])
+
+    def test_priority_order(self):
+        queue = generic_queue.GenericQueue()
+        low = BlockingItem(ShowQueueActions.UPDATE, FakeShow(1))
+        low.priority = generic_queue.QueuePriorities.LOW
+        high = BlockingItem(ShowQueueActions.REFRESH, FakeShow(2))
+        high.priority = generic_queue.QueuePriorities.HIGH
+
+        queue.add_item(low)
+        normal = [self._add(queue, ShowQueueActions.UPDATE, FakeShow(x)) for x in range(3, 6)]
+        queue.add_item(high)
+
+        # highest priority first, the oldest first when they're the same
+        self.assertEqual(queue.queue, [high] + normal + [low])
+
+    def test_pause(self):
+        queue = show_queue.ShowQueue()
+        item = self._add(queue, ShowQueueActions.UPDATE, FakeShow(1))
+
+        queue.pause()
+        queue.run()
+        self.assertEqual(queue.currentItems, [])
+        self.assertEqual(queue.queue, [item])
+
+        queue.unpause()
+        queue.run()
+        self.assertEqual(queue.currentItems, [item])
+
+    def test_show_index(self):
+        queue = show_queue.ShowQueue()
+        show = FakeShow(1)
+        update = self._add(queue, ShowQueueActions.UPDATE, show)
+        secondUpdate = self._add(queue, ShowQueueActions.FORCEUPDATE, show)
+
+        self.assertTrue(queue.isInUpdateQueue(show))
+        self.assertFalse(queue.isInRefreshQueue(show))
+        self.assertFalse(queue.isInUpdateQueue(FakeShow(1)))
+        self.assertTrue(queue.is_queued(update))
+
+        queue.run()
+        self.assertFalse(queue.is_queued(update))
+        self.assertTrue(queue.isInUpdateQueue(show))
+
+        self._finish(queue, update)
+        self.assertFalse(queue.isInUpdateQueue(show))
+        self.assertTrue(queue.isBeingUpdated(show))
+        self.assertEqual(queue.currentItems, [secondUpdate])
+
+    def test_search_queue_duplicates(self):
+        queue = search_queue.SearchQueue()
+        show = FakeShow(1)
+        queue.add_item(search_queue.BacklogQueueItem(show, 1))
+        queue.add_item(search_queue.BacklogQueueItem(show, 1))
+        queue.add_item(search_queue.BacklogQueueItem(show, 2))
+
+        self.assertEqual([x.segment for x in queue.queue], [1, 2])
+        self.assertTrue(queue.is_in_queue(show, 2))
+        self.assertFalse(queue.is_in_queue(show, 3))
+        self.assertTrue(queue.is_backlog_in_progress())
+
+
+if __name__ == '__main__':
+    print "=================="
+    print "STARTING - QUEUE TESTS"
+    print "=================="
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(QueueTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
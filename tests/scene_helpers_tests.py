@@ -1,3 +1,4 @@
+import re
 import unittest
 import test_lib as test
 
@@ -53,6 +54,76 @@ class SceneTests(test.SickbeardTestDBCase):
             s.name = show_name
             self._test_isGoodName(scene_name, s)
 
+    def _makeShow(self, tvdbid, name, startyear=0):
+        s = Show(tvdbid)
+        s.name = name
+        s.startyear = startyear
+        return s
+
+    def test_findShows(self):
+        myDB = db.DBConnection("cache.db")
+        myDB.action("INSERT INTO scene_exceptions (tvdb_id, show_name) VALUES (?,?)", [3, 'Other Exception'])
+        scene_exceptions.clear_exceptions_cache()
+
+        shows = [self._makeShow(1, 'Show Name'), self._makeShow(2, "Grey's Anatomy", 2005),
+                 self._makeShow(3, 'Other Show'), self._makeShow(4, 'Show Name')]
+        oldShowList = sickbeard.showList
+        sickbeard.showList = shows
+        try:
+            matcher = show_name_helpers.ShowNameMatcher()
+            self.assertEqual(matcher.findShows('Show.Name.S01E02.HDTV.XviD-GRP'), [shows[0], shows[3]])
+            self.assertEqual(matcher.findShows('Greys.Anatomy.2005.S01E02.HDTV.XviD-GRP'), [shows[1]])
+            self.assertEqual(matcher.findShows("Grey's Anatomy 1x02 HDTV"), [shows[1]])
+            self.assertEqual(matcher.findShows('Other.Exception.2010.01.02.HDTV-GRP'), [shows[2]])
+            self.assertEqual(matcher.findShows('Show.Name.Extra.S01E02.HDTV-GRP'), [])
+            self.assertEqual(matcher.findShows('Unknown.Show.S01E02.HDTV-GRP'), [])
+
+            # the matcher has to notice new shows and new exceptions
+            shows.append(self._makeShow(5, 'Brand New'))
+            self.assertEqual(matcher.findShows('Brand.New.S01E02.HDTV-GRP'), [shows[4]])
+            myDB.action("INSERT INTO scene_exceptions (tvdb_id, show_name) VALUES (?,?)", [5, 'New Exception'])
+            scene_exceptions.clear_exceptions_cache()
+            self.assertEqual(matcher.findShows('New.Exception.S01E02.HDTV-GRP'), [shows[4]])
+
+            # and shows that were renamed once they're saved
+            shows[2].name = 'Renamed Show'
+            matcher.invalidate()
+            self.assertEqual(matcher.findShows('Renamed.Show.S01E02.HDTV-GRP'), [shows[2]])
+
+            # the regex is only compiled once per show
+            self.assertTrue(matcher.showRegex(shows[0]) is matcher.showRegex(shows[0]))
+        finally:
+            sickbeard.showList = oldShowList
+
+    def test_findShowsMatchesIsGoodResult(self):
+        names = ['Show.Name.S01E02.Test-Test', 'Show.Name.Part.IV.Test-Test', 'Show.Name.S01.Test-Test',
+                 'Show Name Season 2 Test', 'Show.Name.2010.S01E02', 'Show.Name.E02.Test-Test',
+                 'Show.Name.Something.S01E02', 'Show.Name.US.S01E02', 'Show_Name.S01E02']
+        shows = [self._makeShow(1, 'Show Name'), self._makeShow(2, 'Show: Name', 2010),
+                 self._makeShow(3, 'Show Name (US)'), self._makeShow(4, 'Show_Name')]
+        oldShowList = sickbeard.showList
+        sickbeard.showList = shows
+        try:
+            for name in names:
+                expected = [x for x in shows if show_name_helpers.isGoodResult(name, x, False)]
+                self.assertEqual(show_name_helpers.showNameMatcher.findShows(name), expected, name)
+        finally:
+            sickbeard.showList = oldShowList
+
+    def test_showRegexCache(self):
+        show = self._makeShow(1, 'Show Name')
+        other = self._makeShow(1, 'Show Name')
+        oldShowList = sickbeard.showList
+        sickbeard.showList = [show]
+        try:
+            matcher = show_name_helpers.showNameMatcher
+            matcher.showRegex(show)
+            matcher.showRegex(other)
+            # a show with the same tvdbid that isn't the one in the list isn't kept
+            self.assertEqual(matcher._getState()[2].keys(), [id(show)])
+        finally:
+            sickbeard.showList = oldShowList
+
     def test_sceneToNormalShowNames(self):
         self._test_sceneToNormalShowNames('Show Name 2010', ['Show Name 2010', 'Show Name (2010)'])
         self._test_sceneToNormalShowNames('Show Name US', ['Show Name US', 'Show Name (US)'])
@@ -82,6 +153,55 @@ class SceneTests(test.SickbeardTestDBCase):
         self._test_allPossibleShowNames('Show Name (Full Country Name)', expected=['Show Name (Full Country Name)', 'Show Name (FCN)'])
         self._test_allPossibleShowNames('Show Name (FCN)', -1, 'TVRage Name', expected=['Show Name (FCN)', 'Show Name (Full Country Name)', 'Exception Test', 'TVRage Name'])
 
+    def test_classifyRelease(self):
+        result = show_name_helpers.classifyRelease('Show.Name.S01E02.720p.HDTV.x264-Grp')
+        self.assertTrue(result.accepted)
+        self.assertEqual(result.series_name, 'Show Name')
+        self.assertEqual(result.season_number, 1)
+        self.assertEqual(result.episode_numbers, [2])
+        self.assertEqual(result.quality, common.Quality.HDTV)
+
+        result = show_name_helpers.classifyRelease('Show.S02.German.Stuff-Grp')
+        self.assertFalse(result.accepted)
+        self.assertEqual(result.reject_reason, 'contains german')
+        self.assertEqual(result.series_name, 'Show')
+
+        result = show_name_helpers.classifyRelease('Not a release')
+        self.assertFalse(result.accepted)
+        self.assertEqual(result.parse_result, None)
+        self.assertEqual(result.episode_numbers, [])
+        self.assertEqual(result.quality, common.Quality.UNKNOWN)
+
+    def test_classifyReleaseIgnoreWords(self):
+        oldIgnoreWords = sickbeard.IGNORE_WORDS
+        try:
+            sickbeard.IGNORE_WORDS = 'german'
+            self.assertTrue(show_name_helpers.classifyRelease('Show.S02.Some.Stuff-Grp').accepted)
+            # the filters are rebuilt when the ignore words change
+            sickbeard.IGNORE_WORDS = 'german,stuff'
+            self.assertEqual(show_name_helpers.classifyRelease('Show.S02.Some.Stuff-Grp').reject_reason, 'contains stuff')
+        finally:
+            sickbeard.IGNORE_WORDS = oldIgnoreWords
+
+    def test_classifyReleaseMatchesWordFilters(self):
+        # the combined regex has to reject the same names as checking every word on its own
+        names = ['Show.Name.S01E02.720p.HDTV.x264-Grp', 'Show.Name.S01E02.Subpack.HDTV-Grp', 'Show.Name.S01E02.NLSubs.HDTV-Grp',
+                 'Show.Name.S01E02.DirFix.HDTV-Grp', 'Show.Name.S01E02.Sample-Grp', 'Show.Name.S01E02.DVDExtras-Grp',
+                 'Show.Name.S01E02.Dubbed.HDTV-Grp', 'Show.Name.S01E02.Subtitled.HDTV-Grp', 'Show.Name.S01E02.HDTV-Samples',
+                 'Show.Name.S01E02.HDTV.Spanish-Grp', 'Show.Name.S01E02-Grp', 'Show.Sample.Name.S01E02.HDTV-Grp']
+
+        oldIgnoreWords = sickbeard.IGNORE_WORDS
+        try:
+            sickbeard.IGNORE_WORDS = 'german,spanish'
+            for name in names:
+                parse_result = show_name_helpers.classifyRelease(name).parse_result
+                check_string = '-'.join([x for x in (parse_result.extra_info, parse_result.release_group) if x])
+                expected = not [x for x in show_name_helpers.resultFilters + sickbeard.IGNORE_WORDS.split(',')
+                                if check_string and re.search('(^|[\W_])' + x + '($|[\W_])', check_string, re.I)]
+                self.assertEqual(show_name_helpers.classifyRelease(name).accepted, expected, name)
+        finally:
+            sickbeard.IGNORE_WORDS = oldIgnoreWords
+
     def test_filterBadReleases(self):
         self._test_filterBadReleases('Show.S02.German.Stuff-Grp', False)
         self._test_filterBadReleases('Show.S02.Some.Stuff-Core2HD', False)
@@ -0,0 +1,144 @@
+# coding=UTF-8
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import threading
+import time
+import unittest
+
+import test_lib as test
+
+from sickbeard import generic_queue, scheduler
+
+
+class CountingAction:
+    def __init__(self):
+        self.amActive = False
+        self.runs = 0
+        self.ran = threading.Event()
+
+    def run(self):
+        self.runs += 1
+        self.ran.set()
+
+
+class DoneItem(generic_queue.QueueItem):
+    def __init__(self):
+        generic_queue.QueueItem.__init__(self, 'Done')
+        self.ran = threading.Event()
+
+    def execute(self):
+        generic_queue.QueueItem.execute(self)
+        self.ran.set()
+
+
+class SchedulerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = scheduler.SchedulerLoop("TESTSCHEDULER")
+
+    def tearDown(self):
+        self.loop.stop()
+
+    def _add(self, action, cycleTime=datetime.timedelta(hours=1), runImmediately=True, threaded=True):
+        curScheduler = scheduler.Scheduler(action, cycleTime=cycleTime, runImmediately=runImmediately, threadName="TEST", silent=True, threaded=threaded)
+        self.loop.add(curScheduler)
+        return curScheduler
+
+    def test_run_when_due(self):
+        dueAction = CountingAction()
+        laterAction = CountingAction()
+        dueScheduler = self._add(dueAction)
+        laterScheduler = self._add(laterAction, runImmediately=False)
+
+        self.loop.start()
+        dueAction.ran.wait(5)
+        dueScheduler.join(5)
+
+        self.assertEqual(dueAction.runs, 1)
+        self.assertEqual(laterAction.runs, 0)
+        self.assertEqual(dueScheduler.runCount, 1)
+        self.assertNotEqual(dueScheduler.lastDuration, None)
+        self.assertTrue(dueScheduler.nextRunTime() > datetime.datetime.now())
+        self.assertEqual(laterScheduler.lastDuration, None)
+
+    def test_force_run(self):
+        action = CountingAction()
+        curScheduler = self._add(action, runImmediately=False)
+        self.loop.start()
+
+        self.assertTrue(curScheduler.forceRun())
+        action.ran.wait(5)
+        curScheduler.join(5)
+        self.assertEqual(action.runs, 1)
+
+        # it goes back to its normal cycle afterwards
+        self.assertTrue(curScheduler.timeLeft() > datetime.timedelta(minutes=59))
+
+    def test_cycle_time_change(self):
+        action = CountingAction()
+        curScheduler = self._add(action, runImmediately=False)
+        self.loop.start()
+
+        curScheduler.cycleTime = datetime.timedelta(seconds=1)
+        action.ran.wait(5)
+        self.assertTrue(action.runs >= 1)
+
+    def test_queue_wakeup(self):
+        queue = generic_queue.GenericQueue()
+        queueScheduler = self._add(queue, runImmediately=False, threaded=False)
+        self.assertEqual(queue.scheduler, queueScheduler)
+        self.loop.start()
+
+        item = queue.add_item(DoneItem())
+        item.ran.wait(5)
+        self.assertTrue(item.ran.isSet())
+
+        # the item wakes the queue up when it's done so it doesn't linger until the next cycle
+        for i in range(50):
+            if not queue.currentItems:
+                break
+            time.sleep(0.1)
+        self.assertEqual(queue.currentItems, [])
+        self.assertFalse(item.inProgress)
+
+    def test_idle(self):
+        self._add(CountingAction(), runImmediately=False)
+        self.loop.start()
+        time.sleep(1)
+
+        # nothing is due so the loop shouldn't have been looking
+        self.assertTrue(self.loop.wakeups <= 2)
+
+    def test_stop(self):
+        action = CountingAction()
+        self._add(action, runImmediately=False)
+        self.loop.start()
+        self.loop.stop()
+
+        self.assertEqual(self.loop.thread, None)
+        self.assertEqual(self.loop.schedulers, [])
+
+
+if __name__ == '__main__':
+    print "=================="
+    print "STARTING - SCHEDULER TESTS"
+    print "=================="
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(SchedulerTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
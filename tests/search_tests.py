@@ -0,0 +1,172 @@
+# coding=UTF-8
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import unittest
+
+import test_lib as test
+
+import sickbeard
+from sickbeard import search, exceptions
+from sickbeard.common import Quality
+
+
+class FakeProvider(object):
+
+    def __init__(self, providerID, results, delay=0, error=None):
+        self.providerID = providerID
+        self.name = providerID.title()
+        self.results = results
+        self.delay = delay
+        self.error = error
+        self.searched = threading.Event()
+
+    def getID(self):
+        return self.providerID
+
+    def isActive(self):
+        return True
+
+    def searchRSS(self):
+        self.searched.set()
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.results
+
+
+class FakeResult(object):
+
+    def __init__(self, name, quality):
+        self.name = name
+        self.quality = quality
+
+
+class FakeShow(object):
+    paused = 0
+    name = 'Fake Show'
+
+
+class FakeEpisode(object):
+    show = FakeShow()
+
+    def prettyName(self):
+        return 'Fake Show - 1x01'
+
+
+class ProviderSearchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.oldSettings = (sickbeard.providerList, sickbeard.newznabProviderList, sickbeard.PROVIDER_ORDER,
+                            sickbeard.PROVIDER_SEARCH_THREADS, sickbeard.PROVIDER_SEARCH_TIMEOUT)
+        sickbeard.newznabProviderList = []
+        sickbeard.PROVIDER_SEARCH_THREADS = 4
+        sickbeard.PROVIDER_SEARCH_TIMEOUT = 10
+
+    def tearDown(self):
+        (sickbeard.providerList, sickbeard.newznabProviderList, sickbeard.PROVIDER_ORDER,
+         sickbeard.PROVIDER_SEARCH_THREADS, sickbeard.PROVIDER_SEARCH_TIMEOUT) = self.oldSettings
+
+    def _setProviders(self, *providerList):
+        sickbeard.providerList = list(providerList)
+        sickbeard.PROVIDER_ORDER = [x.getID() for x in providerList]
+
+    def _search(self, stopAt=None):
+        handled = []
+
+        def handleResults(curProvider, curResults):
+            handled.append((curProvider.getID(), curResults))
+            return curProvider.getID() == stopAt
+
+        didSearch = search._searchProviders("rss", lambda curProvider: curProvider.searchRSS(), handleResults)
+        return didSearch, handled
+
+    def test_priority_order(self):
+        # the first provider is the slowest but its results still come first
+        self._setProviders(FakeProvider('first', ['a'], 0.3), FakeProvider('second', ['b']), FakeProvider('third', ['c'], 0.1))
+        didSearch, handled = self._search()
+        self.assertTrue(didSearch)
+        self.assertEqual(handled, [('first', ['a']), ('second', ['b']), ('third', ['c'])])
+
+    def test_concurrent(self):
+        self._setProviders(*[FakeProvider('provider%d' % i, [], 0.3) for i in range(4)])
+        startTime = time.time()
+        self._search()
+        self.assertTrue(time.time() - startTime < 0.9)
+
+    def test_stop_early(self):
+        sickbeard.PROVIDER_SEARCH_THREADS = 1
+        last = FakeProvider('third', ['c'])
+        self._setProviders(FakeProvider('first', ['a']), FakeProvider('second', ['b'], 0.1), last)
+        didSearch, handled = self._search(stopAt='first')
+        self.assertEqual(handled, [('first', ['a'])])
+        time.sleep(0.2)
+        # with a single thread the last provider never got its turn
+        self.assertFalse(last.searched.isSet())
+
+    def test_errors(self):
+        self._setProviders(FakeProvider('autherror', [], error=exceptions.AuthException('bad key')),
+                           FakeProvider('error', [], error=Exception('broken')),
+                           FakeProvider('working', ['a']))
+        didSearch, handled = self._search()
+        self.assertTrue(didSearch)
+        self.assertEqual(handled, [('working', ['a'])])
+        self.assertEqual(search.getProviderSearchStats()['error']['last_status'], 'error')
+
+        self._setProviders(FakeProvider('error', [], error=Exception('broken')))
+        didSearch, handled = self._search()
+        self.assertFalse(didSearch)
+
+    def test_timeout(self):
+        sickbeard.PROVIDER_SEARCH_THREADS = 1
+        sickbeard.PROVIDER_SEARCH_TIMEOUT = 0.2
+        self._setProviders(FakeProvider('slow', ['a'], 1), FakeProvider('fast', ['b']))
+        startTime = time.time()
+        didSearch, handled = self._search()
+        # the fast provider got a new thread once the slow one timed out
+        self.assertTrue(time.time() - startTime < 1)
+        self.assertEqual(handled, [('fast', ['b'])])
+
+        stats = search.getProviderSearchStats()
+        self.assertEqual(stats['slow']['last_status'], 'timeout')
+        self.assertEqual(stats['fast']['last_status'], 'ok')
+        self.assertEqual(stats['fast']['last_results'], 1)
+
+    def test_searchForNeededEpisodes(self):
+        episode = FakeEpisode()
+        first = FakeResult('Fake.Show.S01E01.HDTV.XviD-FIRST', Quality.SDTV)
+        second = FakeResult('Fake.Show.S01E01.HDTV.XviD-SECOND', Quality.SDTV)
+        better = FakeResult('Fake.Show.S01E01.720p.HDTV.x264-THIRD', Quality.HDTV)
+
+        # a result of the same quality from a lower priority provider doesn't replace the first one
+        self._setProviders(FakeProvider('first', {episode: [first]}, 0.2), FakeProvider('second', {episode: [second]}))
+        self.assertEqual(search.searchForNeededEpisodes(), [first])
+
+        # but a better one does
+        self._setProviders(FakeProvider('first', {episode: [first]}, 0.2), FakeProvider('third', {episode: [better]}))
+        self.assertEqual(search.searchForNeededEpisodes(), [better])
+
+
+if __name__ == '__main__':
+    print "=================="
+    print "STARTING - SEARCH TESTS"
+    print "=================="
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(ProviderSearchTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,166 @@
+# coding=UTF-8
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import with_statement
+
+import datetime
+import unittest
+
+import test_lib as test
+
+import sickbeard
+from sickbeard import db, exceptions, show_stats
+from sickbeard.common import Quality, DOWNLOADED, SNATCHED, WANTED, SKIPPED, UNAIRED, IGNORED, ARCHIVED
+from sickbeard.tv import TVShow, TVEpisode, EpisodeSaveSession
+
+TODAY = 734000
+
+
+class ShowStatsTests(test.SickbeardTestDBCase):
+
+    def setUp(self):
+        super(ShowStatsTests, self).setUp()
+        sickbeard.showList = []
+        self.oldToday = show_stats._today
+        show_stats._today = lambda: TODAY
+
+        self.show = TVShow(0001, "en")
+        self.show.saveToDB()
+
+    def tearDown(self):
+        show_stats._today = self.oldToday
+        super(ShowStatsTests, self).tearDown()
+
+    def _saveEpisode(self, season, episode, airdate, status, location=""):
+        ep = TVEpisode(self.show, season, episode)
+        ep.airdate = datetime.date.fromordinal(airdate)
+        ep.status = status
+        ep.location = location
+        ep.saveToDB()
+        return ep
+
+    def _stats(self):
+        return show_stats.getShowStats([self.show])[self.show.tvdbid]
+
+    def test_counts(self):
+        self._saveEpisode(1, 1, TODAY - 10, Quality.compositeStatus(DOWNLOADED, Quality.HDTV))
+        self._saveEpisode(1, 2, TODAY - 5, Quality.compositeStatus(SNATCHED, Quality.SDTV), "file.avi")
+        self._saveEpisode(1, 3, TODAY - 1, WANTED)
+        self._saveEpisode(1, 4, TODAY, IGNORED)
+        self._saveEpisode(1, 5, TODAY + 3, UNAIRED)
+        self._saveEpisode(0, 1, TODAY - 10, ARCHIVED)
+
+        self.assertEqual(self._stats(), {"downloaded": 1, "snatched": 1, "snatched_with_file": 1, "wanted": 1, "total": 3,
+                                         "next_airdate": TODAY + 3})
+        self.assertEqual(show_stats.getStatusCounts([self.show])[self.show.tvdbid][WANTED], 1)
+        self.assertEqual(show_stats.checkStats(), [])
+
+    def test_changes(self):
+        with EpisodeSaveSession():
+            eps = [self._saveEpisode(1, x, TODAY - 20 + x, SKIPPED) for x in range(1, 11)]
+        self.assertEqual(self._stats()["total"], 10)
+
+        for curEp in eps[:4]:
+            curEp.status = WANTED
+            curEp.saveToDB()
+        with EpisodeSaveSession():
+            for curEp in eps[2:6]:
+                curEp.status = Quality.compositeStatus(DOWNLOADED, Quality.SDTV)
+                curEp.saveToDB()
+
+        self.assertEqual(self._stats()["wanted"], 2)
+        self.assertEqual(self._stats()["downloaded"], 4)
+
+        self.assertRaises(exceptions.EpisodeDeletedException, eps[0].deleteEpisode)
+        self.assertEqual(self._stats()["wanted"], 1)
+        self.assertEqual(self._stats()["total"], 9)
+        self.assertEqual(show_stats.checkStats(), [])
+
+    def test_episode_airs(self):
+        global TODAY
+        self._saveEpisode(1, 1, TODAY - 1, Quality.compositeStatus(DOWNLOADED, Quality.SDTV))
+        self._saveEpisode(1, 2, TODAY + 1, UNAIRED)
+        self._saveEpisode(1, 3, TODAY + 8, UNAIRED)
+        self.assertEqual(self._stats()["total"], 1)
+
+        oldToday = TODAY
+        TODAY += 2
+        try:
+            # the next episode has aired since the show was counted
+            self.assertEqual(self._stats()["total"], 2)
+            self.assertEqual(self._stats()["next_airdate"], TODAY + 6)
+        finally:
+            TODAY = oldToday
+
+    def test_check_stats(self):
+        self._saveEpisode(1, 1, TODAY - 1, WANTED)
+        db.DBConnection().action("UPDATE tv_episodes SET status = ?", [SKIPPED])
+
+        self.assertEqual(show_stats.checkStats(), [self.show.tvdbid])
+        self.assertEqual(self._stats()["wanted"], 0)
+        self.assertEqual(show_stats.checkStats(), [])
+
+        show_stats.forgetShow(self.show.tvdbid)
+        self.assertEqual(db.DBConnection().select("SELECT * FROM show_stats"), [])
+
+    def test_no_needless_writes(self):
+        ep = self._saveEpisode(1, 1, TODAY - 1, WANTED)
+
+        queries = []
+        oldSelect = db.DBConnection.select
+        oldMassAction = db.DBConnection.mass_action
+
+        def select(self, query, args=None):
+            queries.append(query)
+            return oldSelect(self, query, args)
+
+        def mass_action(self, querylist, logTransaction=False):
+            queries.extend([x[0] for x in querylist])
+            return oldMassAction(self, querylist, logTransaction)
+
+        db.DBConnection.select = select
+        db.DBConnection.mass_action = mass_action
+        try:
+            # the counts are right so only the episodes are read
+            self.assertEqual(show_stats.checkStats(), [])
+            self.assertEqual([x for x in queries if "show_stat" in x and not x.startswith("SELECT")], [])
+
+            # nothing that's counted changed
+            del queries[:]
+            ep.name = "New Name"
+            ep.hasnfo = True
+            ep.saveToDB()
+            self.assertEqual([x for x in queries if "show_stat" in x], [])
+
+            ep.status = SKIPPED
+            ep.saveToDB()
+            self.assertNotEqual([x for x in queries if "show_stat" in x], [])
+        finally:
+            db.DBConnection.select = oldSelect
+            db.DBConnection.mass_action = oldMassAction
+
+        self.assertEqual(self._stats()["wanted"], 0)
+
+
+if __name__ == '__main__':
+    print "=================="
+    print "STARTING - SHOW STATS TESTS"
+    print "=================="
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(ShowStatsTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -28,7 +28,7 @@ sys.path.append(os.path.abspath('../lib'))
 import sickbeard
 import shutil, time
 from sickbeard import encodingKludge as ek, providers, tvcache
-from sickbeard import db
+from sickbeard import db, scene_exceptions, tv
 from sickbeard.databases import mainDB
 from sickbeard.databases import cache_db
 
@@ -119,9 +119,9 @@ class SickbeardTestDBCase(unittest.TestCase):
 
 class TestDBConnection(db.DBConnection, object):
 
-    def __init__(self, dbFileName=TESTDBNAME):
+    def __init__(self, dbFileName=TESTDBNAME, suffix=None, row_type=None):
         dbFileName = os.path.join(TESTDIR, dbFileName)
-        super(TestDBConnection, self).__init__(dbFileName)
+        super(TestDBConnection, self).__init__(dbFileName, suffix, row_type)
 
 
 class TestCacheDBConnection(TestDBConnection, object):
@@ -133,6 +133,8 @@ class TestCacheDBConnection(TestDBConnection, object):
         try:
             sql = "CREATE TABLE " + providerName + " (name TEXT, season NUMERIC, episodes TEXT, tvrid NUMERIC, tvdbid NUMERIC, url TEXT, time NUMERIC, quality TEXT);"
             self.connection.execute(sql)
+            for sql in cache_db.providerIndexQueries(providerName):
+                self.connection.execute(sql)
             self.connection.commit()
         except sqlite3.OperationalError, e:
             if str(e) != "table " + providerName + " already exists":
@@ -173,10 +175,16 @@ def tearDown_test_db():
     """
     # uncomment next line so leave the db intact beween test and at the end
     #return False
-    if os.path.exists(os.path.join(TESTDIR, TESTDBNAME)):
-        os.remove(os.path.join(TESTDIR, TESTDBNAME))
-    if os.path.exists(os.path.join(TESTDIR, TESTCACHEDBNAME)):
-        os.remove(os.path.join(TESTDIR, TESTCACHEDBNAME))
+    # the pooled connections would otherwise keep the deleted files open
+    db.connectionPool.closeAll()
+    # the exceptions loaded from the old cache.db are gone with it
+    scene_exceptions.clear_exceptions_cache()
+    # and so are the episodes the shows of the last test had in memory
+    tv.episodeCache.clear()
+    for dbName in (TESTDBNAME, TESTCACHEDBNAME):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(os.path.join(TESTDIR, dbName + suffix)):
+                os.remove(os.path.join(TESTDIR, dbName + suffix))
 
 
 def setUp_test_episode_file():
@@ -200,6 +208,24 @@ def setUp_test_show_dir():
 def tearDown_test_show_dir():
     shutil.rmtree(SHOWDIR)
 
+
+def addTestShow(tvdbid, name, episodes, **showAttrs):
+    """Saves a show and its episodes straight to the test db and returns the TVShow
+
+    episodes is a list of (season, episode, airdate ordinal, status)
+    showAttrs are set on the show before it's saved, e.g. paused=1
+    """
+    show = tv.TVShow(tvdbid, "en")
+    show.name = name
+    for attr, value in showAttrs.items():
+        setattr(show, attr, value)
+    show.saveToDB()
+
+    db.DBConnection().mass_action([["INSERT INTO tv_episodes (showid, tvdbid, name, season, episode, description, airdate, hasnfo, hastbn, status, location, file_size, release_name) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                                    [tvdbid, tvdbid * 1000 + season * 100 + episode, "Ep %dx%d" % (season, episode), season, episode, "", airdate, 0, 0, status, "", 0, ""]]
+                                   for (season, episode, airdate, status) in episodes])
+    return show
+
 tearDown_test_db()
 
 if __name__ == '__main__':
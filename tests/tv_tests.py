@@ -17,10 +17,16 @@
 # You should have received a copy of the GNU General Public License
 # along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
 
+from __future__ import with_statement
+
+import os.path
 import unittest
 import test_lib as test
 
 import sickbeard
+from sickbeard import db, exceptions, file_index, helpers, tv
+from sickbeard.metadata import mediabrowser, xbmc
+from sickbeard.common import SKIPPED
 from sickbeard.tv import TVEpisode, TVShow
 
 
@@ -77,6 +83,176 @@ class TVEpisodeTests(test.SickbeardTestDBCase):
         self.assertEqual(ep.name, "asdasdasdajkaj")
 
 
+class EpisodeSaveSessionTests(test.SickbeardTestDBCase):
+
+    def setUp(self):
+        super(EpisodeSaveSessionTests, self).setUp()
+        sickbeard.showList = []
+        self.show = TVShow(0001, "en")
+        self.show.saveToDB()
+
+    def _dbNames(self):
+        return [(x["episode"], x["name"]) for x in db.DBConnection().select("SELECT episode, name FROM tv_episodes WHERE showid = ? ORDER BY episode", [self.show.tvdbid])]
+
+    def test_saves_batched(self):
+        eps = [TVEpisode(self.show, 1, x) for x in range(1, 4)]
+
+        with tv.EpisodeSaveSession():
+            for curEp in eps:
+                curEp.name = "Ep %d" % curEp.episode
+                curEp.saveToDB()
+
+            # a session opened inside another one joins it
+            with tv.EpisodeSaveSession():
+                eps[0].name = "Ep 1 again"
+                eps[0].saveToDB()
+
+            self.assertEqual(self._dbNames(), [])
+            self.assertTrue(eps[0].dirty)
+
+        self.assertEqual(self._dbNames(), [(1, "Ep 1 again"), (2, "Ep 2"), (3, "Ep 3")])
+        self.assertFalse(eps[0].dirty)
+        self.assertEqual(tv.EpisodeSaveSession.current(), None)
+
+    def test_flush(self):
+        ep = TVEpisode(self.show, 1, 1)
+        with tv.EpisodeSaveSession() as session:
+            ep.name = "Ep 1"
+            ep.saveToDB()
+            session.flush()
+            self.assertEqual(self._dbNames(), [(1, "Ep 1")])
+
+    def test_deleted_episode_not_saved(self):
+        ep = TVEpisode(self.show, 1, 1)
+        with tv.EpisodeSaveSession():
+            ep.name = "Ep 1"
+            ep.saveToDB()
+            self.assertRaises(exceptions.EpisodeDeletedException, ep.deleteEpisode)
+        self.assertEqual(self._dbNames(), [])
+
+
+class RefreshDirTests(test.SickbeardTestDBCase):
+
+    def setUp(self):
+        super(RefreshDirTests, self).setUp()
+        sickbeard.showList = []
+        self.show = TVShow(0001, "en")
+        self.show._location = test.SHOWDIR
+        self.show.saveToDB()
+        sickbeard.showList = [self.show]
+
+        for curEp in (1, 2, 3):
+            self._writeFile(curEp, "x" * curEp)
+
+        # count the files that get parsed
+        self.madeFrom = []
+        self.oldMakeEpFromFile = TVShow.makeEpFromFile
+        def makeEpFromFile(show, file):
+            self.madeFrom.append(os.path.basename(file))
+            return self.oldMakeEpFromFile(show, file)
+        TVShow.makeEpFromFile = makeEpFromFile
+
+    def tearDown(self):
+        TVShow.makeEpFromFile = self.oldMakeEpFromFile
+        super(RefreshDirTests, self).tearDown()
+
+    def _fileName(self, episode):
+        return "Show.Name.S01E0%d.HDTV.XviD-GRP.avi" % episode
+
+    def _writeFile(self, episode, data):
+        f = open(os.path.join(test.SHOWDIR, self._fileName(episode)), "w")
+        f.write(data)
+        f.close()
+
+    def _refresh(self, fullScan=False):
+        self.madeFrom = []
+        self.show.refreshDir(fullScan)
+        return sorted(self.madeFrom)
+
+    def test_unchanged_files_skipped(self):
+        self.assertEqual(self._refresh(), [self._fileName(x) for x in (1, 2, 3)])
+        self.assertEqual(len(file_index.getFileStates(self.show.tvdbid)), 3)
+        self.assertEqual(self._refresh(), [])
+
+        # a file that changed size
+        self._writeFile(2, "changed")
+        self.assertEqual(self._refresh(), [self._fileName(2)])
+
+        # a new file
+        self._writeFile(4, "new")
+        self.assertEqual(self._refresh(), [self._fileName(4)])
+
+        self.assertEqual(self._refresh(fullScan=True), [self._fileName(x) for x in (1, 2, 3, 4)])
+
+    def test_removed_file(self):
+        self._refresh()
+        self.assertEqual(self.show.getEpisode(1, 3).location, os.path.join(test.SHOWDIR, self._fileName(3)))
+
+        os.remove(os.path.join(test.SHOWDIR, self._fileName(3)))
+        self.assertEqual(self._refresh(), [])
+        self.assertEqual(self.show.getEpisode(1, 3).location, "")
+        self.assertEqual(sorted(file_index.getFileStates(self.show.tvdbid).keys()), [os.path.join(test.SHOWDIR, self._fileName(x)) for x in (1, 2)])
+
+    def test_file_without_episode_rescanned(self):
+        self._refresh()
+
+        # the episode lost its file somehow, the unchanged file gets looked at again
+        ep = self.show.getEpisode(1, 2)
+        ep.location = ""
+        ep.saveToDB()
+        self.assertEqual(self._refresh(), [self._fileName(2)])
+        self.assertEqual(self.show.getEpisode(1, 2).location, os.path.join(test.SHOWDIR, self._fileName(2)))
+
+    def test_meta_files_of_unchanged_file(self):
+        oldProviders = sickbeard.metadata_provider_dict
+        sickbeard.metadata_provider_dict = {'XBMC': xbmc.XBMCMetadata(episode_metadata=True, episode_thumbnails=True),
+                                            'MediaBrowser': mediabrowser.MediaBrowserMetadata(episode_metadata=True)}
+
+        checked = []
+        oldCheckForMetaFiles = TVEpisode.checkForMetaFiles
+        def checkForMetaFiles(ep):
+            checked.append(ep.episode)
+            return oldCheckForMetaFiles(ep)
+        TVEpisode.checkForMetaFiles = checkForMetaFiles
+
+        try:
+            self._refresh()
+            self.assertFalse(self.show.getEpisode(1, 1).hasnfo)
+
+            # nothing changed so no episode is looked at
+            del checked[:]
+            self.assertEqual(self._refresh(), [])
+            self.assertEqual(checked, [])
+
+            # the nfo and tbn are made next to a file that stays the same
+            nfo = os.path.join(test.SHOWDIR, helpers.replaceExtension(self._fileName(1), "nfo"))
+            tbn = os.path.join(test.SHOWDIR, helpers.replaceExtension(self._fileName(1), "tbn"))
+            for curFile in (nfo, tbn):
+                open(curFile, "w").close()
+
+            self.assertEqual(self._refresh(), [])
+            sqlResults = db.DBConnection().select("SELECT hasnfo, hastbn FROM tv_episodes WHERE showid = ? AND season = 1 AND episode = 1", [self.show.tvdbid])
+            self.assertEqual((sqlResults[0]["hasnfo"], sqlResults[0]["hastbn"]), (1, 1))
+
+            os.remove(nfo)
+            self.assertEqual(self._refresh(), [])
+            ep = self.show.getEpisode(1, 1)
+            self.assertEqual((ep.hasnfo, ep.hastbn), (False, True))
+            self.assertEqual(db.DBConnection().select("SELECT hasnfo FROM tv_episodes WHERE showid = ? AND season = 1 AND episode = 1", [self.show.tvdbid])[0]["hasnfo"], 0)
+
+            # the metadata of some providers is kept in a subfolder
+            os.mkdir(os.path.join(test.SHOWDIR, "metadata"))
+            self._refresh()
+            open(os.path.join(test.SHOWDIR, "metadata", helpers.replaceExtension(self._fileName(2), "xml")), "w").close()
+            del checked[:]
+            self.assertEqual(self._refresh(), [])
+            self.assertEqual(sorted(checked), [1, 2, 3])
+            self.assertTrue(self.show.getEpisode(1, 2).hasnfo)
+        finally:
+            TVEpisode.checkForMetaFiles = oldCheckForMetaFiles
+            sickbeard.metadata_provider_dict = oldProviders
+
+
 class TVTests(test.SickbeardTestDBCase):
 
     def setUp(self):
@@ -97,6 +273,214 @@ class TVTests(test.SickbeardTestDBCase):
         sickbeard.showList = [show]
         #TODO: implement
 
+    def test_findCertainShow(self):
+        show = TVShow(0001, "en")
+        show.name = "show name"
+        show.tvrid = 5
+        show.saveToDB()
+        sickbeard.showList.append(show)
+        self.assertEqual(helpers.findCertainShow(sickbeard.showList, 0001), show)
+        self.assertEqual(helpers.findCertainTVRageShow(sickbeard.showList, 5), show)
+        self.assertEqual(helpers.findCertainShow(sickbeard.showList, 0002), None)
+
+        # edits are picked up once the show is saved
+        show.tvdbid = 0002
+        show.saveToDB()
+        self.assertEqual(helpers.findCertainShow(sickbeard.showList, 0001), None)
+        self.assertEqual(helpers.findCertainShow(sickbeard.showList, 0002), show)
+
+        sickbeard.showList = []
+        self.assertEqual(helpers.findCertainShow(sickbeard.showList, 0002), None)
+
+    def test_searchDBForShow_index(self):
+        show = TVShow(0001, "en")
+        show.name = "Show Name"
+        show.saveToDB()
+        sickbeard.showList.append(show)
+        self.assertEqual(helpers.searchDBForShow("show.name"), (0001, "Show Name"))
+
+    def test_loadShowsFromDB(self):
+        for tvdbid in (0001, 0002, 0003):
+            show = TVShow(tvdbid, "en")
+            show.name = "Show %d" % tvdbid
+            show.tvrid = tvdbid + 10
+            show.quality = 4
+            show.paused = tvdbid % 2
+            show.startyear = 2000 + tvdbid
+            show._location = "/shows/%d" % tvdbid
+            show.saveToDB()
+
+        # loading in bulk mustn't write anything back
+        oldSaveToDB = TVShow.saveToDB
+        def failSaveToDB(self):
+            raise Exception("saveToDB called while loading shows")
+        TVShow.saveToDB = failSaveToDB
+        try:
+            shows = tv.loadShowsFromDB()
+        finally:
+            TVShow.saveToDB = oldSaveToDB
+
+        self.assertEqual(sorted([x.tvdbid for x in shows]), [0001, 0002, 0003])
+        for show in shows:
+            self.assertEqual(show.name, "Show %d" % show.tvdbid)
+            self.assertEqual(show.tvrid, show.tvdbid + 10)
+            self.assertEqual(show.quality, 4)
+            self.assertEqual(show.paused, show.tvdbid % 2)
+            self.assertEqual(show.startyear, 2000 + show.tvdbid)
+            self.assertEqual(show._location, "/shows/%d" % show.tvdbid)
+            self.assertEqual(show.lang, "en")
+
+
+class EpisodeCacheTests(test.SickbeardTestDBCase):
+
+    def setUp(self):
+        super(EpisodeCacheTests, self).setUp()
+        sickbeard.showList = []
+        # test_lib stops episodes from loading anything, these ones are all in the DB
+        self.oldSpecifyEpisode = TVEpisode.specifyEpisode
+        TVEpisode.specifyEpisode = lambda ep, season, episode: ep.loadFromDB(season, episode)
+
+    def tearDown(self):
+        TVEpisode.specifyEpisode = self.oldSpecifyEpisode
+        super(EpisodeCacheTests, self).tearDown()
+
+    def _addEpisodeRows(self, show, season, episodes, locations={}):
+        myDB = db.DBConnection()
+        for curEp in episodes:
+            myDB.action("INSERT INTO tv_episodes (showid, tvdbid, name, season, episode, description, airdate, hasnfo, hastbn, status, location, file_size, release_name) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                        [show.tvdbid, 100 * season + curEp, "Ep %dx%d" % (season, curEp), season, curEp, "desc", 733000 + curEp, 0, 0, SKIPPED, locations.get(curEp, ""), 0, ""])
+
+    def test_getEpisodeFromRowStore(self):
+        show = TVShow(0001, "en")
+        show.saveToDB()
+        self._addEpisodeRows(show, 1, range(1, 6))
+        self._addEpisodeRows(show, 2, range(1, 6))
+
+        # the first episode reads its whole season, the rest of the season doesn't need the DB
+        show.getEpisode(1, 1)
+        self.assertTrue(1 in show._episodeRows)
+        self.assertFalse(2 in show._episodeRows)
+
+        oldSelect = db.DBConnection.select
+        def failSelect(self, query, args=None):
+            raise Exception("episode loaded from the DB: " + query)
+        db.DBConnection.select = failSelect
+        try:
+            eps = [show.getEpisode(1, x) for x in range(2, 6)]
+        finally:
+            db.DBConnection.select = oldSelect
+
+        for curEp in eps:
+            self.assertEqual(curEp.name, "Ep 1x%d" % curEp.episode)
+            self.assertEqual(curEp.tvdbid, 100 + curEp.episode)
+            self.assertEqual(curEp.airdate.toordinal(), 733000 + curEp.episode)
+            self.assertEqual(curEp.status, SKIPPED)
+            self.assertFalse(curEp.dirty)
+
+        # saving keeps the row store up to date
+        eps[0].name = "New Name"
+        eps[0].saveToDB()
+        self.assertEqual(show.getEpisodeRow(1, 2)["name"], "New Name")
+
+        # a flush throws the rows out along with the episodes
+        show.flushEpisodes()
+        self.assertEqual(show._episodeRows, {})
+        self.assertEqual(show.getEpisode(1, 2).name, "New Name")
+
+    def test_getAllEpisodes(self):
+        show = TVShow(0001, "en")
+        show.saveToDB()
+        self._addEpisodeRows(show, 1, range(1, 7), {1: "a.avi", 2: "a.avi", 3: "b.avi", 4: "b.avi", 5: "b.avi", 6: "c.avi"})
+        self._addEpisodeRows(show, 2, range(1, 3), {1: "a.avi"})
+
+        eps = show.getAllEpisodes()
+        self.assertEqual([(x.season, x.episode) for x in eps], [(1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (2, 1), (2, 2)])
+
+        related = dict([((x.season, x.episode), [y.episode for y in x.relatedEps]) for x in eps])
+        self.assertEqual(related[(1, 1)], [2])
+        self.assertEqual(related[(1, 2)], [1])
+        self.assertEqual(related[(1, 3)], [4, 5])
+        self.assertEqual(related[(1, 4)], [3, 5])
+        self.assertEqual(related[(1, 5)], [3, 4])
+        self.assertEqual(related[(1, 6)], [])
+        # the same file name in another season isn't a multi-episode
+        self.assertEqual(related[(2, 1)], [])
+
+        # asking again doesn't add the related episodes twice
+        show.getAllEpisodes()
+        self.assertEqual([x.episode for x in show.getEpisode(1, 3).relatedEps], [4, 5])
+
+        self.assertEqual([(x.season, x.episode) for x in show.getAllEpisodes(season=2)], [(2, 1), (2, 2)])
+        self.assertEqual([(x.season, x.episode) for x in show.getAllEpisodes(has_location=True)], [(1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (2, 1)])
+
+    def test_episodeEviction(self):
+        oldSize = sickbeard.EPISODE_CACHE_SIZE
+        sickbeard.EPISODE_CACHE_SIZE = 10
+        try:
+            show = TVShow(0001, "en")
+            show.saveToDB()
+            self._addEpisodeRows(show, 1, range(1, 31))
+
+            busyEp = show.getEpisode(1, 1)
+            busyEp.lock.acquire()
+            try:
+                for curEp in range(2, 31):
+                    show.getEpisode(1, curEp)
+            finally:
+                busyEp.lock.release()
+
+            inMemory = [x for x in show.episodes[1] if show.episodes[1][x] is not None]
+            self.assertTrue(len(inMemory) <= 10)
+            self.assertTrue(tv.episodeCache.stats()['evictions'] >= 20)
+            # the locked episode was in use so it stayed
+            self.assertTrue(show.getEpisode(1, 1, noCreate=True) is busyEp)
+            self.assertTrue(show.getEpisode(1, 2, noCreate=True) is None)
+
+            # an evicted episode comes back from the row store with the same data
+            ep = show.getEpisode(1, 2)
+            self.assertEqual(ep.name, "Ep 1x2")
+            self.assertEqual(ep.tvdbid, 102)
+
+            # an episode that's evicted while somebody still holds it is the one that's handed out again
+            for curEp in range(3, 31):
+                show.getEpisode(1, curEp)
+            self.assertTrue(2 not in show.episodes[1])
+            self.assertTrue(show.getEpisode(1, 2) is ep)
+            self.assertTrue(show.getEpisode(1, 2, noCreate=True) is ep)
+        finally:
+            sickbeard.EPISODE_CACHE_SIZE = oldSize
+
+    def test_episodeEvictionAllBusy(self):
+        oldSize = sickbeard.EPISODE_CACHE_SIZE
+        sickbeard.EPISODE_CACHE_SIZE = 10
+        try:
+            show = TVShow(0001, "en")
+            show.saveToDB()
+            self._addEpisodeRows(show, 1, range(1, 32))
+
+            tried = []
+            oldEvictEpisode = show.evictEpisode
+            def evictEpisode(season, episode):
+                tried.append(episode)
+                return oldEvictEpisode(season, episode)
+            show.evictEpisode = evictEpisode
+
+            # nothing can be evicted so a pass only happens every EPISODE_CACHE_SIZE / 10 new episodes
+            eps = []
+            for curEp in range(1, 31):
+                eps.append(show.getEpisode(1, curEp))
+                eps[-1].dirty = True
+            self.assertEqual(tried.count(1), 10)
+            self.assertEqual(show.getEpisode(1, 1, noCreate=True), eps[0])
+
+            # once they're saved the next pass makes room again
+            for curEp in eps:
+                curEp.dirty = False
+            show.getEpisode(1, 31)
+            self.assertEqual(tv.episodeCache.stats()['size'], 9)
+        finally:
+            sickbeard.EPISODE_CACHE_SIZE = oldSize
+
 
 if __name__ == '__main__':
     print "=================="
@@ -109,5 +493,14 @@ if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TVEpisodeTests)
     unittest.TextTestRunner(verbosity=2).run(suite)
     print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(EpisodeSaveSessionTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(RefreshDirTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
+    print "######################################################################"
     suite = unittest.TestLoader().loadTestsFromTestCase(TVTests)
     unittest.TextTestRunner(verbosity=2).run(suite)
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(EpisodeCacheTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
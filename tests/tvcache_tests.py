@@ -0,0 +1,95 @@
+# coding=UTF-8
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import test_lib as test
+
+from sickbeard import tvcache
+
+
+class FakeProvider(object):
+
+    name = "Fake Provider"
+
+    def getID(self):
+        return "fakeprovider"
+
+
+def _entry(name, timestamp=1000, episodes="|2|"):
+    return [name, 1, episodes, 0, 0, "http://fake/" + name, timestamp, 1]
+
+
+class TVCacheUpdateTests(test.SickbeardTestDBCase):
+
+    def setUp(self):
+        super(TVCacheUpdateTests, self).setUp()
+        self.cache = tvcache.TVCache(FakeProvider())
+
+    def _cached(self):
+        return dict([(x["name"], x["time"]) for x in self.cache._getDB().select("SELECT * FROM fakeprovider")])
+
+    def test_full_update(self):
+        self.cache.incremental = False
+        self.cache._updateCacheEntries([_entry("a"), _entry("b")])
+        self.cache._updateCacheEntries([_entry("b", 2000), _entry("c", 2000)])
+        self.assertEqual(self._cached(), {"b": 2000, "c": 2000})
+
+    def test_incremental_update(self):
+        self.cache._updateCacheEntries([_entry("a"), _entry("b")])
+        self.cache._updateCacheEntries([_entry("b", 2000), _entry("c", 2000), _entry("c", 2000)])
+        # b was already cached so it keeps its original row, a left the feed
+        self.assertEqual(self._cached(), {"b": 1000, "c": 2000})
+
+    def test_episode_mapping(self):
+        self.cache._updateCacheEntries([_entry("a", episodes="|2|3|"), _entry("b")])
+        self.cache._updateCacheEntries([_entry("a", episodes="|2|3|"), _entry("c", episodes="|4|")])
+        mappings = self.cache._getDB().select("SELECT url, episode FROM cache_episodes WHERE provider = ? ORDER BY url, episode", ["fakeprovider"])
+        self.assertEqual([(x["url"], x["episode"]) for x in mappings],
+                         [("http://fake/a", 2), ("http://fake/a", 3), ("http://fake/c", 4)])
+
+    def test_episode_lookup(self):
+        # the cache_episodes lookup has to find the same results as matching the episodes string
+        entries = []
+        for i in range(60):
+            entries.append(["Show.%d.%d" % (i % 3, i), i % 2 + 1, "|%d|%d|" % (i % 5 + 1, i % 7 + 1), 0, i % 3, "http://fake/%d" % i, 1000, 1])
+        self.cache._updateCacheEntries(entries)
+
+        myDB = self.cache._getDB()
+        for tvdbid in range(3):
+            for season in (1, 2):
+                for episode in range(1, 9):
+                    scanned = myDB.select("SELECT url FROM fakeprovider WHERE tvdbid = ? AND season = ? AND episodes LIKE ?", [tvdbid, season, "%|" + str(episode) + "|%"])
+                    indexed = myDB.select("SELECT fakeprovider.url FROM cache_episodes JOIN fakeprovider ON fakeprovider.url = cache_episodes.url"
+                                          " WHERE cache_episodes.tvdbid = ? AND cache_episodes.season = ? AND cache_episodes.episode = ? AND cache_episodes.provider = ?",
+                                          [tvdbid, season, episode, "fakeprovider"])
+                    self.assertEqual(sorted([x["url"] for x in indexed]), sorted([x["url"] for x in scanned]))
+
+    def test_clear_cache(self):
+        self.cache._updateCacheEntries([_entry("a")])
+        self.cache._clearCache()
+        self.assertEqual(self._cached(), {})
+        self.assertEqual(self.cache._getDB().select("SELECT * FROM cache_episodes"), [])
+
+
+if __name__ == '__main__':
+    print "=================="
+    print "STARTING - TVCACHE TESTS"
+    print "=================="
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(TVCacheUpdateTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,172 @@
+# coding=UTF-8
+# URL: http://code.google.com/p/sickbeard/
+#
+# This file is part of Sick Beard.
+#
+# Sick Beard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sick Beard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sick Beard.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import unittest
+
+import test_lib as test
+
+import sickbeard
+from sickbeard import db, tvdb_store
+from sickbeard.tv import TVShow
+
+from lib.tvdb_api import tvdb_api, tvdb_exceptions
+
+
+def _fakeShow(name, episodes):
+    """
+    Builds a show like tvdb_api does, episodes is a list of (season, episode, name, firstaired)
+    """
+    show = tvdb_api.Show()
+    show.data.update({'seriesname': name, 'genre': '|Comedy|', 'network': 'Net', 'airs_dayofweek': 'Monday',
+                      'airs_time': '8:00 PM', 'firstaired': '2010-01-04', 'status': 'Continuing', 'rating': '8.0'})
+    for season, episode, epName, firstaired in episodes:
+        if season not in show:
+            show[season] = tvdb_api.Season(show=show)
+        ep = tvdb_api.Episode(season=show[season])
+        ep.update({'id': str(season * 100 + episode), 'seasonnumber': str(season), 'episodenumber': str(episode),
+                   'episodename': epName, 'overview': None, 'firstaired': firstaired, 'director': 'Somebody'})
+        show[season][episode] = ep
+    return show
+
+
+class TvdbStoreTests(test.SickbeardTestDBCase):
+
+    def setUp(self):
+        test.SickbeardTestDBCase.setUp(self)
+
+        self.fetched = []
+        self.tvdbShows = {1: _fakeShow("Show Name", [(1, 1, "Pilot", "2010-01-04"), (1, 2, "Second", "2010-01-11"),
+                                                     (2, 1, "Back", "2011-01-03")])}
+
+        def fakeFetch(tvdbid, lang):
+            self.fetched.append((tvdbid, lang))
+            if tvdbid not in self.tvdbShows:
+                raise tvdb_exceptions.tvdb_error("Could not connect to server")
+            return self.tvdbShows[tvdbid]
+
+        self.oldFetchShow = tvdb_store._fetchShow
+        tvdb_store._fetchShow = fakeFetch
+
+        self.oldCacheSize = sickbeard.TVDB_SHOW_CACHE_SIZE
+        tvdb_store.showCache = tvdb_store.ShowCache()
+
+    def tearDown(self):
+        tvdb_store._fetchShow = self.oldFetchShow
+        sickbeard.TVDB_SHOW_CACHE_SIZE = self.oldCacheSize
+        tvdb_store.showCache = tvdb_store.ShowCache()
+        test.SickbeardTestDBCase.tearDown(self)
+
+    def test_store(self):
+        show = tvdb_store.getShow(1, "en")
+        self.assertEqual(show["seriesname"], "Show Name")
+        self.assertEqual(show[1][2]["episodename"], "Second")
+        self.assertEqual(show.airedOn(datetime.date(2011, 1, 3))[0]["episodenumber"], "1")
+        self.assertEqual(self.fetched, [(1, "en")])
+
+        # only what's used is stored
+        self.assertRaises(tvdb_exceptions.tvdb_attributenotfound, lambda: show["rating"])
+
+        # the next ones come from the store
+        self.assertEqual(tvdb_store.getShow(1, "en")[2][1]["episodename"], "Back")
+        self.assertEqual(tvdb_store.getEpisode(1, "en", 1, 1)["firstaired"], "2010-01-04")
+        self.assertRaises(tvdb_exceptions.tvdb_episodenotfound, tvdb_store.getEpisode, 1, "en", 1, 3)
+        self.assertRaises(tvdb_exceptions.tvdb_seasonnotfound, tvdb_store.getEpisode, 1, "en", 3, 1)
+        self.assertEqual(len(self.fetched), 1)
+
+        # unless they're forced
+        self.tvdbShows[1] = _fakeShow("Show Name", [(1, 1, "Pilot", "2010-01-04")])
+        tvdb_store.getShow(1, "en", cache=False)
+        self.assertEqual(len(self.fetched), 2)
+        self.assertRaises(tvdb_exceptions.tvdb_seasonnotfound, tvdb_store.getEpisode, 1, "en", 2, 1)
+
+        tvdb_store.forgetShow(1)
+        self.assertEqual(db.DBConnection("cache.db").select("SELECT * FROM tvdb_episodes"), [])
+
+    def test_stale(self):
+        tvdb_store.getShow(1, "en")
+        db.DBConnection("cache.db").action("UPDATE tvdb_shows SET fetched = fetched - ?", [tvdb_store.MAX_AGE + 1])
+        db.DBConnection("cache.db").action("UPDATE tvdb_episodes SET fetched = fetched - ?", [tvdb_store.MAX_AGE + 1])
+        tvdb_store.showCache.clear()
+
+        # the episode is too old so the show is fetched again
+        tvdb_store.getEpisode(1, "en", 1, 1)
+        self.assertEqual(len(self.fetched), 2)
+
+        # an old one is still better than nothing when TVDB is down
+        db.DBConnection("cache.db").action("UPDATE tvdb_shows SET fetched = 0")
+        tvdb_store.showCache.clear()
+        del self.tvdbShows[1]
+        self.assertEqual(tvdb_store.getShow(1, "en")["seriesname"], "Show Name")
+        self.assertRaises(tvdb_exceptions.tvdb_error, tvdb_store.getShow, 1, "en", False)
+        self.assertRaises(tvdb_exceptions.tvdb_error, tvdb_store.getShow, 2, "en")
+
+    def test_show_cache(self):
+        sickbeard.TVDB_SHOW_CACHE_SIZE = 2
+        self.tvdbShows[2] = _fakeShow("Second Show", [(1, 1, "Pilot", "2012-02-01")])
+        self.tvdbShows[3] = _fakeShow("Third Show", [(1, 1, "Pilot", "2012-03-01")])
+
+        show = tvdb_store.getShow(1, "en")
+        self.assertTrue(tvdb_store.getShow(1, "en") is show)
+        self.assertTrue(tvdb_store.getEpisode(1, "en", 1, 2) is show[1][2])
+        self.assertRaises(tvdb_exceptions.tvdb_episodenotfound, tvdb_store.getEpisode, 1, "en", 1, 3)
+
+        # the show that was used the longest time ago goes first
+        tvdb_store.getShow(2, "en")
+        tvdb_store.getShow(1, "en")
+        tvdb_store.getShow(3, "en")
+        stats = tvdb_store.showCache.stats()
+        self.assertEqual((stats['size'], stats['evictions']), (2, 1))
+
+        # it's read from the store again, not fetched
+        self.assertEqual(tvdb_store.getShow(2, "en")["seriesname"], "Second Show")
+        self.assertEqual(len(self.fetched), 3)
+
+        # a show that's been in memory for too long is read again
+        tvdb_store.showCache.add(1, "en", 0, show)
+        self.assertFalse(tvdb_store.getShow(1, "en") is show)
+        self.assertEqual(len(self.fetched), 3)
+
+        stats = tvdb_store.showCache.stats()
+        self.assertEqual((stats['hits'], stats['expired']), (4, 1))
+
+        tvdb_store.forgetShow(1)
+        self.assertEqual(tvdb_store.showCache.get(1, "en", 0), None)
+
+    def test_load_show(self):
+        show = TVShow(1, "en")
+        show.loadFromTVDB()
+        show.loadEpisodesFromTVDB()
+
+        self.assertEqual(show.name, "Show Name")
+        self.assertEqual(show.airs, "Monday 8:00 PM")
+        self.assertEqual(show.startyear, 2010)
+
+        sqlResults = db.DBConnection().select("SELECT season, episode, name, tvdbid FROM tv_episodes WHERE showid = 1 ORDER BY season, episode")
+        self.assertEqual([(x["season"], x["episode"], x["name"], x["tvdbid"]) for x in sqlResults],
+                         [(1, 1, "Pilot", 101), (1, 2, "Second", 102), (2, 1, "Back", 201)])
+        self.assertEqual(self.fetched, [(1, "en")])
+
+
+if __name__ == '__main__':
+    print "=================="
+    print "STARTING - TVDB STORE TESTS"
+    print "=================="
+    print "######################################################################"
+    suite = unittest.TestLoader().loadTestsFromTestCase(TvdbStoreTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)